@@ -0,0 +1,122 @@
+"""Per-utterance decode latency and throughput under N concurrent sessions.
+
+    uv run python benchmarks/bench_decode.py --sessions 1 8 32 --utterances 10
+
+Modes:
+- inline: pydub/ffmpeg decode on the event loop (previous server behaviour)
+- pool: pydub/ffmpeg decode in the AudioDecoderPool worker processes
+- fast: in-process numpy wav fast path of the AudioDecoderPool
+
+inline and pool are skipped when ffmpeg is not installed.
+"""
+
+import io
+import base64
+import time
+import wave
+import shutil
+import asyncio
+import argparse
+import statistics
+
+import numpy as np
+
+from rtaoai2.audio import AudioDecoderPool, ffmpeg_to_pcm16
+
+
+def make_utterance(seconds: float, frame_rate: int = 48000, channels: int = 2) -> bytes:
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+    tone = (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(frame_rate)
+        wav.writeframes(np.repeat(tone, channels).tobytes())
+    return buffer.getvalue()
+
+
+def ffmpeg_to_base64(audio: bytes) -> str:
+    return base64.b64encode(ffmpeg_to_pcm16(audio)).decode()
+
+
+async def decode(mode: str, pool: AudioDecoderPool, audio: bytes) -> str:
+    if mode == "inline":
+        return ffmpeg_to_base64(audio)
+    if mode == "pool":
+        # force the ffmpeg path on wav input to compare against inline decoding
+        async with pool.pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool.executor, ffmpeg_to_base64, audio)
+    return await pool.decode(audio)
+
+
+async def loop_lag(stop: asyncio.Event, lags: list[float], interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(mode: str, sessions: int, utterances: int, audio: bytes, pool: AudioDecoderPool) -> dict:
+    latencies: list[float] = []
+
+    async def session() -> None:
+        for _ in range(utterances):
+            start = time.perf_counter()
+            await decode(mode, pool, audio)
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    lags: list[float] = []
+    lag_task = asyncio.create_task(loop_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(session() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+        "utterances_per_s": len(latencies) / elapsed,
+        "max_loop_lag_ms": 1000 * max(lags, default=0.0),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--utterances", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    audio = make_utterance(args.seconds)
+    pool = AudioDecoderPool(max_workers=args.workers)
+    pool.start()
+
+    modes = ["fast"]
+    if shutil.which("ffmpeg"):
+        modes = ["inline", "pool", "fast"]
+    else:
+        print("ffmpeg not found, only benchmarking the fast path")
+
+    print(f"{'mode':>6} {'sessions':>8} {'p50 ms':>8} {'p95 ms':>8} {'utt/s':>8} {'max lag ms':>10}")
+    try:
+        for sessions in args.sessions:
+            for mode in modes:
+                r = await run(mode, sessions, args.utterances, audio, pool)
+                print(
+                    f"{r['mode']:>6} {r['sessions']:>8} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}"
+                    f" {r['utterances_per_s']:>8.1f} {r['max_loop_lag_ms']:>10.1f}"
+                )
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Upstream event dispatch throughput over the recorded dumps/ session.
+
+    uv run python benchmarks/bench_dispatch.py --rounds 200
+
+Modes:
+- dict: json.loads every event then an if/elif chain on its type
+  (previous server behaviour)
+- dispatcher: OpenAIEventConsumer, only subscribed types are parsed
+"""
+
+import json
+import time
+import asyncio
+import argparse
+
+from rtaoai2.openai.consumer import OpenAIEventConsumer, OpenAIStreamingEventConsumer
+from rtaoai2.openai.replay import encode, load_recording
+
+
+def load_session(path: str = "dumps") -> list[bytes]:
+    """Recorded events as sent on the wire, each counted once."""
+    return [encode(recorded.event).encode() for recorded in load_recording(path)]
+
+
+class NullProducer:
+    async def on_response_audio_delta_event(self, event):
+        pass
+
+    async def on_response_audio_transcript_delta_event(self, delta):
+        pass
+
+    async def on_response_audio_input_transcript_done_event(self, transcript):
+        pass
+
+    async def on_response_created(self, event):
+        pass
+
+    async def on_response_done(self, event):
+        pass
+
+
+async def dict_dispatch(producer: NullProducer, raw: bytes) -> None:
+    event = json.loads(raw)
+    event_type = event.get("type")
+    if event_type == "response.audio.delta":
+        await producer.on_response_audio_delta_event(event)
+    elif event_type == "response.audio_transcript.delta":
+        await producer.on_response_audio_transcript_delta_event(event.get("delta"))
+    elif event_type == "conversation.item.input_audio_transcription.completed":
+        await producer.on_response_audio_input_transcript_done_event(event.get("transcript"))
+    elif event_type == "response.created":
+        await producer.on_response_created(event)
+    elif event_type == "response.done":
+        await producer.on_response_done(event)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    events = load_session()
+    size = sum(len(e) for e in events)
+    print(f"{len(events)} events, {size / 1024:.0f} KiB per round")
+
+    producer = NullProducer()
+    consumer = OpenAIStreamingEventConsumer(OpenAIEventConsumer(), producer)
+
+    async def dispatcher_dispatch(producer: NullProducer, raw: bytes) -> None:
+        await consumer.on_raw_event(raw)
+
+    for mode, dispatch in (("dict", dict_dispatch), ("dispatcher", dispatcher_dispatch)):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for raw in events:
+                await dispatch(producer, raw)
+        elapsed = time.perf_counter() - start
+        n = args.rounds * len(events)
+        print(f"{mode:>10}: {n / elapsed:>10.0f} events/s {args.rounds * size / elapsed / 2**20:>8.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
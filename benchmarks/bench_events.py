@@ -0,0 +1,53 @@
+"""Upstream event decoding speed and allocations over the recorded dumps/ session.
+
+    uv run python benchmarks/bench_events.py --rounds 200
+
+Modes:
+- dict: json.loads into plain dicts
+- models: decode_event, the discriminated union TypeAdapter
+"""
+
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Any, Callable
+
+from bench_dispatch import load_session
+
+from rtaoai2.openai.events import EVENTS, decode_event
+
+
+def measure(decode: Callable[[bytes], Any], events: list[bytes], rounds: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for raw in events:
+            decode(raw)
+    events_per_s = rounds * len(events) / (time.perf_counter() - start)
+
+    # bytes still allocated by one decoded copy of the session
+    tracemalloc.start()
+    decoded = [decode(raw) for raw in events]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+    return events_per_s, allocated / len(events)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    # client events from the recording are not decoded upstream
+    events = [raw for raw in load_session() if json.loads(raw)["type"] in EVENTS]
+    size = sum(len(e) for e in events)
+    print(f"{len(events)} events, {size / 1024:.0f} KiB per round")
+
+    for mode, decode in (("dict", json.loads), ("models", decode_event)):
+        events_per_s, allocated = measure(decode, events, args.rounds)
+        print(f"{mode:>6}: {events_per_s:>10.0f} events/s {allocated:>10.0f} bytes/event")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
-import React, { useState, useEffect, useRef, MutableRefObject } from 'react';
+import React, { useState, useEffect, useRef, useCallback, useMemo, MutableRefObject } from 'react';
 
 import useWebSocket, { ReadyState } from 'react-use-websocket';
 
-import Conversation, {ConversationModel} from './Conversation';
+import {ConversationModel} from './Conversation';
 import Conversations, {ConversationsModel} from './Conversations';
 
 
 // WebSocket URL (replace with your WebSocket server URL)
-const WEBSOCKET_URL = 'ws://127.0.0.1:8000/ws';
+// input=stream: microphone audio is sent as pcm16 frames while recording
+// audio=binary: response audio is received as binary pcm16 frames
+// conversation=true: the conversation is kept by the server and sent as diffs
+const WEBSOCKET_URL = 'ws://127.0.0.1:8000/ws?input=stream&audio=binary&conversation=true';
+
+// Sample rate expected upstream for pcm16 input audio
+const INPUT_SAMPLE_RATE = 24000;
+// Samples per streamed frame (~43ms at 24kHz)
+const INPUT_FRAME_SIZE = 1024;
+
+// Response audio scheduled and not finished yet, stopped on audio.flush
+const scheduledSources = new Set<AudioBufferSourceNode>();
+// Context time the audio playing back to back started at
+let playbackStart: number | null = null;
 
 function playPcm16Base64Audio(
   globalCurrentTime: MutableRefObject<number>,
@@ -19,6 +32,16 @@ function playPcm16Base64Audio(
   // Decode the base64 string to an ArrayBuffer
   const audioData = base64ToArrayBuffer(base64String);
 
+  playPcm16Audio(globalCurrentTime, audioContext, audioData, sampleRate, numChannels);
+}
+
+function playPcm16Audio(
+  globalCurrentTime: MutableRefObject<number>,
+  audioContext: MutableRefObject<AudioContext>,
+  audioData: ArrayBuffer,
+  sampleRate = 16000,
+  numChannels = 1,
+) {
   // Convert PCM 16-bit little-endian to an AudioBuffer
   const audioBuffer = convertPcm16ToAudioBuffer(
     audioData,
@@ -32,6 +55,9 @@ function playPcm16Base64Audio(
     globalCurrentTime.current,
     audioContext.current.currentTime,
   );
+  if (scheduledSources.size === 0) {
+    playbackStart = startTime;
+  }
   playAudioBuffer(audioBuffer, audioContext.current, startTime);
 
   // Update the global time to keep subsequent chunks contiguous
@@ -52,6 +78,16 @@ function base64ToArrayBuffer(base64: string) {
   return buffer;
 }
 
+// Helper function to split a binary audio frame:
+// uint8 response id length, response id, uint32 little-endian sequence, pcm16 audio
+function parseAudioFrame(frame: ArrayBuffer) {
+  const view = new DataView(frame);
+  const responseIdLength = view.getUint8(0);
+  const responseId = new TextDecoder().decode(new Uint8Array(frame, 1, responseIdLength));
+  const sequence = view.getUint32(1 + responseIdLength, true);
+  return {responseId, sequence, audio: frame.slice(1 + responseIdLength + 4)};
+}
+
 // Helper function to convert PCM 16-bit little-endian to AudioBuffer
 function convertPcm16ToAudioBuffer(arrayBuffer: ArrayBuffer, audioContext: BaseAudioContext, sampleRate: number, numChannels: number) {
   const dataView = new DataView(arrayBuffer);
@@ -76,19 +112,156 @@ function playAudioBuffer(audioBuffer: AudioBuffer, audioContext: BaseAudioContex
   const source = audioContext.createBufferSource();
   source.buffer = audioBuffer;
   source.connect(audioContext.destination);
+  source.onended = () => {
+    scheduledSources.delete(source);
+    if (scheduledSources.size === 0) playbackStart = null;
+  };
+  scheduledSources.add(source);
   source.start(startTime); // Schedule to start at the given time
 }
-function initConversation(n: number) {
-  return {input_transcript: [], output_transcript: [], number: n};
+
+// Helper function to stop the scheduled audio, returns the milliseconds played
+function flushPlayback(globalCurrentTime: MutableRefObject<number>, audioContext: MutableRefObject<AudioContext>) {
+  const played = playbackStart === null ? 0 : Math.max(0, audioContext.current.currentTime - playbackStart) * 1000;
+  scheduledSources.forEach(source => {
+    source.onended = null;
+    source.stop();
+  });
+  scheduledSources.clear();
+  playbackStart = null;
+  globalCurrentTime.current = audioContext.current.currentTime;
+  return Math.round(played);
+}
+
+// Helper function to convert float samples in [-1, 1] to PCM 16-bit little-endian
+function convertFloat32ToPcm16(samples: Float32Array) {
+  const buffer = new ArrayBuffer(samples.length * 2);
+  const view = new DataView(buffer);
+  for (let i = 0; i < samples.length; i++) {
+    const s = Math.max(-1, Math.min(1, samples[i]));
+    view.setInt16(i * 2, s < 0 ? s * 0x8000 : s * 0x7FFF, true);
+  }
+  return buffer;
+}
+
+// Item of the server side conversation, see rtaoai2.ui.conversation
+interface ItemModel {
+  id: string;
+  role: string | null;
+  response_id: string | null;
+  status: string;
+  text: string;
+}
+
+type TurnSide = "input_transcript" | "output_transcript";
+
+// Where an item is shown: its turn and its line in that turn
+interface ItemPlace {
+  turn: number;
+  side: TurnSide;
+  line: number;
+}
+
+interface ConversationState {
+  version: number;
+  items: Map<string, ItemModel>;
+  places: Map<string, ItemPlace>;
+  // response id -> its items
+  responses: Map<string, string[]>;
+  // turns oldest first, a turn is replaced, never mutated, when one of its
+  // items changes so the others keep their identity and are not rendered again
+  turns: ConversationModel[];
+}
+
+function emptyConversation(): ConversationState {
+  return {version: 0, items: new Map(), places: new Map(), responses: new Map(), turns: []};
+}
+
+// Line shown for an item, an answer the user interrupted is marked
+function itemLine(item: ItemModel) {
+  return item.status === "truncated" ? `${item.text} [interrupted]` : item.text;
+}
+
+function replaceTurn(state: ConversationState, number: number, turn: ConversationModel) {
+  state.turns = state.turns.slice();
+  state.turns[number] = turn;
+}
+
+// Add an item at the end of the conversation, a user item starts a new turn
+function addItem(state: ConversationState, item: ItemModel) {
+  state.items.set(item.id, item);
+  if (item.response_id !== null) {
+    const items = state.responses.get(item.response_id) ?? [];
+    state.responses.set(item.response_id, [...items, item.id]);
+  }
+  if (item.role === "user" || state.turns.length === 0) {
+    const number = state.turns.length;
+    state.turns = [...state.turns, {input_transcript: [], output_transcript: [], number}];
+  }
+  const number = state.turns.length - 1;
+  const side = item.role === "user" ? "input_transcript" : "output_transcript";
+  const turn = state.turns[number];
+  state.places.set(item.id, {turn: number, side, line: turn[side].length});
+  replaceTurn(state, number, {...turn, [side]: [...turn[side], itemLine(item)]});
+}
+
+// Show the new text or status of an item, only its turn changes
+function updateItem(state: ConversationState, item: ItemModel) {
+  const place = state.places.get(item.id);
+  if (!place) return;
+  const turn = state.turns[place.turn];
+  const lines = turn[place.side].slice();
+  lines[place.line] = itemLine(item);
+  replaceTurn(state, place.turn, {...turn, [place.side]: lines});
+}
+
+// Apply a conversation.snapshot or conversation.diff message, false when it
+// was already part of the snapshot
+function applyConversation(state: ConversationState, message: {type: string, data: any}) {
+  const data = message.data;
+  if (message.type === "conversation.snapshot") {
+    Object.assign(state, emptyConversation(), {version: data.version});
+    data.items.forEach((item: ItemModel) => addItem(state, item));
+    return true;
+  }
+  // replayed after a reconnect
+  if (data.version <= state.version) return false;
+  state.version = data.version;
+  const item = state.items.get(data.id);
+  if (data.op === "item") {
+    addItem(state, data.item);
+  }
+  else if (data.op === "text" && item && item.text.length === data.offset) {
+    item.text += data.delta;
+    updateItem(state, item);
+  }
+  else if (data.op === "item.done" && item) {
+    item.status = data.status;
+    if (data.text !== undefined) item.text = data.text;
+    updateItem(state, item);
+  }
+  else if (data.op === "item.truncated" && item) {
+    item.status = "truncated";
+    updateItem(state, item);
+  }
+  else if (data.op === "turn.done") {
+    (state.responses.get(data.response_id) ?? []).forEach(id => {
+      const i = state.items.get(id);
+      if (i && i.status === "in_progress") i.status = data.status;
+    });
+    state.responses.delete(data.response_id);
+  }
+  return true;
 }
 
 function App() {
   const [isRecording, setIsRecording] = useState(false);
-  const mediaRef = useRef<MediaRecorder | null>(null);
-  const audioRef = useRef<Blob | null>(null);
-  const [conversationItems, setConversationItems] = useState<ConversationModel[]>([]);
-  const [conversation, setConversation] = useState<ConversationModel>(initConversation(0));
-  const [conversationIsFinished, setConversationIsFinished] = useState(false);
+  const streamRef = useRef<MediaStream | null>(null);
+  const recorderRef = useRef<ScriptProcessorNode | null>(null);
+  const inputAudioContext = useRef<AudioContext | null>(null);
+  // updated in place by each diff, but for its turns rendered from turns
+  const conversation = useRef<ConversationState>(emptyConversation());
+  const [turns, setTurns] = useState<ConversationModel[]>([]);
 
 
   const audioContext = useRef(new (window.AudioContext)());
@@ -96,20 +269,35 @@ function App() {
 
 
 
-  const { sendMessage, lastMessage, readyState } = useWebSocket(WEBSOCKET_URL, {
+  // Token of the server session, resumed when reconnecting
+  const sessionToken = useRef<string | null>(null);
+  const getSocketUrl = useCallback(() => Promise.resolve(
+    sessionToken.current ? `${WEBSOCKET_URL}&resume=${sessionToken.current}` : WEBSOCKET_URL
+  ), []);
+
+  const { sendMessage, lastMessage, readyState } = useWebSocket(getSocketUrl, {
+    shouldReconnect: () => true,
+    onOpen: (event) => {
+      (event.target as WebSocket).binaryType = 'arraybuffer';
+    },
     onMessage: (event) => {
+      if (event.data instanceof ArrayBuffer) {
+	const frame = parseAudioFrame(event.data);
+	playPcm16Audio(globalCurrentTime, audioContext, frame.audio, 24000, 1);
+	return;
+      }
       const parsedEvent = JSON.parse(event.data);
-      if(parsedEvent.type === "input_transcript") {
-	setConversation(c => ({...c, input_transcript: [...c.input_transcript, parsedEvent.data]}));
-	setConversationIsFinished(true);
+      if(parsedEvent.type === "session") {
+	sessionToken.current = parsedEvent.data;
       }
-      if(parsedEvent.type === "transcript") {
-	setConversation(c => ({...c, output_transcript: [...c.output_transcript, parsedEvent.data]}));
+      if(parsedEvent.type === "conversation.snapshot" || parsedEvent.type === "conversation.diff") {
+	if (applyConversation(conversation.current, parsedEvent)) {
+	  setTurns(conversation.current.turns);
+	}
       }
-      else if(parsedEvent.type === "message" && parsedEvent.data === "response.done" && conversationIsFinished) {
-	setConversationItems(i => [conversation, ...i]);
-	setConversation(initConversation(conversationItems.length+1));
-	setConversationIsFinished(false);
+      else if(parsedEvent.type === "audio.flush") {
+	// the response was interrupted, its remaining audio is stale
+	flushPlayback(globalCurrentTime, audioContext);
       }
       else if(parsedEvent.type === "audio") {
 	playPcm16Base64Audio(globalCurrentTime, audioContext, parsedEvent.data, 24000, 1);
@@ -118,38 +306,46 @@ function App() {
   }
   );
 
-  // Request microphone access and set up MediaRecorder
+  // Request microphone access
   useEffect(() => {
     navigator.mediaDevices.getUserMedia({ audio: true })
       .then(stream => {
-	if (readyState != ReadyState.OPEN) return;
-	const recorder = new MediaRecorder(stream, {
-	  mimeType: 'audio/webm;codecs=pcm', // Specify PCM format
-	});
-	mediaRef.current =recorder;
-
-	recorder.ondataavailable = (event: BlobEvent) => {
-	  audioRef.current = event.data;
-	};
-
-	recorder.onstop = () => {
-	  if (audioRef.current) {
-	    const audioBlob = new Blob([audioRef.current], { type: 'audio/pcm' });
-	    console.log(readyState);
-	    console.log(ReadyState.OPEN);
-	    if (audioBlob) {
-	      sendMessage(audioBlob);
-	    }
-	  };
-	  if (mediaRef.current) {
-	    mediaRef.current.stop()
-	  }
-	}
+	streamRef.current = stream;
       })
       .catch(error => {
 	console.error('Microphone access denied:', error);
       });
-  }, [sendMessage, readyState]);
+  }, []);
+
+  // Stream the microphone as pcm16 frames until stopRecording is called
+  const startRecording = () => {
+    if (!streamRef.current) return;
+    if (scheduledSources.size > 0) {
+      // talking over the response interrupts it, the server truncates it to what was heard
+      const played = flushPlayback(globalCurrentTime, audioContext);
+      sendMessage(JSON.stringify({ type: 'response.cancel', played_ms: played }));
+    }
+    if (!inputAudioContext.current) {
+      inputAudioContext.current = new AudioContext({ sampleRate: INPUT_SAMPLE_RATE });
+    }
+    const context = inputAudioContext.current;
+    const source = context.createMediaStreamSource(streamRef.current);
+    const recorder = context.createScriptProcessor(INPUT_FRAME_SIZE, 1, 1);
+    recorder.onaudioprocess = (event: AudioProcessingEvent) => {
+      sendMessage(convertFloat32ToPcm16(event.inputBuffer.getChannelData(0)));
+    };
+    source.connect(recorder);
+    recorder.connect(context.destination);
+    recorderRef.current = recorder;
+  };
+
+  const stopRecording = () => {
+    if (!recorderRef.current) return;
+    recorderRef.current.disconnect();
+    recorderRef.current.onaudioprocess = null;
+    recorderRef.current = null;
+    sendMessage(JSON.stringify({ type: 'input_audio.commit' }));
+  };
 
 
   // Attach and detach event listeners for space bar
@@ -167,8 +363,8 @@ function App() {
 
   // Handle keydown event for space bar
   const handleKeyDown = (event: KeyboardEvent) => {
-    if (event.code === 'Space' && !isRecording && mediaRef.current) {
-      mediaRef.current.start();
+    if (event.code === 'Space' && !isRecording && streamRef.current) {
+      startRecording();
       setIsRecording(true);
       console.log('Recording started...');
     }
@@ -176,20 +372,22 @@ function App() {
 
   // Handle keyup event to stop recording
   const handleKeyUp = (event: KeyboardEvent) => {
-    if (event.code === 'Space' && isRecording && mediaRef.current) {
-      mediaRef.current.stop();
+    if (event.code === 'Space' && isRecording) {
+      stopRecording();
       setIsRecording(false);
       console.log('Recording stopped.');
     }
   };
 
+  // newest first
+  const shownTurns = useMemo(() => turns.slice().reverse(), [turns]);
+
   return (
     <div>
       <p> Websocket Satus : {readyState == ReadyState.OPEN ? "Ready" : "Waiting"}</p>
       <p>Press and hold the space bar to record audio. Release to stop.</p>
       <p>Status: {isRecording ? 'Recording...' : 'Idle'}</p>
-      <Conversation input_transcript={conversation.input_transcript} output_transcript={conversation.output_transcript} number={conversation.number}/>
-      <Conversations conversations={conversationItems}/>
+      <Conversations conversations={shownTurns}/>
     </div>
   );
 };
@@ -16,4 +16,5 @@ const Conversation = ({input_transcript, output_transcript, number}: Conversatio
    )
 };
 
-export default Conversation;
+// a turn is only rendered again when it was replaced
+export default React.memo(Conversation);
@@ -1,3 +1,29 @@
+import argparse
+
+
 def main() -> int:
-    print("Hello from rtaoai2!")
-    return 0
+    from rtaoai2 import bench, transcode
+
+    parser = argparse.ArgumentParser(prog="rtaoai2")
+    commands = parser.add_subparsers(required=True)
+
+    bench_parser = commands.add_parser(
+        "bench",
+        help="concurrent /ws load generator",
+        description=bench.__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    bench.add_arguments(bench_parser)
+    bench_parser.set_defaults(command=bench.main)
+
+    codec_bench_parser = commands.add_parser(
+        "codec-bench",
+        help="CPU cost of the output audio codecs per stream",
+        description=transcode.__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    transcode.add_arguments(codec_bench_parser)
+    codec_bench_parser.set_defaults(command=transcode.main)
+
+    args = parser.parse_args()
+    return args.command(args)
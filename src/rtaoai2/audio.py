@@ -0,0 +1,347 @@
+import asyncio
+import base64
+import io
+import math
+import os
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from rtaoai2 import g711
+
+# Upstream input audio format: 24kHz mono pcm16 little-endian
+SAMPLE_RATE = 24000
+
+# Audio formats of the realtime API, g711 is 8kHz
+PCM16 = "pcm16"
+G711_ULAW = "g711_ulaw"
+G711_ALAW = "g711_alaw"
+G711_ENCODERS = {G711_ULAW: g711.ulaw_encode, G711_ALAW: g711.alaw_encode}
+AUDIO_FORMATS = (PCM16, *G711_ENCODERS)
+
+
+def bytes_per_ms(audio_format: str = PCM16) -> int:
+    """Size of a millisecond of mono audio in one of AUDIO_FORMATS."""
+    if audio_format == PCM16:
+        return SAMPLE_RATE * 2 // 1000
+    return g711.SAMPLE_RATE // 1000
+
+
+def is_wav(audio_bytes: bytes) -> bool:
+    return audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE"
+
+
+def pcm_to_samples(pcm: bytes, sample_width: int) -> np.ndarray:
+    """Convert little-endian pcm of any wave sample width to float32 samples."""
+    pcm = pcm[: len(pcm) - len(pcm) % sample_width]
+    if sample_width == 1:
+        # 8 bits wave is unsigned
+        return (np.frombuffer(pcm, dtype=np.uint8).astype(np.float32) - 128) * 256
+    if sample_width == 2:
+        return np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+    if sample_width == 3:
+        raw = np.frombuffer(pcm, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = np.where(samples & 0x800000, samples - (1 << 24), samples)
+        return samples.astype(np.float32) / 256
+    if sample_width == 4:
+        return np.frombuffer(pcm, dtype="<i4").astype(np.float32) / 65536
+    raise ValueError(f"unsupported sample width: {sample_width}")
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(
+    up: int, down: int, zero_crossings: int = 8
+) -> tuple[np.ndarray, int]:
+    """Kaiser windowed sinc low-pass resampling by up/down, and its delay.
+
+    The cutoff sits just below the nyquist frequency of the lower rate. The
+    taps come one row per phase: row p weighs the input samples, newest
+    first, of an output falling p upsampled steps after the newest one; each
+    row sums to 1. The delay is in upsampled steps.
+    """
+    cutoff = 0.95 / (2 * max(up, down))
+    half = int(np.ceil(zero_crossings / (2 * cutoff)))
+    taps = -(-(2 * half + 1) // up)
+    t = np.arange(taps * up) - half
+    window = np.i0(8.0 * np.sqrt(np.clip(1 - (t / half) ** 2, 0, None))) / np.i0(8.0)
+    h = np.sinc(2 * cutoff * t) * np.where(np.abs(t) <= half, window, 0)
+    phases = h.reshape(taps, up).T
+    return (phases / phases.sum(axis=1, keepdims=True)).astype(np.float32), half
+
+
+class Resampler:
+    """Polyphase resampler of a mono stream fed in chunks of any size.
+
+    The filter history and the position of the next output are carried from
+    one chunk to the next, so chunks are resampled as the stream they come
+    from: no clicks at their edges and no drift of the output length. Outputs
+    lag the input by half the filter, flush() returns the ones left at the
+    end of the stream.
+    """
+
+    block = 8192
+
+    def __init__(self, frame_rate: int, rate: int = SAMPLE_RATE):
+        g = math.gcd(frame_rate, rate)
+        self.up = rate // g
+        self.down = frame_rate // g
+        self.phases, self.delay = polyphase_filter(self.up, self.down)
+        self.taps = self.phases.shape[1]
+        self.reset()
+
+    def reset(self) -> None:
+        self.history: np.ndarray | None = None
+        # upsampled time of the next output, from the start of the history
+        self.next = 0
+        self.received = 0
+        self.produced = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if not len(samples):
+            return np.zeros(0, dtype=np.float32)
+        samples = samples.astype(np.float32, copy=False)
+        if self.history is None:
+            # the stream is held at its first sample before it starts
+            self.history = np.full(self.taps - 1, samples[0], dtype=np.float32)
+            self.next = (self.taps - 1) * self.up + self.delay
+        buffer = np.concatenate((self.history, samples))
+        count = max(0, -(-(len(buffer) * self.up - self.next) // self.down))
+        output = np.empty(count, dtype=np.float32)
+        offsets = np.arange(self.taps)
+        for start in range(0, count, self.block):
+            times = self.next + self.down * np.arange(
+                start, min(count, start + self.block)
+            )
+            newest = times // self.up
+            rows = buffer[newest[:, None] - offsets] * self.phases[times % self.up]
+            output[start : start + len(times)] = rows.sum(axis=1)
+        self.next += count * self.down
+        consumed = len(buffer) - (self.taps - 1)
+        self.history = buffer[consumed:]
+        self.next -= consumed * self.up
+        self.received += len(samples)
+        self.produced += count
+        return output
+
+    def flush(self) -> np.ndarray:
+        if self.history is None:
+            return np.zeros(0, dtype=np.float32)
+        left = -(-self.received * self.up // self.down) - self.produced
+        # hold the last sample for as long as the filter looks ahead
+        tail = np.full(self.taps, self.history[-1], dtype=np.float32)
+        output = self.process(tail)[:left]
+        self.reset()
+        return output
+
+
+def resample(
+    samples: np.ndarray,
+    channels: int,
+    frame_rate: int,
+    rate: int = SAMPLE_RATE,
+    resampler: Resampler | None = None,
+) -> bytes:
+    """Downmix interleaved samples to mono and resample them to pcm16.
+
+    Chunks of a stream pass the resampler of the stream, which keeps its
+    state between them; without one the samples are a whole stream.
+    """
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels]
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if frame_rate != rate and len(samples):
+        if resampler is not None:
+            samples = resampler.process(samples)
+        else:
+            resampler = Resampler(frame_rate, rate)
+            samples = np.concatenate((resampler.process(samples), resampler.flush()))
+    return samples_to_pcm16(samples)
+
+
+def samples_to_pcm16(samples: np.ndarray) -> bytes:
+    return np.clip(np.rint(samples), -32768, 32767).astype("<i2").tobytes()
+
+
+def pcm16_to_pcm16(
+    pcm: bytes, frame_rate: int, channels: int = 1, resampler: Resampler | None = None
+) -> bytes:
+    if frame_rate == SAMPLE_RATE and channels == 1:
+        return pcm
+    return resample(pcm_to_samples(pcm, 2), channels, frame_rate, resampler=resampler)
+
+
+def wav_to_pcm16(audio_bytes: bytes) -> bytes:
+    with wave.open(io.BytesIO(audio_bytes)) as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        frame_rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    if sample_width == 2:
+        return pcm16_to_pcm16(pcm, frame_rate, channels)
+    return resample(pcm_to_samples(pcm, sample_width), channels, frame_rate)
+
+
+def pcm16_to_wav(pcm: bytes, frame_rate: int = SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(frame_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def ffmpeg_to_pcm16(audio_bytes: bytes) -> bytes:
+    from pydub import AudioSegment  # type: ignore[import-untyped]
+
+    # Load the audio file from the byte stream
+    audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
+
+    # Resample to 24kHz mono pcm16
+    return (
+        audio.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2).raw_data
+    )
+
+
+def decode_to_pcm16(audio_bytes: bytes) -> bytes:
+    if is_wav(audio_bytes):
+        return wav_to_pcm16(audio_bytes)
+    return ffmpeg_to_pcm16(audio_bytes)
+
+
+def audio_to_base64(audio_bytes: bytes) -> str:
+    return base64.b64encode(decode_to_pcm16(audio_bytes)).decode()
+
+
+def pcm16_to_base64(
+    pcm: bytes, frame_rate: int = SAMPLE_RATE, resampler: Resampler | None = None
+) -> str:
+    return base64.b64encode(
+        pcm16_to_pcm16(pcm, frame_rate, resampler=resampler)
+    ).decode()
+
+
+def encode_audio(
+    pcm: bytes, audio_format: str = PCM16, resampler: Resampler | None = None
+) -> bytes:
+    """24kHz pcm16 in one of AUDIO_FORMATS, resampler is the 8kHz one of a g711 stream."""
+    if audio_format == PCM16:
+        return pcm
+    if audio_format not in G711_ENCODERS:
+        raise ValueError(f"unsupported audio format: {audio_format}")
+    pcm = resample(pcm_to_samples(pcm, 2), 1, SAMPLE_RATE, g711.SAMPLE_RATE, resampler)
+    return G711_ENCODERS[audio_format](pcm)
+
+
+def encode_to_base64(
+    pcm: bytes, audio_format: str = PCM16, resampler: Resampler | None = None
+) -> str:
+    return base64.b64encode(encode_audio(pcm, audio_format, resampler)).decode()
+
+
+def flush_stream(
+    audio_format: str = PCM16,
+    resampler: Resampler | None = None,
+    format_resampler: Resampler | None = None,
+) -> str:
+    """Base64 of what the resamplers of a stream still hold, in audio_format.
+
+    resampler takes the client audio to 24kHz, format_resampler is the one
+    passed to encode_audio; both start over afterwards.
+    """
+    pcm = samples_to_pcm16(resampler.flush()) if resampler is not None else b""
+    audio = encode_audio(pcm, audio_format, format_resampler)
+    if format_resampler is not None:
+        audio += G711_ENCODERS[audio_format](samples_to_pcm16(format_resampler.flush()))
+    return base64.b64encode(audio).decode()
+
+
+class AudioDecoderPool:
+    """Decode client audio to base64 24kHz pcm16 without blocking the event loop.
+
+    Containers needing ffmpeg are decoded by long-lived worker processes,
+    wav and raw pcm16 are converted in-process on a worker thread.
+    At most max_pending decodes are queued, other callers wait their turn.
+    """
+
+    def __init__(self, max_workers: int | None = None, max_pending: int | None = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending: asyncio.Semaphore | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    @property
+    def pending(self) -> asyncio.Semaphore:
+        if self._pending is None:
+            self._pending = asyncio.Semaphore(self.max_pending)
+        return self._pending
+
+    def start(self) -> None:
+        # spawn workers up front so the first utterance doesn't pay for it
+        for _ in range(self.max_workers):
+            self.executor.submit(int)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def decode(self, audio_bytes: bytes, frame_rate: int | None = None) -> str:
+        """frame_rate is set for raw mono pcm16 at that rate, which never needs ffmpeg."""
+        if frame_rate is not None:
+            return await self.decode_pcm16(audio_bytes, frame_rate)
+        async with self.pending:
+            if is_wav(audio_bytes):
+                return await asyncio.to_thread(audio_to_base64, audio_bytes)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, audio_to_base64, audio_bytes
+            )
+
+    async def decode_pcm(
+        self, audio_bytes: bytes, frame_rate: int | None = None
+    ) -> bytes:
+        """Like decode, as raw 24kHz pcm16."""
+        if frame_rate is not None:
+            return await self.resample_pcm16(audio_bytes, frame_rate)
+        async with self.pending:
+            if is_wav(audio_bytes):
+                return await asyncio.to_thread(wav_to_pcm16, audio_bytes)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, decode_to_pcm16, audio_bytes
+            )
+
+    async def resample_pcm16(
+        self,
+        pcm: bytes,
+        frame_rate: int = SAMPLE_RATE,
+        resampler: Resampler | None = None,
+    ) -> bytes:
+        """Chunks of a stream pass its resampler, see resample."""
+        if frame_rate == SAMPLE_RATE:
+            return pcm
+        async with self.pending:
+            return await asyncio.to_thread(
+                pcm16_to_pcm16, pcm, frame_rate, 1, resampler
+            )
+
+    async def decode_pcm16(
+        self,
+        pcm: bytes,
+        frame_rate: int = SAMPLE_RATE,
+        resampler: Resampler | None = None,
+    ) -> str:
+        if frame_rate == SAMPLE_RATE:
+            return base64.b64encode(pcm).decode()
+        async with self.pending:
+            return await asyncio.to_thread(pcm16_to_base64, pcm, frame_rate, resampler)
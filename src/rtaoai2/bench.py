@@ -0,0 +1,226 @@
+"""Load generator opening concurrent clients against the /ws endpoint.
+
+    uv run rtaoai2 bench --url ws://127.0.0.1:8000/ws --sessions 50 --audio hello.wav
+
+Each client sends its utterances at the pace they would be spoken, then
+measures from the end of the utterance to the first audio, the first
+transcript and response.done. Results are printed as json.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Any
+from urllib.parse import urlencode
+
+import numpy as np
+import websockets
+
+from rtaoai2.audio import SAMPLE_RATE, is_wav, pcm16_to_wav, wav_to_pcm16
+
+# streamed frame duration, like the React client
+FRAME_SECONDS = 0.02
+METRICS = ("first_audio", "first_transcript", "response_done")
+
+
+def load_utterance(path: str) -> bytes:
+    """24kHz mono pcm16 from a wav file, or a raw pcm16 file already in that format."""
+    with open(path, "rb") as f:
+        audio = f.read()
+    return wav_to_pcm16(audio) if is_wav(audio) else audio
+
+
+def synthetic_utterance(seconds: float = 1) -> bytes:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2").tobytes()
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def summarize(values: list[float]) -> dict[str, Any]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+class ClientStats:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = {metric: [] for metric in METRICS}
+        self.turns = 0
+        self.errors: list[str] = []
+        self.audio_bytes = 0
+        self.messages = 0
+
+
+async def send_utterance(ws, utterance: bytes, input: str, pace: float) -> None:
+    if input == "blob":
+        # the whole utterance is recorded before being sent as a wav file,
+        # raw pcm16 would be handed to ffmpeg by the server
+        await asyncio.sleep(len(utterance) / 2 / SAMPLE_RATE * pace)
+        await ws.send(pcm16_to_wav(utterance))
+        return
+
+    frame_size = int(FRAME_SECONDS * SAMPLE_RATE) * 2
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i, offset in enumerate(range(0, len(utterance), frame_size)):
+        await ws.send(utterance[offset : offset + frame_size])
+        wait = start + (i + 1) * FRAME_SECONDS * pace - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+    await ws.send(json.dumps({"type": "input_audio.commit"}))
+
+
+async def receive_response(ws, stats: ClientStats, end_of_utterance: float) -> None:
+    first: dict[str, float] = {}
+    async for message in ws:
+        now = time.perf_counter()
+        stats.messages += 1
+        if isinstance(message, bytes):
+            kind = "first_audio"
+            stats.audio_bytes += len(message)
+        else:
+            event = json.loads(message)
+            kind = {"audio": "first_audio", "transcript": "first_transcript"}.get(
+                event["type"], ""
+            )
+            if event["type"] == "audio":
+                stats.audio_bytes += len(event["data"]) * 3 // 4
+            elif event["type"] == "message" and event["data"] == "response.done":
+                first.setdefault("response_done", now)
+                break
+        if kind:
+            first.setdefault(kind, now)
+
+    for metric, at in first.items():
+        stats.latencies[metric].append(at - end_of_utterance)
+    stats.turns += 1
+
+
+async def run_client(
+    url: str,
+    utterances: list[bytes],
+    turns: int,
+    input: str,
+    pace: float,
+    timeout: float,
+    stats: ClientStats,
+) -> None:
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            for turn in range(turns):
+                await send_utterance(
+                    ws, utterances[turn % len(utterances)], input, pace
+                )
+                await asyncio.wait_for(
+                    receive_response(ws, stats, time.perf_counter()), timeout
+                )
+    # any failure of a client is counted, not raised
+    except Exception as e:  # noqa: BLE001
+        stats.errors.append(f"{type(e).__name__}: {e}")
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    utterances = [load_utterance(path) for path in args.audio] or [
+        synthetic_utterance()
+    ]
+    url = f"{args.url}?{urlencode({'input': args.input, 'audio': args.audio_format})}"
+
+    clients = [ClientStats() for _ in range(args.sessions)]
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_client(
+                url, utterances, args.turns, args.input, args.pace, args.timeout, stats
+            )
+            for stats in clients
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    turns = sum(c.turns for c in clients)
+    return {
+        "config": {
+            "url": args.url,
+            "sessions": args.sessions,
+            "turns": args.turns,
+            "input": args.input,
+            "audio_format": args.audio_format,
+            "pace": args.pace,
+            "audio": args.audio,
+        },
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "elapsed": elapsed,
+        "latency": {
+            metric: summarize([v for c in clients for v in c.latencies[metric]])
+            for metric in METRICS
+        },
+        "throughput": {
+            "turns_per_s": turns / elapsed,
+            "messages_per_s": sum(c.messages for c in clients) / elapsed,
+            "audio_bytes_per_s": sum(c.audio_bytes for c in clients) / elapsed,
+        },
+        "turns": turns,
+        "errors": [e for c in clients for e in c.errors],
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent clients")
+    parser.add_argument(
+        "--turns", type=int, default=3, help="utterances sent per client"
+    )
+    parser.add_argument(
+        "--audio",
+        nargs="*",
+        default=[],
+        help="wav or 24kHz pcm16 files, a tone by default",
+    )
+    parser.add_argument("--input", choices=("stream", "blob"), default="stream")
+    parser.add_argument("--audio-format", choices=("json", "binary"), default="binary")
+    parser.add_argument(
+        "--pace",
+        type=float,
+        default=1,
+        help="utterance duration multiplier, 0 sends at once",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="seconds to wait for a response"
+    )
+    parser.add_argument(
+        "--output", help="write the json report to this file instead of stdout"
+    )
+
+
+def main(args: argparse.Namespace) -> int:
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 1 if report["errors"] else 0
@@ -0,0 +1,92 @@
+"""Table driven G.711 μ-law and A-law companding of pcm16.
+
+Every pcm16 value is encoded once at import into a 64K table, encoding is
+then a single numpy lookup. Decoding uses 256 entry tables.
+"""
+
+import numpy as np
+
+SAMPLE_RATE = 8000
+
+ULAW_BIAS = 0x84
+ULAW_CLIP = 8159
+ULAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+ALAW_SEGMENT_ENDS = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+# every pcm16 value, in the order of their bits read as uint16
+PCM16_VALUES = (
+    np.arange(1 << 16, dtype=np.uint32)
+    .astype(np.uint16)
+    .view(np.int16)
+    .astype(np.int32)
+)
+
+
+def make_ulaw_table(pcm: np.ndarray) -> np.ndarray:
+    # on 14 bits, like the reference implementation
+    pcm = pcm >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm), ULAW_CLIP) + (ULAW_BIAS >> 2)
+    segment = np.searchsorted(ULAW_SEGMENT_ENDS, magnitude)
+    ulaw = (np.minimum(segment, 7) << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+    ulaw = np.where(segment >= 8, 0x7F, ulaw)
+    return ((ulaw ^ mask) & 0xFF).astype(np.uint8)
+
+
+def make_alaw_table(pcm: np.ndarray) -> np.ndarray:
+    pcm = pcm >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    magnitude = np.where(pcm >= 0, pcm, -pcm - 1)
+    segment = np.searchsorted(ALAW_SEGMENT_ENDS, magnitude)
+    shift = np.where(segment < 2, 1, segment)
+    alaw = (np.minimum(segment, 7) << 4) | ((magnitude >> shift) & 0x0F)
+    alaw = np.where(segment >= 8, 0x7F, alaw)
+    return ((alaw ^ mask) & 0xFF).astype(np.uint8)
+
+
+def make_ulaw_decode_table() -> np.ndarray:
+    ulaw = ~np.arange(256) & 0xFF
+    exponent = (ulaw >> 4) & 0x07
+    magnitude = (((ulaw & 0x0F) << 3) + ULAW_BIAS << exponent) - ULAW_BIAS
+    return np.where(ulaw & 0x80, -magnitude, magnitude).astype("<i2")
+
+
+def make_alaw_decode_table() -> np.ndarray:
+    alaw = np.arange(256) ^ 0x55
+    segment = (alaw & 0x70) >> 4
+    magnitude = ((alaw & 0x0F) << 4) + np.where(segment == 0, 8, 0x108)
+    magnitude = np.where(
+        segment > 1, magnitude << np.maximum(segment - 1, 0), magnitude
+    )
+    return np.where(alaw & 0x80, magnitude, -magnitude).astype("<i2")
+
+
+ULAW_ENCODE = make_ulaw_table(PCM16_VALUES)
+ALAW_ENCODE = make_alaw_table(PCM16_VALUES)
+ULAW_DECODE = make_ulaw_decode_table()
+ALAW_DECODE = make_alaw_decode_table()
+
+
+def encode(pcm: bytes, table: np.ndarray) -> bytes:
+    pcm = pcm[: len(pcm) - len(pcm) % 2]
+    return table[np.frombuffer(pcm, dtype="<u2")].tobytes()
+
+
+def decode(g711: bytes, table: np.ndarray) -> bytes:
+    return table[np.frombuffer(g711, dtype=np.uint8)].tobytes()
+
+
+def ulaw_encode(pcm: bytes) -> bytes:
+    return encode(pcm, ULAW_ENCODE)
+
+
+def alaw_encode(pcm: bytes) -> bytes:
+    return encode(pcm, ALAW_ENCODE)
+
+
+def ulaw_decode(ulaw: bytes) -> bytes:
+    return decode(ulaw, ULAW_DECODE)
+
+
+def alaw_decode(alaw: bytes) -> bytes:
+    return decode(alaw, ALAW_DECODE)
@@ -0,0 +1,260 @@
+"""Per-turn latency timeline, aggregated into Prometheus histograms.
+
+A turn starts with the last client audio received before the response and
+ends with response.done; every stage is observed as the time elapsed since
+that audio was received. Sessions can also be traced event by event and
+exported in the time;emitter;event shape of opanai_events.csv.
+"""
+
+import csv
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Iterable
+from typing import NamedTuple
+
+CLIENT = "client"
+SERVER = "server"
+
+AUDIO_RECEIVED = "audio.received"
+AUDIO_DECODED = "audio.decoded"
+AUDIO_APPEND = "input_audio_buffer.append"
+AUDIO_COMMIT = "input_audio_buffer.commit"
+RESPONSE_DONE = "response.done"
+
+# observed stages, in the order they usually happen
+STAGES = (
+    AUDIO_RECEIVED,
+    AUDIO_DECODED,
+    AUDIO_APPEND,
+    AUDIO_COMMIT,
+    "response.created",
+    "response.audio.delta",
+    "response.audio_transcript.delta",
+    "conversation.item.input_audio_transcription.completed",
+    RESPONSE_DONE,
+)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Cumulative histogram with one series per label value."""
+
+    def __init__(
+        self, name: str, help: str, label: str, buckets: tuple[float, ...] = BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        # label value -> (per bucket counts, +Inf last), sum
+        self.series: dict[str, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, label_value: str) -> None:
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, label_value: str) -> int:
+        series = self.series.get(label_value)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in self.series.items():
+            label = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total[0]}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Current value of each label value."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, label: str):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values: dict[str, float] = {}
+
+    def set(self, label_value: str, value: float) -> None:
+        self.values[label_value] = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for label_value, value in self.values.items():
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return lines
+
+
+class Counter(Gauge):
+    """Total of each label value since the worker started."""
+
+    type = "counter"
+
+    def inc(self, label_value: str, value: float = 1) -> None:
+        self.values[label_value] = self.values.get(label_value, 0) + value
+
+
+TURN_SECONDS = Histogram(
+    "rtaoai2_turn_stage_seconds",
+    "Seconds from the last client audio received to each stage of the turn.",
+    "stage",
+)
+
+RESPONSE_QUEUE_SECONDS = Histogram(
+    "rtaoai2_response_queue_seconds",
+    "Seconds response.create waited for the upstream rate limits, by the limit that held it.",
+    "limit",
+)
+
+SESSIONS = Gauge("rtaoai2_sessions", "Client sessions of the worker by state.", "state")
+SESSIONS_ENDED = Counter(
+    "rtaoai2_sessions_ended_total",
+    "Client sessions closed or refused, by reason.",
+    "reason",
+)
+
+TRANSCRIPT_BUFFERED = Gauge(
+    "rtaoai2_transcript_buffered_bytes",
+    "Response transcript bytes held back from clients, by session state.",
+    "state",
+)
+OUTBOUND_MESSAGES = Counter(
+    "rtaoai2_outbound_messages_total",
+    "Messages written to client websockets or dropped for them.",
+    "outcome",
+)
+OUTBOUND_QUEUED = Gauge(
+    "rtaoai2_outbound_queued",
+    "Messages waiting for client websockets, by session state.",
+    "state",
+)
+OUTBOUND_MAX_DEPTH = Histogram(
+    "rtaoai2_outbound_max_depth",
+    "Deepest the outbound queue of each client connection got, by slow client policy.",
+    "policy",
+    buckets=(1, 4, 16, 64, 256, 1024),
+)
+
+
+def render_metrics(collectors: Iterable[Histogram | Gauge] = (TURN_SECONDS,)) -> str:
+    return (
+        "\n".join(line for collector in collectors for line in collector.render())
+        + "\n"
+    )
+
+
+class TraceRow(NamedTuple):
+    time: float
+    emitter: str
+    event: str
+
+
+class TurnTimeline:
+    """Timestamp the stages of each turn of a session.
+
+    A turn is measured from its first audio, client stages keep their latest
+    time, upstream stages keep their first time. A response interrupted by a
+    new turn is not observed, its stages are dropped and the new turn starts
+    at the interruption. With record set, the last max_rows marks are also
+    kept as TraceRows.
+    """
+
+    def __init__(
+        self,
+        histogram: Histogram = TURN_SECONDS,
+        record: bool = False,
+        max_rows: int = 100_000,
+    ):
+        self.histogram = histogram
+        self.started_at = time.perf_counter()
+        self.marks: dict[str, float] = {}
+        self.rows: deque[TraceRow] | None = deque(maxlen=max_rows) if record else None
+        self.in_response = False
+        # response.done of the interrupted response still to come
+        self.interrupted = False
+
+    def client(self, event: str) -> None:
+        now = time.perf_counter()
+        # frames streamed after the commit don't move the start of the turn
+        if event != AUDIO_RECEIVED or event not in self.marks:
+            self.marks[event] = now
+        if self.rows is not None:
+            self.rows.append(TraceRow(now - self.started_at, CLIENT, event))
+
+    def server(self, event: str | None) -> None:
+        now = time.perf_counter()
+        if self.rows is not None and event is not None:
+            self.rows.append(TraceRow(now - self.started_at, SERVER, event))
+        if event == "response.created":
+            self.in_response = True
+        if self.interrupted:
+            # upstream events of the interrupted response until its end
+            if event == RESPONSE_DONE:
+                self.interrupted = self.in_response = False
+            return
+        if event not in self.marks and event in STAGES:
+            self.marks[event] = now
+        if event == RESPONSE_DONE:
+            self.in_response = False
+            self.finish()
+
+    def interrupt(self) -> None:
+        """A new turn interrupted the response in flight, drop what it marked."""
+        if not self.in_response:
+            return
+        self.interrupted = True
+        self.marks = {AUDIO_RECEIVED: time.perf_counter()}
+
+    def finish(self) -> None:
+        start = self.marks.get(AUDIO_RECEIVED)
+        if start is not None:
+            for stage, at in self.marks.items():
+                if at >= start:
+                    self.histogram.observe(at - start, stage)
+        self.marks.clear()
+
+
+def collapse(rows: Iterable[TraceRow]) -> list[tuple[TraceRow, int]]:
+    """Merge consecutive identical events of the same hundredth of a second."""
+    collapsed: list[tuple[TraceRow, int]] = []
+    for row in rows:
+        row = row._replace(time=round(row.time, 2))
+        if collapsed and collapsed[-1][0] == row:
+            collapsed[-1] = (row, collapsed[-1][1] + 1)
+        else:
+            collapsed.append((row, 1))
+    return collapsed
+
+
+def format_time(seconds: float) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes):02d}:{seconds:05.2f}"
+
+
+def write_trace(rows: Iterable[TraceRow], path: str) -> None:
+    """Write rows as jsonl when path ends with .jsonl, as opanai_events.csv otherwise."""
+    with open(path, "w", newline="") as f:
+        if path.endswith(".jsonl"):
+            f.writelines(
+                json.dumps({**row._asdict(), "count": count}) + "\n"
+                for row, count in collapse(rows)
+            )
+            return
+        writer = csv.writer(f, delimiter=";", lineterminator="\n")
+        writer.writerow(TraceRow._fields)
+        for row, count in collapse(rows):
+            event = row.event if count == 1 else f"{row.event} ({count})"
+            writer.writerow((format_time(row.time), row.emitter, event))
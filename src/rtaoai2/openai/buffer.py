@@ -0,0 +1,47 @@
+import time
+
+
+class TranscriptBuffer:
+    """Chunked transcript buffer bounded in size and in time.
+
+    Chunks are only joined when drained. append() refuses a chunk once
+    max_bytes would be exceeded, and expired() tells when the first chunk
+    has been held for longer than timeout seconds. len() is the bytes held,
+    summed over sessions in /metrics.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024, timeout: float = 5):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.chunks: list[str] = []
+        self.size = 0
+        self.started_at: float | None = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, chunk: str) -> bool:
+        size = len(chunk.encode())
+        if self.size + size > self.max_bytes:
+            return False
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        self.chunks.append(chunk)
+        self.size += size
+        return True
+
+    def expired(self) -> bool:
+        return (
+            self.started_at is not None
+            and time.monotonic() - self.started_at > self.timeout
+        )
+
+    def peek(self) -> str:
+        return "".join(self.chunks)
+
+    def drain(self) -> str:
+        transcript = self.peek()
+        self.chunks.clear()
+        self.size = 0
+        self.started_at = None
+        return transcript
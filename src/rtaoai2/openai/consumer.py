@@ -0,0 +1,193 @@
+import json
+import re
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from rtaoai2.openai.buffer import TranscriptBuffer
+from rtaoai2.openai.events import EVENT_ADAPTER, EVENTS, Event, decode_event
+
+EventHandler = Callable[[Any], Awaitable[None]]
+
+# upstream events start with their type, reading it doesn't need the whole json
+EVENT_TYPE_PREFIX = re.compile(rb'\s*\{\s*"type"\s*:\s*"([^"]+)"')
+
+
+class UnknownEventError(Exception):
+    pass
+
+
+def peek_event_type(raw: bytes) -> str | None:
+    match = EVENT_TYPE_PREFIX.match(raw)
+    if match is not None:
+        return match.group(1).decode()
+    return json.loads(raw).get("type")
+
+
+class OpenAIEventConsumer:
+    """Dispatch upstream events to the handlers subscribed to their type.
+
+    Events nobody subscribed to are skipped before being parsed or validated.
+    """
+
+    def __init__(self) -> None:
+        self.handlers: dict[str, list[EventHandler]] = {}
+
+    def subscribe(self, event_type: str, handler: EventHandler) -> None:
+        if event_type not in EVENTS:
+            raise UnknownEventError(event_type)
+        self.handlers.setdefault(event_type, []).append(handler)
+
+    def process_event(self, event: dict[str, Any]) -> Event:
+        if event.get("type") not in EVENTS:
+            raise UnknownEventError(event.get("type"))
+        return EVENT_ADAPTER.validate_python(event)
+
+    async def dispatch(self, raw: bytes | str) -> None:
+        if isinstance(raw, str):
+            raw = raw.encode()
+        event_type = peek_event_type(raw)
+        handlers = self.handlers.get(event_type)  # type: ignore[arg-type]
+        if not handlers:
+            return
+        # validated straight from the raw bytes, deltas are not copied around
+        event = decode_event(raw)
+        for handler in handlers:
+            await handler(event)
+
+    async def dispatch_event(self, event: dict[str, Any]) -> None:
+        handlers = self.handlers.get(event.get("type"))  # type: ignore[arg-type]
+        if not handlers:
+            return
+        processed_event = self.process_event(event)
+        for handler in handlers:
+            await handler(processed_event)
+
+
+class OpenAIStreamingEventConsumer:
+    """Forward response events to the response producer as soon as they arrive.
+
+    Response transcripts go through transcript_buffer while hold_transcripts()
+    is true, the buffer is flushed when full or expired.
+    """
+
+    def __init__(
+        self,
+        event_consumer: OpenAIEventConsumer,
+        response_producer,
+        transcript_buffer: TranscriptBuffer | None = None,
+    ):
+        self.event_consumer = event_consumer
+        self.response_producer = response_producer
+        if transcript_buffer is None:
+            transcript_buffer = TranscriptBuffer()
+        self.transcript_buffer = transcript_buffer
+        for event_type, handler in (
+            ("response.created", self.on_response_created),
+            ("response.audio.delta", self.on_response_audio_delta),
+            (
+                "response.audio_transcript.delta",
+                self.on_response_audio_transcript_delta,
+            ),
+            # text only responses
+            ("response.text.delta", self.on_response_audio_transcript_delta),
+            (
+                "conversation.item.input_audio_transcription.completed",
+                self.on_input_audio_transcription_completed,
+            ),
+            ("response.done", self.on_response_done),
+        ):
+            event_consumer.subscribe(event_type, handler)
+
+    @property
+    def buffered_bytes(self) -> int:
+        return len(self.transcript_buffer)
+
+    def hold_transcripts(self) -> bool:
+        return False
+
+    def release_transcripts(self) -> None:
+        """Called when the buffer is full or expired, stop holding transcripts."""
+
+    async def flush_transcript_buffer(self) -> None:
+        if self.transcript_buffer:
+            await self.response_producer.on_response_audio_transcript_delta_event(
+                self.transcript_buffer.drain()
+            )
+
+    async def on_event(self, event: dict[str, Any]) -> None:
+        await self.event_consumer.dispatch_event(event)
+
+    async def on_raw_event(self, raw: bytes | str) -> None:
+        await self.event_consumer.dispatch(raw)
+
+    async def on_response_created(self, event) -> None:
+        await self.response_producer.on_response_created(event)
+
+    async def on_response_audio_delta(self, event) -> None:
+        if self.transcript_buffer.expired():
+            self.release_transcripts()
+            await self.flush_transcript_buffer()
+        await self.response_producer.on_response_audio_delta_event(event)
+
+    async def on_response_audio_transcript_delta(self, event) -> None:
+        if not event.delta:
+            return
+        if (
+            self.hold_transcripts()
+            and not self.transcript_buffer.expired()
+            and self.transcript_buffer.append(event.delta)
+        ):
+            return
+        if self.transcript_buffer:
+            self.release_transcripts()
+            await self.flush_transcript_buffer()
+        await self.response_producer.on_response_audio_transcript_delta_event(
+            event.delta
+        )
+
+    async def on_input_audio_transcription_completed(self, event) -> None:
+        await self.response_producer.on_response_audio_input_transcript_done_event(
+            event.transcript
+        )
+
+    async def on_response_done(self, event) -> None:
+        await self.flush_transcript_buffer()
+        await self.response_producer.on_response_done(event)
+
+
+class OpenAIWaitInputTranscriptEventConsumer(OpenAIStreamingEventConsumer):
+    """Hold back response transcripts until the input audio transcript is written.
+
+    Response audio is still forwarded right away, the transcripts buffered in
+    the meantime are written at once after the input transcript, or earlier if
+    the buffer is full, expired or the response is done.
+    """
+
+    def __init__(
+        self,
+        event_consumer: OpenAIEventConsumer,
+        response_producer,
+        transcript_buffer: TranscriptBuffer | None = None,
+    ):
+        super().__init__(event_consumer, response_producer, transcript_buffer)
+        self.waiting_input_transcript = True
+
+    @property
+    def response_audio_transcript_queue(self) -> str:
+        return self.transcript_buffer.peek()
+
+    def hold_transcripts(self) -> bool:
+        return self.waiting_input_transcript
+
+    def release_transcripts(self) -> None:
+        self.waiting_input_transcript = False
+
+    async def on_input_audio_transcription_completed(self, event) -> None:
+        await super().on_input_audio_transcription_completed(event)
+        self.waiting_input_transcript = False
+        await self.flush_transcript_buffer()
+
+    async def on_response_done(self, event) -> None:
+        await super().on_response_done(event)
+        # the next response waits for its own input transcript
+        self.waiting_input_transcript = True
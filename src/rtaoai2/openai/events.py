@@ -0,0 +1,254 @@
+import base64
+from functools import cached_property
+from typing import TYPE_CHECKING, Annotated, Any, ClassVar, Literal, Union
+
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+
+
+class Model(BaseModel):
+    # unknown fields are dropped rather than copied, models are immutable
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+
+class ConversationItem(Model):
+    id: str | None = None
+    type: str
+    status: str | None = None
+    role: str | None = None
+    content: list[dict[str, Any]] = []
+    # function calls
+    name: str | None = None
+    call_id: str | None = None
+    arguments: str | None = None
+
+
+class Response(Model):
+    id: str
+    status: str
+    status_details: dict[str, Any] | None = None
+    # item ids while in progress, items once done
+    output: list[ConversationItem | str] = []
+    usage: dict[str, Any] | None = None
+
+
+class RateLimit(Model):
+    name: str
+    limit: int
+    remaining: int
+    reset_seconds: float
+
+
+class Error(Model):
+    type: str
+    code: str | None = None
+    message: str
+    param: str | None = None
+    event_id: str | None = None
+
+
+class Event(Model):
+    name: ClassVar[str]
+
+    event_id: str | None = None
+
+
+class ErrorEvent(Event):
+    name = "error"
+
+    type: Literal["error"]
+    error: Error
+
+
+class SessionCreatedEvent(Event):
+    name = "session.created"
+
+    type: Literal["session.created"]
+    session: dict[str, Any]
+
+
+class SessionUpdatedEvent(Event):
+    name = "session.updated"
+
+    type: Literal["session.updated"]
+    session: dict[str, Any]
+
+
+class ConversationItemCreatedEvent(Event):
+    name = "conversation.item.created"
+
+    type: Literal["conversation.item.created"]
+    previous_item_id: str | None = None
+    item: ConversationItem
+
+
+class ConversationItemTruncatedEvent(Event):
+    name = "conversation.item.truncated"
+
+    type: Literal["conversation.item.truncated"]
+    item_id: str
+    content_index: int = 0
+    audio_end_ms: int
+
+
+class ConversationItemInputAudioTranscriptionCompletedEvent(Event):
+    name = "conversation.item.input_audio_transcription.completed"
+
+    type: Literal["conversation.item.input_audio_transcription.completed"]
+    item_id: str
+    content_index: int = 0
+    transcript: str
+
+
+class InputAudioBufferCommittedEvent(Event):
+    name = "input_audio_buffer.committed"
+
+    type: Literal["input_audio_buffer.committed"]
+    previous_item_id: str | None = None
+    item_id: str
+
+
+class RateLimitsUpdatedEvent(Event):
+    name = "rate_limits.updated"
+
+    type: Literal["rate_limits.updated"]
+    rate_limits: list[RateLimit]
+
+
+class ResponseCreatedEvent(Event):
+    name = "response.created"
+
+    type: Literal["response.created"]
+    response: Response
+
+
+class ResponseDoneEvent(Event):
+    name = "response.done"
+
+    type: Literal["response.done"]
+    response: Response | None = None
+
+
+class ResponseOutputItemAddedEvent(Event):
+    name = "response.output_item.added"
+
+    type: Literal["response.output_item.added"]
+    response_id: str
+    output_index: int = 0
+    item: ConversationItem
+
+
+class ResponseOutputItemDoneEvent(Event):
+    name = "response.output_item.done"
+
+    type: Literal["response.output_item.done"]
+    response_id: str
+    output_index: int = 0
+    item: ConversationItem
+
+
+class ResponseContentPartAddedEvent(Event):
+    name = "response.content_part.added"
+
+    type: Literal["response.content_part.added"]
+    response_id: str
+    item_id: str
+    output_index: int = 0
+    content_index: int = 0
+    part: dict[str, Any]
+
+
+class ResponseContentPartDoneEvent(Event):
+    name = "response.content_part.done"
+
+    type: Literal["response.content_part.done"]
+    response_id: str
+    item_id: str
+    output_index: int = 0
+    content_index: int = 0
+    part: dict[str, Any]
+
+
+class ResponseAudioDeltaEvent(Event):
+    name = "response.audio.delta"
+
+    type: Literal["response.audio.delta"]
+    response_id: str | None = None
+    item_id: str | None = None
+    output_index: int = 0
+    content_index: int = 0
+    # base64 pcm16, decoded once when audio is first read, see event_audio
+    delta: str
+
+    @cached_property
+    def audio(self) -> bytes:
+        return base64.b64decode(self.delta)
+
+
+class ResponseAudioDoneEvent(Event):
+    name = "response.audio.done"
+
+    type: Literal["response.audio.done"]
+    response_id: str
+    item_id: str
+    output_index: int = 0
+    content_index: int = 0
+
+
+class ResponseAudioTranscriptDeltaEvent(Event):
+    name = "response.audio_transcript.delta"
+
+    type: Literal["response.audio_transcript.delta"]
+    response_id: str | None = None
+    item_id: str | None = None
+    output_index: int = 0
+    content_index: int = 0
+    delta: str
+
+
+class ResponseAudioTranscriptDoneEvent(Event):
+    name = "response.audio_transcript.done"
+
+    type: Literal["response.audio_transcript.done"]
+    response_id: str
+    item_id: str
+    output_index: int = 0
+    content_index: int = 0
+    transcript: str
+
+
+class ResponseTextDeltaEvent(Event):
+    name = "response.text.delta"
+
+    type: Literal["response.text.delta"]
+    response_id: str
+    item_id: str
+    output_index: int = 0
+    content_index: int = 0
+    delta: str
+
+
+class ResponseTextDoneEvent(Event):
+    name = "response.text.done"
+
+    type: Literal["response.text.done"]
+    response_id: str
+    item_id: str
+    output_index: int = 0
+    content_index: int = 0
+    text: str
+
+
+EVENTS: dict[str, type[Event]] = {cls.name: cls for cls in Event.__subclasses__()}
+
+# built once, picks the model from the type field without trying the others
+if TYPE_CHECKING:
+    AnyEvent = Event
+else:
+    # a union of a variable number of classes, X | Y can't spell it
+    AnyEvent = Annotated[Union[tuple(EVENTS.values())], Field(discriminator="type")]  # noqa: UP007
+EVENT_ADAPTER: TypeAdapter[Event] = TypeAdapter(AnyEvent)
+
+
+def decode_event(raw: bytes | str) -> Event:
+    """Parse a raw upstream message into its event model."""
+    return EVENT_ADAPTER.validate_json(raw)
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any
+
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class SessionUpdateError(Exception):
+    pass
+
+
+class RealtimeSession:
+    """A connected realtime session, already configured with session.update."""
+
+    def __init__(self, connection, session: dict[str, Any]):
+        self.connection = connection
+        self.session = session
+        self.expires_at: float = session.get("expires_at") or float("inf")
+
+    async def send(self, data: str) -> None:
+        await self.connection.send_raw(data)
+
+    def expires_in(self) -> float:
+        return self.expires_at - time.time()
+
+    async def close(self) -> None:
+        await self.connection.close()
+
+
+class RealtimeSessionPool:
+    """Keep size realtime sessions connected and configured, ready to be acquired.
+
+    All sessions share the same AsyncOpenAI client. A session is single use:
+    the caller owns it once acquired and the pool refills in the background.
+    Sessions expiring within min_lifetime seconds are closed instead of
+    being handed out.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str,
+        session: dict[str, Any],
+        size: int = 2,
+        min_lifetime: float = 60,
+        extra_headers: dict[str, str] | None = None,
+        retry_delay: float = 1,
+    ):
+        self.client = client
+        self.model = model
+        self.session = session
+        # encoded once, sent as is to every new session
+        self.session_update = json.dumps({"type": "session.update", "session": session})
+        self.size = size
+        self.min_lifetime = min_lifetime
+        self.extra_headers = extra_headers or {}
+        self.retry_delay = retry_delay
+        self.ready: deque[RealtimeSession] = deque()
+        self.refill_needed = asyncio.Event()
+        self.refill_task: asyncio.Task | None = None
+
+    async def connect(self) -> RealtimeSession:
+        connection = await self.client.realtime.connect(
+            model=self.model, extra_headers=self.extra_headers
+        ).enter()
+        try:
+            await connection.send_raw(self.session_update)
+            while True:
+                event = json.loads(await connection.recv_bytes())
+                if event.get("type") == "session.updated":
+                    return RealtimeSession(connection, event["session"])
+                if event.get("type") == "error":
+                    raise SessionUpdateError(event["error"].get("message"))
+        except BaseException:
+            await connection.close()
+            raise
+
+    def start(self) -> None:
+        if self.size > 0 and self.refill_task is None:
+            self.refill_needed.set()
+            self.refill_task = asyncio.create_task(self.refill())
+
+    async def close(self) -> None:
+        if self.refill_task is not None:
+            self.refill_task.cancel()
+            self.refill_task = None
+        while self.ready:
+            await self.ready.popleft().close()
+
+    async def acquire(self) -> RealtimeSession:
+        self.refill_needed.set()
+        while self.ready:
+            session = self.ready.popleft()
+            if session.expires_in() > self.min_lifetime:
+                return session
+            await session.close()
+        # pool exhausted, pay for the handshake
+        return await self.connect()
+
+    async def evict_expiring(self) -> None:
+        for session in list(self.ready):
+            if session.expires_in() <= self.min_lifetime:
+                self.ready.remove(session)
+                await session.close()
+
+    def next_eviction(self) -> float | None:
+        expires_in = min((s.expires_in() for s in self.ready), default=float("inf"))
+        if expires_in == float("inf"):
+            return None
+        return max(0, expires_in - self.min_lifetime)
+
+    async def refill(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self.refill_needed.wait(), self.next_eviction())
+            except TimeoutError:
+                pass
+            self.refill_needed.clear()
+            await self.evict_expiring()
+            while len(self.ready) < self.size:
+                try:
+                    self.ready.append(await self.connect())
+                except Exception:
+                    logger.exception("could not connect a pooled realtime session")
+                    await asyncio.sleep(self.retry_delay)
@@ -0,0 +1,247 @@
+import inspect
+import json
+import types
+import typing
+from collections.abc import Callable
+from typing import Any
+
+from rtaoai2.openai.ratelimit import RateLimitScheduler
+from rtaoai2.openai.recorder import SessionRecorder
+
+JSON_TYPES: dict[Any, str] = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+}
+
+
+def make_json_schema(annotation: Any) -> dict[str, Any]:
+    origin = typing.get_origin(annotation)
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return make_json_schema(args[0])
+        return {"anyOf": [make_json_schema(arg) for arg in args]}
+    if origin is typing.Literal:
+        return {"enum": list(typing.get_args(annotation))}
+    if origin is list:
+        (item,) = typing.get_args(annotation) or (Any,)
+        schema = {"type": "array"}
+        if item is not Any:
+            schema["items"] = make_json_schema(item)  # type: ignore[assignment]
+        return schema
+    json_type = JSON_TYPES.get(origin or annotation)
+    return {"type": json_type} if json_type else {}
+
+
+def make_tool(tool: Callable[..., Any]) -> dict[str, Any]:
+    """Function tool schema from the tool signature and docstring."""
+    hints = typing.get_type_hints(tool)
+    properties = {}
+    required = []
+    for name, parameter in inspect.signature(tool).parameters.items():
+        properties[name] = make_json_schema(hints.get(name, Any))
+        if parameter.default is inspect.Parameter.empty:
+            required.append(name)
+    return {
+        "type": "function",
+        "name": tool.__name__,
+        "description": inspect.getdoc(tool) or "",
+        "parameters": {
+            "type": "object",
+            "properties": properties,
+            "required": required,
+        },
+    }
+
+
+def make_session_update(tools: list[Callable[..., Any]]) -> dict[str, Any]:
+    return {
+        "type": "session.update",
+        "session": {
+            "input_audio_transcription": {"model": "whisper-1"},
+            "tools": [make_tool(tool) for tool in tools],
+        },
+    }
+
+
+def make_audio_format_update(input_format: str, output_format: str) -> dict[str, Any]:
+    return {
+        "type": "session.update",
+        "session": {
+            "input_audio_format": input_format,
+            "output_audio_format": output_format,
+        },
+    }
+
+
+def make_audio(audio: str) -> dict[str, Any]:
+    return {"type": "input_audio_buffer.append", "audio": audio}
+
+
+def make_audio_commit() -> dict[str, Any]:
+    return {"type": "input_audio_buffer.commit"}
+
+
+def make_modalities_update(modalities: list[str]) -> dict[str, Any]:
+    return {"type": "session.update", "session": {"modalities": modalities}}
+
+
+def make_text(text: str) -> dict[str, Any]:
+    return {
+        "type": "conversation.item.create",
+        "item": {
+            "type": "message",
+            "role": "user",
+            "content": [{"type": "input_text", "text": text}],
+        },
+    }
+
+
+def make_response_create(
+    tools: list[Callable[..., Any]], modalities: list[str] | None = None
+) -> dict[str, Any]:
+    response: dict[str, Any] = {"tools": [make_tool(tool) for tool in tools]}
+    if modalities:
+        response["modalities"] = modalities
+    return {"type": "response.create", "response": response}
+
+
+def make_function_call_output(call_id: str, output: str) -> dict[str, Any]:
+    return {
+        "type": "conversation.item.create",
+        "item": {"type": "function_call_output", "call_id": call_id, "output": output},
+    }
+
+
+def make_response_cancel() -> dict[str, Any]:
+    return {"type": "response.cancel"}
+
+
+def make_item_truncate(
+    item_id: str, content_index: int, audio_end_ms: int
+) -> dict[str, Any]:
+    return {
+        "type": "conversation.item.truncate",
+        "item_id": item_id,
+        "content_index": content_index,
+        "audio_end_ms": audio_end_ms,
+    }
+
+
+class ToolRegistry:
+    """Tool schemas introspected once, response.create messages encoded once.
+
+    The registered tools are meant to be set once per session with
+    session.update, a response.create for the same tools is then sent
+    without any, other tool lists are encoded once and cached.
+    """
+
+    RESPONSE_CREATE = json.dumps({"type": "response.create"})
+
+    def __init__(self, tools: list[Callable[..., Any]]):
+        self.tools = list(tools)
+        self.compiled: dict[Callable[..., Any], dict[str, Any]] = {
+            tool: make_tool(tool) for tool in self.tools
+        }
+        self.schemas = list(self.compiled.values())
+        # (tools, modalities) -> encoded response.create
+        self.encoded: dict[
+            tuple[tuple[Callable[..., Any], ...], tuple[str, ...]], str
+        ] = {(tuple(self.tools), ()): self.RESPONSE_CREATE}
+
+    def schema(self, tool: Callable[..., Any]) -> dict[str, Any]:
+        if tool not in self.compiled:
+            self.compiled[tool] = make_tool(tool)
+        return self.compiled[tool]
+
+    def encode_response_create(
+        self, tools: list[Callable[..., Any]], modalities: list[str] | None = None
+    ) -> str:
+        key = (tuple(tools), tuple(modalities or ()))
+        if key not in self.encoded:
+            response: dict[str, Any] = {}
+            if key[0] != tuple(self.tools):
+                response["tools"] = [self.schema(tool) for tool in tools]
+            if modalities:
+                response["modalities"] = list(modalities)
+            self.encoded[key] = json.dumps(
+                {"type": "response.create", "response": response}
+            )
+        return self.encoded[key]
+
+
+class OpenAIEventProducer:
+    """Send client events upstream as json text messages.
+
+    With a tool registry, response.create only carries tools when they
+    differ from the registered ones. With a scheduler, response.create
+    waits for its turn under the upstream rate limits. With a recorder,
+    every sent event is recorded.
+    """
+
+    def __init__(
+        self,
+        ws,
+        tool_registry: ToolRegistry | None = None,
+        scheduler: RateLimitScheduler | None = None,
+        recorder: SessionRecorder | None = None,
+    ):
+        self.ws = ws
+        self.tool_registry = tool_registry
+        self.scheduler = scheduler
+        self.recorder = recorder
+
+    async def send_raw(self, data: str) -> None:
+        if self.recorder is not None:
+            self.recorder.client(data)
+        await self.ws.send(data)
+
+    async def send(self, event: dict[str, Any]) -> None:
+        await self.send_raw(json.dumps(event))
+
+    async def make_session_update(self, tools: list[Callable[..., Any]]) -> None:
+        await self.send(make_session_update(tools))
+
+    async def make_audio_format_update(
+        self, input_format: str, output_format: str
+    ) -> None:
+        await self.send(make_audio_format_update(input_format, output_format))
+
+    async def make_audio(self, audio: str) -> None:
+        await self.send(make_audio(audio))
+
+    async def make_audio_commit(self) -> None:
+        await self.send(make_audio_commit())
+
+    async def make_modalities_update(self, modalities: list[str]) -> None:
+        await self.send(make_modalities_update(modalities))
+
+    async def make_text(self, text: str) -> None:
+        await self.send(make_text(text))
+
+    async def make_response_create(
+        self, tools: list[Callable[..., Any]], modalities: list[str] | None = None
+    ) -> None:
+        if self.scheduler is not None:
+            await self.scheduler.acquire(self)
+        if self.tool_registry is not None:
+            await self.send_raw(
+                self.tool_registry.encode_response_create(tools, modalities)
+            )
+        else:
+            await self.send(make_response_create(tools, modalities))
+
+    async def make_function_call_output(self, call_id: str, output: str) -> None:
+        await self.send(make_function_call_output(call_id, output))
+
+    async def make_response_cancel(self) -> None:
+        await self.send(make_response_cancel())
+
+    async def make_item_truncate(
+        self, item_id: str, content_index: int, audio_end_ms: int
+    ) -> None:
+        await self.send(make_item_truncate(item_id, content_index, audio_end_ms))
@@ -0,0 +1,109 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from collections.abc import Hashable, Iterable
+
+from rtaoai2 import metrics
+from rtaoai2.openai.events import RateLimit
+
+
+class RateLimitScheduler:
+    """Pace response.create of every session with the upstream rate limits.
+
+    Limits are tracked by name from the rate_limits.updated events of all
+    sessions, each response takes its cost off the remaining amount until
+    the next update. A response waits while its cost would leave a limit
+    below its reserve, until that limit resets. Waiting sessions are served
+    round robin, one response at a time, so a busy session can't starve the
+    others. Time spent waiting is observed in histogram by the limit that
+    held it, "none" when sent right away.
+    """
+
+    def __init__(
+        self,
+        reserve: dict[str, int] | None = None,
+        cost: dict[str, int] | None = None,
+        histogram: metrics.Histogram = metrics.RESPONSE_QUEUE_SECONDS,
+    ):
+        self.reserve = reserve if reserve is not None else {}
+        self.cost = cost if cost is not None else {"requests": 1}
+        self.histogram = histogram
+        # name -> [limit, remaining, reset_at]
+        self.limits: dict[str, list[float]] = {}
+        # session -> its waiting responses, next session to serve first
+        self.queues: OrderedDict[Hashable, deque[asyncio.Future]] = OrderedDict()
+        self.timer: asyncio.TimerHandle | None = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self.queues.values())
+
+    def update(self, rate_limits: Iterable[RateLimit]) -> None:
+        now = time.monotonic()
+        for rate_limit in rate_limits:
+            self.limits[rate_limit.name] = [
+                rate_limit.limit,
+                rate_limit.remaining,
+                now + rate_limit.reset_seconds,
+            ]
+        self.schedule()
+
+    async def on_rate_limits_updated(self, event) -> None:
+        self.update(event.rate_limits)
+
+    def blocking(self) -> str | None:
+        """Name of a limit without room for one more response, None if there is room."""
+        now = time.monotonic()
+        for name, state in self.limits.items():
+            limit, remaining, reset_at = state
+            if reset_at <= now:
+                # refilled, until the next update tells otherwise
+                state[1] = remaining = limit
+                state[2] = math.inf
+            if remaining - self.cost.get(name, 0) < self.reserve.get(name, 0):
+                return name
+        return None
+
+    def take(self) -> None:
+        for name, state in self.limits.items():
+            state[1] -= self.cost.get(name, 0)
+
+    async def acquire(self, session: Hashable) -> None:
+        """Return once session can send a response.create."""
+        start = time.perf_counter()
+        held_by = self.blocking()
+        if held_by is None and not self.queues:
+            self.take()
+            self.histogram.observe(0, "none")
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(session, deque()).append(waiter)
+        self.schedule()
+        await waiter
+        self.histogram.observe(time.perf_counter() - start, held_by or "none")
+
+    def schedule(self) -> None:
+        """Grant waiting responses while there is room, then wait for a reset."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        while self.queues:
+            session, waiters = next(iter(self.queues.items()))
+            while waiters and waiters[0].done():
+                # cancelled while waiting
+                waiters.popleft()
+            if not waiters:
+                del self.queues[session]
+                continue
+            name = self.blocking()
+            if name is not None:
+                delay = self.limits[name][2] - time.monotonic()
+                if math.isfinite(delay):
+                    loop = asyncio.get_running_loop()
+                    self.timer = loop.call_later(max(delay, 0), self.schedule)
+                return
+            self.take()
+            waiters.popleft().set_result(None)
+            # served, goes after the other sessions
+            self.queues.move_to_end(session)
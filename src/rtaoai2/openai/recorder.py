@@ -0,0 +1,221 @@
+"""Compressed, append-only recordings of realtime sessions.
+
+A recording is a series of parts named after its prefix,
+
+    <prefix>.0000.jsonl.gz  one {"time", "emitter", "event"} json per line,
+                            "repeat" when the event was received more than once
+    <prefix>.0000.pcm       audio of the events of the part, as raw bytes
+
+Each batch of lines is appended as its own gzip member, a part stays
+readable up to its last complete batch. Base64 audio of
+input_audio_buffer.append and response.audio.delta events is moved to the
+sidecar, the event line keeps its offset and size there.
+"""
+
+import asyncio
+import base64
+import binascii
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import ExitStack
+from typing import Any, NamedTuple
+
+from rtaoai2.metrics import CLIENT, SERVER
+
+logger = logging.getLogger(__name__)
+
+# event type -> key of its base64 audio
+AUDIO_KEYS = {
+    "input_audio_buffer.append": "audio",
+    "response.audio.delta": "delta",
+}
+
+
+class Record(NamedTuple):
+    time: float
+    emitter: str
+    event: dict[str, Any]
+    # times the event was received, the "(n)" of converted dumps/ files
+    repeat: int = 1
+
+
+# (time, emitter, raw event[, repeat])
+PendingEvent = tuple[float, str, bytes | str] | tuple[float, str, bytes | str, int]
+
+
+def part_paths(prefix: str, part: int) -> tuple[str, str]:
+    return f"{prefix}.{part:04d}.jsonl.gz", f"{prefix}.{part:04d}.pcm"
+
+
+class SessionRecorder:
+    """Record the client and server events of a session without blocking it.
+
+    record() only queues the raw event, a background task parses and writes
+    the queue in a thread every flush_interval seconds or max_batch events.
+    Beyond max_pending queued events new ones are dropped and counted, like
+    events that aren't a json object. Parts rotate once max_bytes of
+    compressed events and sidecar audio were written or after max_seconds.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_seconds: float = 3600,
+        flush_interval: float = 1,
+        max_batch: int = 512,
+        max_pending: int = 16384,
+    ):
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.started_at = time.perf_counter()
+        self.pending: list[PendingEvent] = []
+        self.dropped = 0
+        self.part = -1
+        self.part_bytes = 0
+        self.part_opened_at = 0.0
+        self.audio_offset = 0
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    def record(self, emitter: str, raw: bytes | str) -> None:
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending.append((time.perf_counter() - self.started_at, emitter, raw))
+        if len(self.pending) >= self.max_batch:
+            self.wakeup.set()
+
+    def client(self, raw: bytes | str) -> None:
+        self.record(CLIENT, raw)
+
+    def server(self, raw: bytes | str) -> None:
+        self.record(SERVER, raw)
+
+    async def run(self) -> None:
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        try:
+            await asyncio.to_thread(self.write, batch)
+        except OSError:
+            logger.exception("recording %s failed", self.prefix)
+            self.dropped += len(batch)
+
+    def rotate(self) -> None:
+        self.part += 1
+        self.part_bytes = 0
+        self.audio_offset = 0
+        self.part_opened_at = time.monotonic()
+
+    def write(self, batch: Sequence[PendingEvent]) -> None:
+        if (
+            self.part < 0
+            or self.part_bytes >= self.max_bytes
+            or time.monotonic() - self.part_opened_at >= self.max_seconds
+        ):
+            self.rotate()
+        events_path, audio_path = part_paths(self.prefix, self.part)
+        lines = []
+        audio = []
+        for at, emitter, raw, *repeat in batch:
+            try:
+                event = json.loads(raw)
+                if not isinstance(event, dict):
+                    raise TypeError(f"{type(event).__name__} event")
+            except (ValueError, TypeError) as e:
+                logger.warning(
+                    "recording %s: dropped an invalid event: %s", self.prefix, e
+                )
+                self.dropped += 1
+                continue
+            line: dict[str, Any] = {
+                "time": round(at, 4),
+                "emitter": emitter,
+                "event": event,
+            }
+            if repeat and repeat[0] > 1:
+                line["repeat"] = repeat[0]
+            key = AUDIO_KEYS.get(event.get("type", ""))
+            if key is not None and isinstance(event.get(key), str):
+                try:
+                    data = base64.b64decode(event[key], validate=True)
+                except binascii.Error:
+                    # kept inline, like the trimmed payloads of dumps/
+                    data = None
+                if data is not None:
+                    del event[key]
+                    line["audio"] = {
+                        "key": key,
+                        "offset": self.audio_offset,
+                        "size": len(data),
+                    }
+                    self.audio_offset += len(data)
+                    audio.append(data)
+            lines.append(json.dumps(line, separators=(",", ":")))
+        if not lines:
+            return
+        compressed = gzip.compress(("\n".join(lines) + "\n").encode(), compresslevel=6)
+        if audio:
+            with open(audio_path, "ab") as f:
+                f.write(b"".join(audio))
+        with open(events_path, "ab") as f:
+            f.write(compressed)
+        self.part_bytes += len(compressed) + sum(len(data) for data in audio)
+
+    async def close(self) -> None:
+        self.closed = True
+        self.wakeup.set()
+        if self.task is not None:
+            await self.task
+        await self.flush()
+
+
+def read_recording(prefix: str) -> Iterator[Record]:
+    """Records of all parts in order, read lazily, audio back as base64."""
+    parts = sorted(glob.glob(f"{glob.escape(prefix)}.[0-9][0-9][0-9][0-9].jsonl.gz"))
+    for events_path in parts:
+        audio_path = events_path.removesuffix(".jsonl.gz") + ".pcm"
+        with ExitStack() as stack:
+            audio = (
+                stack.enter_context(open(audio_path, "rb"))
+                if os.path.exists(audio_path)
+                else None
+            )
+            f = stack.enter_context(gzip.open(events_path, "rt"))
+            for line in f:
+                entry = json.loads(line)
+                ref = entry.get("audio")
+                if ref is not None and audio is not None:
+                    audio.seek(ref["offset"])
+                    entry["event"][ref["key"]] = base64.b64encode(
+                        audio.read(ref["size"])
+                    ).decode()
+                yield Record(
+                    entry["time"],
+                    entry["emitter"],
+                    entry["event"],
+                    entry.get("repeat", 1),
+                )
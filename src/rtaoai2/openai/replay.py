@@ -0,0 +1,305 @@
+"""Local stand-in for the realtime API replaying the recorded dumps/ session.
+
+    uv run python -m rtaoai2.openai.replay --port 8765 --time-scale 1
+
+then run the server against it with
+OPENAI_API_KEY=fake OPENAI_WEBSOCKET_BASE_URL=ws://127.0.0.1:8765/v1
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import re
+import time
+from typing import Any, NamedTuple
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from rtaoai2.metrics import CLIENT, SERVER
+from rtaoai2.openai.recorder import SessionRecorder, read_recording
+
+# dumps/ files are named after the time and type of the event they hold,
+# "(n)" when the same event was received n times at that time
+DUMP_NAME = re.compile(r"(\d+):(\d+(?:\.\d+)?)_(.+?)(?: \((\d+)\))?\.json")
+TRIMMED = re.compile(r"\[trimmed: (\d+) bytes\]")
+
+CLIENT_EVENTS = {
+    "session.update",
+    "conversation.item.create",
+    "conversation.item.truncate",
+    "input_audio_buffer.append",
+    "input_audio_buffer.commit",
+    "response.create",
+    "response.cancel",
+}
+
+SESSION_DURATION = 15 * 60
+
+
+class RecordedEvent(NamedTuple):
+    time: float
+    type: str
+    # times the event was repeated, the "(n)" of dumps/ file names
+    repeat: int
+    event: dict[str, Any]
+
+
+def synthesize_audio(size: int, seed: int = 0) -> str:
+    """Base64 pcm16 noise of size characters, like the trimmed recorded payloads."""
+    rng = random.Random(seed)
+    return base64.b64encode(rng.randbytes(size // 4 * 3)).decode()
+
+
+def synthesize_trimmed(event: dict[str, Any], audio: dict[int, str]) -> dict[str, Any]:
+    """event with its trimmed payload replaced by noise, cached by size in audio."""
+    for key in ("delta", "audio"):
+        trimmed = TRIMMED.fullmatch(str(event.get(key, "")))
+        if trimmed:
+            size = int(trimmed.group(1))
+            if size not in audio:
+                audio[size] = synthesize_audio(size, seed=size)
+            event[key] = audio[size]
+    return event
+
+
+def load_recording(path: str = "dumps") -> list[RecordedEvent]:
+    """Recorded events in order, trimmed audio replaced by noise of the same size.
+
+    path is a dumps/ like directory, or the prefix of a SessionRecorder recording.
+    """
+    audio: dict[int, str] = {}
+    if not os.path.isdir(path):
+        return [
+            RecordedEvent(
+                record.time,
+                record.event.get("type", ""),
+                record.repeat,
+                synthesize_trimmed(record.event, audio),
+            )
+            for record in read_recording(path)
+        ]
+    events = []
+    # names sort by time
+    for file in sorted(os.listdir(path)):
+        match = DUMP_NAME.fullmatch(file)
+        if match is None:
+            continue
+        minutes, seconds, event_type, count = match.groups()
+        with open(os.path.join(path, file)) as f:
+            event = synthesize_trimmed(json.load(f), audio)
+        events.append(
+            RecordedEvent(
+                60 * int(minutes) + float(seconds), event_type, int(count or 1), event
+            )
+        )
+    return events
+
+
+def convert_dumps(path: str, prefix: str) -> None:
+    """Write the one json file per event of path as a recording, with their repeat."""
+    batch = []
+    for file in sorted(os.listdir(path)):
+        match = DUMP_NAME.fullmatch(file)
+        if match is None:
+            continue
+        minutes, seconds, event_type, count = match.groups()
+        with open(os.path.join(path, file), "rb") as f:
+            raw = f.read()
+        emitter = CLIENT if event_type in CLIENT_EVENTS else SERVER
+        batch.append(
+            (60 * int(minutes) + float(seconds), emitter, raw, int(count or 1))
+        )
+    SessionRecorder(prefix).write(batch)
+
+
+def encode(event: dict[str, Any]) -> str:
+    return json.dumps(event, separators=(",", ":"))
+
+
+def make_text_event(event: dict[str, Any]) -> dict[str, Any] | None:
+    """event of a text only response, None for audio events."""
+    event_type = event.get("type")
+    if event_type in ("response.audio.delta", "response.audio.done"):
+        return None
+    if event_type == "response.audio_transcript.delta":
+        return {**event, "type": "response.text.delta"}
+    if event_type == "response.audio_transcript.done":
+        text_event = {
+            **event,
+            "type": "response.text.done",
+            "text": event.get("transcript", ""),
+        }
+        del text_event["transcript"]
+        return text_event
+    return event
+
+
+def make_cancelled_response_done(response_id: str) -> dict[str, Any]:
+    return {
+        "type": "response.done",
+        "event_id": f"event_cancel_{response_id}",
+        "response": {"id": response_id, "status": "cancelled", "output": []},
+    }
+
+
+def make_item_truncated(truncate: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "type": "conversation.item.truncated",
+        "event_id": f"event_truncate_{truncate['item_id']}",
+        "item_id": truncate["item_id"],
+        "content_index": truncate.get("content_index", 0),
+        "audio_end_ms": truncate["audio_end_ms"],
+    }
+
+
+class ReplayServer:
+    """Answer each response.create with the next recorded response.
+
+    Server events are replayed with their recorded delays from the client
+    response.create that triggered them, multiplied by time_scale. A
+    response.cancel stops the replay with a cancelled response.done.
+    Responses without the audio modality are replayed without audio, their
+    transcript as text.
+    """
+
+    def __init__(self, recording: list[RecordedEvent], time_scale: float = 1):
+        self.time_scale = time_scale
+        self.session_created: dict[str, Any] = {}
+        self.session_updated: dict[str, Any] = {}
+        # (delay, encoded event) for each recorded response
+        self.turns: list[list[tuple[float, str]]] = []
+        # the same responses without audio, for text only sessions
+        self.text_turns: list[list[tuple[float, str]]] = []
+        self.response_ids: list[str] = []
+        self.connections = 0
+        # types of the client events received, in order
+        self.received: list[str] = []
+        # bytes of input audio appended
+        self.appended_bytes = 0
+
+        turn_start: float | None = None
+        for recorded in recording:
+            if recorded.type == "session.created":
+                self.session_created = recorded.event
+            elif recorded.type == "session.updated":
+                self.session_updated = recorded.event
+            elif recorded.type == "response.create":
+                turn_start = recorded.time
+                self.turns.append([])
+                self.text_turns.append([])
+                self.response_ids.append("")
+            elif turn_start is not None and recorded.type not in CLIENT_EVENTS | {
+                "error"
+            }:
+                if recorded.type == "response.created":
+                    self.response_ids[-1] = recorded.event["response"]["id"]
+                raw = encode(recorded.event)
+                self.turns[-1].extend(
+                    [(recorded.time - turn_start, raw)] * recorded.repeat
+                )
+                text_event = make_text_event(recorded.event)
+                if text_event is not None:
+                    raw = encode(text_event)
+                    self.text_turns[-1].extend(
+                        [(recorded.time - turn_start, raw)] * recorded.repeat
+                    )
+
+    def make_session(self, session: dict[str, Any]) -> dict[str, Any]:
+        return {
+            **self.session_updated.get("session", {}),
+            **session,
+            "expires_at": int(time.time()) + SESSION_DURATION,
+        }
+
+    async def replay(
+        self, websocket, turn: list[tuple[float, str]], previous: asyncio.Task | None
+    ) -> None:
+        if previous is not None:
+            await previous
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            for delay, raw in turn:
+                wait = start + delay * self.time_scale - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await websocket.send(raw)
+        except ConnectionClosed:
+            pass
+
+    async def handler(self, websocket) -> None:
+        self.connections += 1
+        session = self.make_session({})
+        await websocket.send(encode({**self.session_created, "session": session}))
+
+        turn_index = 0
+        response_id = ""
+        replay_task: asyncio.Task | None = None
+        try:
+            async for message in websocket:
+                event = json.loads(message)
+                self.received.append(event.get("type"))
+                if event.get("type") == "input_audio_buffer.append":
+                    self.appended_bytes += len(base64.b64decode(event.get("audio", "")))
+                if event.get("type") == "session.update":
+                    session = self.make_session({**session, **event.get("session", {})})
+                    await websocket.send(
+                        encode({**self.session_updated, "session": session})
+                    )
+                elif event.get("type") == "response.create" and self.turns:
+                    modalities = event.get("response", {}).get(
+                        "modalities"
+                    ) or session.get("modalities", ["audio", "text"])
+                    turns = self.turns if "audio" in modalities else self.text_turns
+                    turn = turns[turn_index % len(turns)]
+                    response_id = self.response_ids[turn_index % len(self.turns)]
+                    turn_index += 1
+                    replay_task = asyncio.create_task(
+                        self.replay(websocket, turn, replay_task)
+                    )
+                elif event.get("type") == "response.cancel":
+                    if replay_task is not None and not replay_task.done():
+                        replay_task.cancel()
+                        await websocket.send(
+                            encode(make_cancelled_response_done(response_id))
+                        )
+                elif event.get("type") == "conversation.item.truncate":
+                    await websocket.send(encode(make_item_truncated(event)))
+        except ConnectionClosed:
+            pass
+        finally:
+            if replay_task is not None:
+                replay_task.cancel()
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        return websockets.serve(self.handler, host, port, max_size=None)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--dumps", default="dumps", help="dumps directory or recording prefix"
+    )
+    parser.add_argument(
+        "--time-scale", type=float, default=1, help="0 replays without delays"
+    )
+    args = parser.parse_args()
+
+    server = ReplayServer(load_recording(args.dumps), time_scale=args.time_scale)
+    async with server.serve(args.host, args.port):
+        print(
+            f"replaying {len(server.turns)} responses on ws://{args.host}:{args.port}/v1"
+        )
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+import asyncio
+import inspect
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class Tool:
+    """A tool callable with a timeout, a concurrency limit and a result cache.
+
+    Sync tools run in the default thread pool; a timed out sync call keeps
+    its thread until it returns. Results are cached by arguments for
+    cache_ttl seconds when cache_size is set. Tool instances are meant to be
+    shared by every session, the limit and the cache are process wide.
+    """
+
+    def __init__(
+        self,
+        func: Callable[..., Any],
+        timeout: float = 10,
+        concurrency: int = 8,
+        cache_size: int = 0,
+        cache_ttl: float = 60,
+    ):
+        self.func = func
+        self.name = func.__name__
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # arguments -> (expires_at, output)
+        self.cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def cached(self, key: str) -> str | None:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return entry[1]
+
+    def store(self, key: str, output: str) -> None:
+        self.cache[key] = (time.monotonic() + self.cache_ttl, output)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def invoke(self, arguments: dict[str, Any]) -> Any:
+        if inspect.iscoroutinefunction(self.func):
+            return await self.func(**arguments)
+        return await asyncio.to_thread(self.func, **arguments)
+
+    async def __call__(self, arguments: str) -> str:
+        """Json output of the call, or of the error it raised."""
+        try:
+            # malformed arguments from the model are answered like a failed call
+            params = json.loads(arguments or "{}")
+            key = json.dumps(params, sort_keys=True)
+            if self.cache_size:
+                output = self.cached(key)
+                if output is not None:
+                    return output
+            async with self.semaphore:
+                result = await asyncio.wait_for(self.invoke(params), self.timeout)
+        except TimeoutError:
+            return json.dumps({"error": f"{self.name} timed out after {self.timeout}s"})
+        except Exception as e:
+            logger.exception("tool %s failed", self.name)
+            return json.dumps({"error": f"{type(e).__name__}: {e}"})
+        output = json.dumps(result, default=str)
+        if self.cache_size:
+            self.store(key, output)
+        return output
+
+
+class ToolRuntime:
+    """Run the function calls of each response, then answer them at once.
+
+    Calls start as soon as their response.output_item.done arrives and run
+    concurrently. Once the response is completed, their outputs are sent as
+    function_call_output items followed by a single response.create, without
+    blocking the upstream events meanwhile. Calls of a cancelled or incomplete
+    response are dropped.
+    """
+
+    def __init__(
+        self,
+        tools: list[Tool],
+        openai_producer,
+        response_tools: list[Callable[..., Any]] | None = None,
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.openai_producer = openai_producer
+        # tools argument of the response.create answering the calls
+        self.response_tools = (
+            response_tools if response_tools is not None else [t.func for t in tools]
+        )
+        # response id -> (call id, running call)
+        self.calls: dict[str, list[tuple[str, asyncio.Task[str]]]] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    def subscribe(self, event_consumer) -> None:
+        event_consumer.subscribe("response.output_item.done", self.on_output_item_done)
+        event_consumer.subscribe("response.done", self.on_response_done)
+
+    async def call(self, name: str, arguments: str) -> str:
+        tool = self.tools.get(name)
+        if tool is None:
+            return json.dumps({"error": f"unknown tool {name}"})
+        return await tool(arguments)
+
+    async def on_output_item_done(self, event) -> None:
+        item = event.item
+        if item.type != "function_call" or item.call_id is None:
+            return
+        task = asyncio.create_task(self.call(item.name or "", item.arguments or ""))
+        self.calls.setdefault(event.response_id, []).append((item.call_id, task))
+
+    async def on_response_done(self, event) -> None:
+        if event.response is None:
+            return
+        calls = self.calls.pop(event.response.id, None)
+        if calls and event.response.status != "completed":
+            for _, call in calls:
+                call.cancel()
+        elif calls:
+            task = asyncio.create_task(self.answer(calls))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def answer(self, calls: list[tuple[str, asyncio.Task[str]]]) -> None:
+        outputs = await asyncio.gather(*(task for _, task in calls))
+        for (call_id, _), output in zip(calls, outputs):
+            await self.openai_producer.make_function_call_output(call_id, output)
+        await self.openai_producer.make_response_create(self.response_tools)
+
+    async def close(self) -> None:
+        tasks = [
+            *self.tasks,
+            *(task for calls in self.calls.values() for _, task in calls),
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.calls.clear()
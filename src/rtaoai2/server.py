@@ -1,30 +1,473 @@
-import io
 import asyncio
+import json
+import logging
 import os
-import base64
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any
+from collections.abc import AsyncIterator
 
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from starlette.types import Message as WebSocketMessage
-from pydub import AudioSegment  # type: ignore[import-untyped]
 from openai import AsyncOpenAI
+from websockets.exceptions import ConnectionClosedOK
 
+from rtaoai2 import g711, metrics
+from rtaoai2.audio import (
+    AUDIO_FORMATS,
+    PCM16,
+    SAMPLE_RATE,
+    AudioDecoderPool,
+    Resampler,
+    bytes_per_ms,
+    encode_to_base64,
+    flush_stream,
+)
+from rtaoai2.openai.consumer import (
+    OpenAIEventConsumer,
+    OpenAIStreamingEventConsumer,
+    peek_event_type,
+)
+from rtaoai2.openai.pool import RealtimeSessionPool
+from rtaoai2.openai.producer import OpenAIEventProducer, ToolRegistry
+from rtaoai2.openai.ratelimit import RateLimitScheduler
+from rtaoai2.openai.recorder import SessionRecorder
+from rtaoai2.openai.tools import Tool, ToolRuntime
+from rtaoai2.transcode import CODECS, PCM16_16K, AudioTranscoder
+from rtaoai2.ui.broadcast import BroadcastHub, encode_json
+from rtaoai2.ui.coalescer import CoalescingEventProducer
 from rtaoai2.ui.consumer import EventConsumer
+from rtaoai2.ui.conversation import ConversationStore
+from rtaoai2.ui.interrupt import InterruptibleEventProducer
+from rtaoai2.ui.outbound import TRY_AGAIN_LATER, OutboundQueue
+from rtaoai2.ui.resume import ResumableOutbound, SessionLimitError, SessionRegistry
 from rtaoai2.ui.producer import EventProducer
+from rtaoai2.vad import VoiceActivityDetector
+
+
+decoder_pool = AudioDecoderPool(
+    max_workers=int(os.environ.get("RTAOAI2_DECODER_WORKERS", "0")) or None
+)
+
+# Outgoing deltas are merged for up to this window or byte size, 0 disables it
+COALESCE_WINDOW = float(os.environ.get("RTAOAI2_COALESCE_MS", "20")) / 1000
+COALESCE_BYTES = int(os.environ.get("RTAOAI2_COALESCE_BYTES", str(32 * 1024)))
+
+# Messages queued per client before the slow client policy applies,
+# one of rtaoai2.ui.outbound.POLICIES
+OUTBOUND_QUEUE_SIZE = int(os.environ.get("RTAOAI2_OUTBOUND_QUEUE_SIZE", "256"))
+SLOW_CLIENT_POLICY = os.environ.get("RTAOAI2_SLOW_CLIENT_POLICY", "drop_audio")
+
+
+def get_product_remaining_stock(product_id: int) -> int:
+    """Get product remaining stock given a product id."""
+    try:
+        return [1, 23, 244, 344, 123][product_id]
+    except IndexError:
+        return 0
+
+
+def list_all_products() -> list[int]:
+    """List all available products. Returns a list of int."""
+    return list(range(20))
+
+
+# Each tool call is limited in time and in concurrent calls across sessions,
+# results are cached by arguments for RTAOAI2_TOOL_CACHE_TTL seconds
+TOOL_TIMEOUT = float(os.environ.get("RTAOAI2_TOOL_TIMEOUT", "10"))
+TOOL_CONCURRENCY = int(os.environ.get("RTAOAI2_TOOL_CONCURRENCY", "8"))
+TOOL_CACHE_SIZE = int(os.environ.get("RTAOAI2_TOOL_CACHE_SIZE", "128"))
+TOOL_CACHE_TTL = float(os.environ.get("RTAOAI2_TOOL_CACHE_TTL", "60"))
+
+TOOLS = [
+    Tool(
+        func,
+        timeout=TOOL_TIMEOUT,
+        concurrency=TOOL_CONCURRENCY,
+        cache_size=TOOL_CACHE_SIZE,
+        cache_ttl=TOOL_CACHE_TTL,
+    )
+    for func in (get_product_remaining_stock, list_all_products)
+]
+
+# schemas sent once per session, responses for the same tools carry none
+TOOL_REGISTRY = ToolRegistry([tool.func for tool in TOOLS])
+
+
+MODEL = "gpt-4o-realtime-preview-2024-10-01"
+
+SESSION = {
+    "tools": TOOL_REGISTRY.schemas,
+    "input_audio_transcription": {"model": "whisper-1"},
+    # turns are committed by the client, or by our own vad
+    "turn_detection": None,
+}
+
+# response.create of all sessions wait while fewer requests or tokens than
+# these would be left under the upstream rate limits
+RATE_LIMIT_SCHEDULER = RateLimitScheduler(
+    reserve={
+        "requests": int(os.environ.get("RTAOAI2_RATE_LIMIT_RESERVE_REQUESTS", "0")),
+        "tokens": int(os.environ.get("RTAOAI2_RATE_LIMIT_RESERVE_TOKENS", "4096")),
+    }
+)
+
+# Connected and configured upstream sessions kept ready for new clients
+SESSION_POOL_SIZE = int(os.environ.get("RTAOAI2_SESSION_POOL_SIZE", "2"))
+
+
+# Upstream sessions a worker holds, attached or parked, 0 for no limit.
+# New clients wait up to RTAOAI2_ADMISSION_TIMEOUT seconds for a slot
+# before being closed with 1013 (try again later)
+MAX_SESSIONS = int(os.environ.get("RTAOAI2_MAX_SESSIONS", "100"))
+ADMISSION_TIMEOUT = float(os.environ.get("RTAOAI2_ADMISSION_TIMEOUT", "5"))
+
+# Sessions without client message nor upstream event for this many seconds
+# are closed, 0 disables it
+IDLE_TIMEOUT = float(os.environ.get("RTAOAI2_IDLE_TIMEOUT", "300"))
+
+# A client that lost its websocket can resume its session for this many
+# seconds, 0 disables resumption. Messages meanwhile are kept up to
+# RTAOAI2_RESUME_BUFFER_BYTES per session, the oldest parked sessions are
+# closed beyond RTAOAI2_MAX_PARKED_SESSIONS or RTAOAI2_MAX_PARKED_BYTES
+RESUME_GRACE = float(os.environ.get("RTAOAI2_RESUME_GRACE", "30"))
+RESUME_BUFFER_BYTES = int(
+    os.environ.get("RTAOAI2_RESUME_BUFFER_BYTES", str(1024 * 1024))
+)
+MAX_PARKED_SESSIONS = int(os.environ.get("RTAOAI2_MAX_PARKED_SESSIONS", "100"))
+MAX_PARKED_BYTES = int(
+    os.environ.get("RTAOAI2_MAX_PARKED_BYTES", str(64 * 1024 * 1024))
+)
+
+
+# Every client and upstream event of each session is written to this
+# directory when set, as csv like opanai_events.csv or as jsonl
+TRACE_DIR = os.environ.get("RTAOAI2_TRACE_DIR")
+TRACE_FORMAT = os.environ.get("RTAOAI2_TRACE_FORMAT", "csv")
+
+# Every upstream event sent and received is recorded in this directory when
+# set, see rtaoai2.openai.recorder; parts rotate by size or age
+RECORD_DIR = os.environ.get("RTAOAI2_RECORD_DIR")
+RECORD_MAX_BYTES = int(
+    os.environ.get("RTAOAI2_RECORD_MAX_BYTES", str(64 * 1024 * 1024))
+)
+RECORD_MAX_SECONDS = float(os.environ.get("RTAOAI2_RECORD_MAX_SECONDS", "3600"))
+
+# Response audio transcoded with ?audio_codec=opus is encoded at this
+# bitrate, or downsampled to RTAOAI2_OPUS_FALLBACK without libopus
+OPUS_BITRATE = int(os.environ.get("RTAOAI2_OPUS_BITRATE", "24000"))
+OPUS_FALLBACK = os.environ.get("RTAOAI2_OPUS_FALLBACK", PCM16_16K)
+
+# Read-only observers of a session, /ws/observe/{id}: at most
+# RTAOAI2_MAX_OBSERVERS each, closed once RTAOAI2_OBSERVER_QUEUE_SIZE
+# messages are waiting for them
+MAX_OBSERVERS = int(os.environ.get("RTAOAI2_MAX_OBSERVERS", "8"))
+OBSERVER_QUEUE_SIZE = int(os.environ.get("RTAOAI2_OBSERVER_QUEUE_SIZE", "256"))
+
+# Items of the conversation kept for the snapshots of ?conversation=true
+CONVERSATION_MAX_ITEMS = int(os.environ.get("RTAOAI2_CONVERSATION_MAX_ITEMS", "256"))
+
+
+# Control message sent by a streaming client once the user stopped talking
+INPUT_AUDIO_COMMIT = "input_audio.commit"
+# Control message with a user text turn, {"type": "input_text", "data": <text>},
+# "modalities": ["text"] asks for a text only response to this turn
+INPUT_TEXT = "input_text"
+# What input=blob turns are: audio files, wav or any format ffmpeg reads,
+# or raw mono pcm16 at the session sample_rate
+BLOB_FILE = "file"
+BLOB_FORMATS = (BLOB_FILE, PCM16)
+# Output modalities a session can ask for with ?modalities=
+MODALITIES = ({"text"}, {"audio", "text"})
+# Control message interrupting the response in flight, with the
+# milliseconds of its audio played so far when the client knows it
+RESPONSE_CANCEL = "response.cancel"
 
+logger = logging.getLogger(__name__)
 
-def audio_to_item_create_event(audio_bytes: bytes) -> str:
-    # Load the audio file from the byte stream
-    audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
 
-    # Resample to 24kHz mono pcm16
-    pcm_audio = audio.set_frame_rate(24000).set_channels(1).set_sample_width(2).raw_data
+def parse_control_message(text: str) -> dict[str, Any] | None:
+    """The json object of a client text frame, None when it isn't one."""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        message = None
+    if not isinstance(message, dict):
+        logger.warning("ignored a client text frame that isn't a json object")
+        return None
+    return message
 
-    # Encode to base64 string
-    return base64.b64encode(pcm_audio).decode()
 
+def valid_modalities(modalities: Any) -> bool:
+    return (
+        isinstance(modalities, list)
+        and all(isinstance(modality, str) for modality in modalities)
+        and set(modalities) in MODALITIES
+    )
 
-app = FastAPI()
+
+class ClientSession:
+    """What a /ws client keeps across reconnects: its upstream session and pipeline.
+
+    The upstream session is read until it closes, whether a client websocket
+    is attached or not; messages for the client go through outbound.
+    """
+
+    def __init__(
+        self,
+        session,
+        input: str = "blob",
+        sample_rate: int = SAMPLE_RATE,
+        blob: str = BLOB_FILE,
+        binary_audio: bool = False,
+        vad: bool = False,
+        input_format: str = PCM16,
+        output_format: str = PCM16,
+        audio_codec: str = PCM16,
+        conversation: bool = False,
+    ):
+        self.session = session
+        self.input = input
+        self.sample_rate = sample_rate
+        # rate of the raw pcm16 blobs, None for audio files
+        self.blob_rate = sample_rate if blob == PCM16 else None
+        self.input_format = input_format
+        # streamed input is resampled as one stream, not frame by frame
+        self.resampler = Resampler(sample_rate) if sample_rate != SAMPLE_RATE else None
+        self.format_resampler = None
+        if input_format != PCM16:
+            self.format_resampler = Resampler(SAMPLE_RATE, g711.SAMPLE_RATE)
+        self.token = ""
+        # public id observers subscribe with, unlike token it can't resume
+        self.id = uuid.uuid4().hex
+        self.timeline = metrics.TurnTimeline(record=TRACE_DIR is not None)
+        self.recorder = None
+        if RECORD_DIR is not None:
+            self.recorder = SessionRecorder(
+                os.path.join(RECORD_DIR, uuid.uuid4().hex),
+                max_bytes=RECORD_MAX_BYTES,
+                max_seconds=RECORD_MAX_SECONDS,
+            )
+            self.recorder.start()
+        self.openai_event_producer = OpenAIEventProducer(
+            session,
+            tool_registry=TOOL_REGISTRY,
+            scheduler=RATE_LIMIT_SCHEDULER,
+            recorder=self.recorder,
+        )
+        self.tool_runtime = ToolRuntime(TOOLS, self.openai_event_producer)
+        self.ui_event_consumer = EventConsumer(self.openai_event_producer)
+        self.outbound = ResumableOutbound(max_bytes=RESUME_BUFFER_BYTES)
+        self.transcoder = None
+        if audio_codec != PCM16:
+            self.transcoder = AudioTranscoder(audio_codec, OPUS_BITRATE, OPUS_FALLBACK)
+        self.hub = BroadcastHub(
+            self.outbound, max_observers=MAX_OBSERVERS, queue_size=OBSERVER_QUEUE_SIZE
+        )
+        self.ui_event_producer = CoalescingEventProducer(
+            EventProducer(
+                self.hub, binary_audio=binary_audio, transcoder=self.transcoder
+            ),
+            window=COALESCE_WINDOW,
+            max_bytes=COALESCE_BYTES,
+        )
+        # new user audio or a response.cancel message interrupts the response
+        self.interrupter = InterruptibleEventProducer(
+            self.ui_event_producer,
+            self.hub,
+            self.openai_event_producer,
+            bytes_per_ms=bytes_per_ms(output_format),
+        )
+        self.openai_event_consumer = OpenAIStreamingEventConsumer(
+            event_consumer=OpenAIEventConsumer(), response_producer=self.interrupter
+        )
+        self.tool_runtime.subscribe(self.openai_event_consumer.event_consumer)
+        self.conversation = None
+        if conversation:
+            self.conversation = ConversationStore(
+                self.hub, max_items=CONVERSATION_MAX_ITEMS
+            )
+            self.conversation.subscribe(self.openai_event_consumer.event_consumer)
+        self.openai_event_consumer.event_consumer.subscribe(
+            "rate_limits.updated", RATE_LIMIT_SCHEDULER.on_rate_limits_updated
+        )
+        self.detector = VoiceActivityDetector() if vad else None
+        self.has_pending_audio = False
+        self.last_activity = time.monotonic()
+        self.upstream_task = asyncio.create_task(self.read_upstream())
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self.outbound.ring_bytes
+
+    async def read_upstream(self) -> None:
+        while True:
+            try:
+                raw_event = await self.session.connection.recv_bytes()
+            except ConnectionClosedOK:
+                return
+            self.last_activity = time.monotonic()
+            if self.recorder is not None:
+                self.recorder.server(raw_event)
+            self.timeline.server(peek_event_type(raw_event))
+            await self.openai_event_consumer.on_raw_event(raw_event)
+
+    async def wait_idle(self, timeout: float) -> None:
+        """Return once nothing happened for timeout seconds."""
+        while True:
+            remaining = self.last_activity + timeout - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    async def commit_turn(self) -> None:
+        # the filter tail of the turn, the next one doesn't start with its history
+        tail = await asyncio.to_thread(
+            flush_stream, self.input_format, self.resampler, self.format_resampler
+        )
+        if tail:
+            await self.ui_event_consumer.on_audio_append(tail)
+        await self.ui_event_consumer.on_audio_commit()
+        self.timeline.client(metrics.AUDIO_COMMIT)
+        await self.ui_event_consumer.on_response_create(
+            self.tool_runtime.response_tools
+        )
+
+    async def interrupt(self, played_ms: int | None = None) -> None:
+        if await self.interrupter.interrupt(played_ms):
+            self.timeline.interrupt()
+            if self.conversation is not None:
+                self.conversation.interrupt(self.interrupter.interrupted_id)
+
+    async def on_client_message(self, data: WebSocketMessage) -> None:
+        # input=blob: one encoded audio file, or raw pcm16 with blob=pcm16, per
+        #   turn, decoded then committed
+        # input=stream: mono pcm16 frames at sample_rate appended while the user
+        #   talks, the turn ends with a {"type": "input_audio.commit"} text message
+        timeline = self.timeline
+        self.last_activity = time.monotonic()
+        message = None
+        if data.get("text"):
+            message = parse_control_message(data["text"])
+            if message is None:
+                return
+        if message is not None and message.get("type") == RESPONSE_CANCEL:
+            played_ms = message.get("played_ms")
+            await self.interrupt(played_ms if isinstance(played_ms, int) else None)
+            return
+        if message is not None and message.get("type") == INPUT_TEXT:
+            text, modalities = message.get("data"), message.get("modalities")
+            if not isinstance(text, str) or (
+                modalities is not None and not valid_modalities(modalities)
+            ):
+                logger.warning("ignored an invalid %s message", INPUT_TEXT)
+                return
+            await self.interrupt()
+            await self.ui_event_consumer.on_text(text)
+            await self.ui_event_consumer.on_response_create(
+                self.tool_runtime.response_tools, modalities
+            )
+            return
+        if self.input == "stream":
+            if data.get("bytes"):
+                timeline.client(metrics.AUDIO_RECEIVED)
+                ended = False
+                if self.detector is None and self.input_format == PCM16:
+                    encoded = await decoder_pool.decode_pcm16(
+                        data["bytes"], self.sample_rate, self.resampler
+                    )
+                else:
+                    pcm = await decoder_pool.resample_pcm16(
+                        data["bytes"], self.sample_rate, self.resampler
+                    )
+                    if self.detector is not None:
+                        pcm, ended = self.detector.feed(pcm)
+                    encoded = await asyncio.to_thread(
+                        encode_to_base64, pcm, self.input_format, self.format_resampler
+                    )
+                timeline.client(metrics.AUDIO_DECODED)
+                if encoded:
+                    # the user talks over the response
+                    await self.interrupt()
+                    await self.ui_event_consumer.on_audio_append(encoded)
+                    timeline.client(metrics.AUDIO_APPEND)
+                    self.has_pending_audio = True
+                if ended and self.has_pending_audio:
+                    await self.commit_turn()
+                    self.has_pending_audio = False
+            elif message is not None:
+                if message.get("type") != INPUT_AUDIO_COMMIT:
+                    return
+                if self.detector is not None:
+                    self.detector.reset()
+                # committing an empty buffer is an upstream error
+                if self.has_pending_audio:
+                    await self.commit_turn()
+                    self.has_pending_audio = False
+        elif "bytes" in data:
+            timeline.client(metrics.AUDIO_RECEIVED)
+            if self.detector is None and self.input_format == PCM16:
+                encoded = await decoder_pool.decode(data["bytes"], self.blob_rate)
+            else:
+                pcm = await decoder_pool.decode_pcm(data["bytes"], self.blob_rate)
+                if self.detector is not None:
+                    pcm = await asyncio.to_thread(self.detector.trim, pcm)
+                if not pcm:
+                    return
+                encoded = await asyncio.to_thread(
+                    encode_to_base64, pcm, self.input_format
+                )
+            timeline.client(metrics.AUDIO_DECODED)
+            await self.interrupt()
+            await self.ui_event_consumer.on_audio_append(encoded)
+            timeline.client(metrics.AUDIO_APPEND)
+            await self.commit_turn()
+
+    async def close(self) -> None:
+        self.upstream_task.cancel()
+        await self.tool_runtime.close()
+        await self.hub.close()
+        await self.session.close()
+        if self.recorder is not None:
+            await self.recorder.close()
+        if TRACE_DIR is not None and self.timeline.rows:
+            path = os.path.join(TRACE_DIR, f"{uuid.uuid4().hex}.{TRACE_FORMAT}")
+            await asyncio.to_thread(metrics.write_trace, self.timeline.rows, path)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    decoder_pool.start()
+    client = AsyncOpenAI(
+        api_key=os.environ["OPENAI_API_KEY"],
+        websocket_base_url=os.environ.get("OPENAI_WEBSOCKET_BASE_URL"),
+    )
+    app.state.session_pool = RealtimeSessionPool(
+        client,
+        model=MODEL,
+        session=SESSION,
+        size=SESSION_POOL_SIZE,
+        extra_headers={"OpenAI-Beta": "realtime=v1"},
+    )
+    app.state.session_pool.start()
+    app.state.session_registry = SessionRegistry(
+        grace=RESUME_GRACE,
+        max_parked=MAX_PARKED_SESSIONS,
+        max_parked_bytes=MAX_PARKED_BYTES,
+        max_sessions=MAX_SESSIONS,
+        admission_timeout=ADMISSION_TIMEOUT,
+    )
+    yield
+    await app.state.session_registry.close()
+    await app.state.session_pool.close()
+    await client.close()
+    decoder_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost",
@@ -42,93 +485,228 @@ app.add_middleware(
 )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint() -> str:
+    registry: SessionRegistry = app.state.session_registry
+    for state, count in registry.counts().items():
+        metrics.SESSIONS.set(state, count)
+    queued = {"attached": 0, "parked": 0}
+    transcripts = {"attached": 0, "parked": 0}
+    for token, session in registry.sessions.items():
+        if session is not None:
+            state = "parked" if token in registry.parked else "attached"
+            queued[state] += session.outbound.depth
+            transcripts[state] += session.openai_event_consumer.buffered_bytes
+    for state, depth in queued.items():
+        metrics.OUTBOUND_QUEUED.set(state, depth)
+        metrics.TRANSCRIPT_BUFFERED.set(state, transcripts[state])
+    return metrics.render_metrics(
+        (
+            metrics.TURN_SECONDS,
+            metrics.RESPONSE_QUEUE_SECONDS,
+            metrics.SESSIONS,
+            metrics.SESSIONS_ENDED,
+            metrics.OUTBOUND_MESSAGES,
+            metrics.OUTBOUND_QUEUED,
+            metrics.OUTBOUND_MAX_DEPTH,
+            metrics.TRANSCRIPT_BUFFERED,
+        )
+    )
+
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket) -> None:
-    def get_product_remaining_stock(product_id: int) -> int:
-        """Get product remaining stock given a product id."""
+async def websocket_endpoint(
+    websocket: WebSocket,
+    input: str = "blob",
+    sample_rate: int = SAMPLE_RATE,
+    blob: str = BLOB_FILE,
+    audio: str = "json",
+    vad: bool = False,
+    input_format: str = PCM16,
+    output_format: str = PCM16,
+    modalities: str | None = None,
+    audio_codec: str = PCM16,
+    conversation: bool = False,
+    resume: str | None = None,
+) -> None:
+    # blob=pcm16: input=blob turns are raw mono pcm16 at sample_rate rather
+    #   than audio files, they are converted without ffmpeg
+    # audio=json: response audio sent as base64 in {"type": "audio"} messages
+    # audio=binary: response audio sent as binary frames, see make_audio_frame
+    # vad=true: silence is trimmed before being sent upstream, streamed turns
+    #   are also committed as soon as the speech ends
+    # input_format, output_format: upstream audio formats, g711_ulaw or
+    #   g711_alaw are 8kHz, output audio is sent to the client as is
+    # modalities=text: text only responses, as transcript messages, the
+    #   session can still take audio input; "audio,text" by default
+    # audio_codec=opus, pcm16_16k or pcm16_8k: pcm16 response audio is sent
+    #   as 20ms opus packets or downsampled, see rtaoai2.transcode; the codec
+    #   used is sent in a {"type": "audio.codec"} message after the session one
+    # conversation=true: the conversation is kept server side and sent as
+    #   conversation.diff messages, with a conversation.snapshot on every
+    #   (re)connect, see ConversationStore
+    # resume: token of the {"type": "session"} message sent by a previous
+    #   connection, its session continues with the options it was opened with;
+    #   its "id" is the one to observe the session with
+    registry: SessionRegistry = websocket.app.state.session_registry
+    client_session = registry.resume(resume) if resume else None
+    if client_session is not None and client_session.upstream_task.done():
+        # the upstream session ended while parked
+        await registry.remove(client_session.token)
+        client_session = None
+    created = client_session is None
+    requested = modalities.split(",") if modalities is not None else None
+    if client_session is None:
+        if (
+            blob not in BLOB_FORMATS
+            or input_format not in AUDIO_FORMATS
+            or output_format not in AUDIO_FORMATS
+            or (requested is not None and not valid_modalities(requested))
+            or audio_codec not in CODECS
+            or (audio_codec != PCM16 and output_format != PCM16)
+        ):
+            await websocket.close(code=1008)
+            return
+        try:
+            token = await registry.reserve()
+        except SessionLimitError:
+            metrics.SESSIONS_ENDED.inc("rejected")
+            # accepted first so the client gets the close code
+            await websocket.accept()
+            await websocket.close(code=TRY_AGAIN_LATER)
+            return
         try:
-            return [1, 23, 244, 344, 123][product_id]
-        except IndexError:
-            return 0
-
-    def list_all_products() -> list[int]:
-        """List all available products. Returns a list of int."""
-        return list(range(20))
-
-    # async def on_output_item_done(output_item: OutputItemDone):
-    #     # TODO: make it dynamic
-    #     if output_item.item.name == "get_product_remaining_stock":
-    #         if output_item.item.arguments is None:
-    #             raise ValueError("arguments can't be None")
-    #         params = json.loads(output_item.item.arguments)
-    #         result = get_product_remaining_stock(**params)
-    #         send_json = json.dumps(
-    #             {
-    #                 "type": "conversation.item.create",
-    #                 "item": {
-    #                     "call_id": output_item.item.call_id,
-    #                     "type": "function_call_output",
-    #                     # "role": "system",
-    #                     "output": str(result),
-    #                 },
-    #             }
-    #         )
-    #         await openai_runner.ws.send(send_json)
-    #         await openai_runner.ws.send(json.dumps({"type": "response.create"}))
-    #     elif output_item.item.name == "list_all_products":
-    #         list_products_result = list_all_products()
-    #         send_json = json.dumps(
-    #             {
-    #                 "type": "conversation.item.create",
-    #                 "item": {
-    #                     "call_id": output_item.item.call_id,
-    #                     "type": "function_call_output",
-    #                     # "role": "system",
-    #                     "output": str(list_products_result),
-    #                 },
-    #             }
-    #         )
-
-    client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
-    async with client.realtime.connect(
-        model="gpt-4o-realtime-preview-2024-10-01",
-        headers={"OpenAI-Beta": "realtime=v1"},
-    ) as openai_ws:
-        await openai_ws.session.update(
-            session={
-                "tools": [],
-                "input_audio_transcription": {"model": "whisper-1"},
-            }
+            session = await websocket.app.state.session_pool.acquire()
+        except BaseException:
+            await registry.remove(token)
+            raise
+        client_session = ClientSession(
+            session,
+            input=input,
+            sample_rate=sample_rate,
+            blob=blob,
+            binary_audio=audio == "binary",
+            vad=vad,
+            input_format=input_format,
+            output_format=output_format,
+            audio_codec=audio_codec,
+            conversation=conversation,
         )
-        ui_event_consumer = EventConsumer(openai_ws)
-        ui_event_producer = EventProducer(websocket)
+        client_session.token = registry.register(client_session, token)
 
-        async def client_websocket_handler() -> None:
-            while True:
-                data: WebSocketMessage = await websocket.receive()
+    # upstream reading only waits on the queue, never on the client socket
+    outbound = OutboundQueue(
+        websocket, max_size=OUTBOUND_QUEUE_SIZE, policy=SLOW_CLIENT_POLICY
+    )
 
-                if "bytes" in data:
-                    await ui_event_consumer.on_audio(
-                        audio_to_item_create_event(data["bytes"])
-                    )
-                    await ui_event_consumer.on_response_create(tools=[])
-
-        async def openai_websocket_handler() -> None:
-            async for event in openai_ws:
-                event_type = event.get("type")
-                if event_type == "response.audio.delta":
-                    await ui_event_producer.on_response_audio_delta_event(event.get("delta", ""))
-                elif event_type == "response.audio_transcript.delta":
-                    delta = event.get("delta")
-                    if delta:
-                        await ui_event_producer.on_response_audio_transcript_delta_event(delta)
-                elif event_type == "conversation.item.input_audio_transcription.completed":
-                    await ui_event_producer.on_response_audio_input_transcript_done_event(
-                        event.get("transcript", "")
-                    )
-                elif event_type == "response.done":
-                    await ui_event_producer.on_response_done()
+    async def client_websocket_handler() -> None:
+        while True:
+            data: WebSocketMessage = await websocket.receive()
+            if data["type"] == "websocket.disconnect":
+                return
+            await client_session.on_client_message(data)
 
+    tasks: list[asyncio.Task] = []
+    upstream_task = client_session.upstream_task
+    # the session ends with its upstream side, when idle, or when handling
+    # the client failed; a client that went away can resume it
+    end_reason = None
+    try:
+        # a session failing to set up is closed with the others ending in error
+        if created and (input_format, output_format) != (PCM16, PCM16):
+            await client_session.openai_event_producer.make_audio_format_update(
+                input_format, output_format
+            )
+        if created and requested is not None:
+            await client_session.openai_event_producer.make_modalities_update(requested)
         await websocket.accept()
+        # the writer drains the queue from the first message on
+        tasks.append(asyncio.create_task(outbound.run()))
+        await outbound.send_json(
+            {"type": "session", "data": client_session.token, "id": client_session.id}
+        )
+        if client_session.transcoder is not None:
+            await outbound.send_json(
+                {"type": "audio.codec", "data": client_session.transcoder.describe()}
+            )
+        if client_session.conversation is not None:
+            # diffs missed while parked are replayed, the client skips them
+            await outbound.send_json(client_session.conversation.snapshot())
+        client_session.outbound.attach(outbound)
+        client_task = asyncio.create_task(client_websocket_handler())
+        tasks.append(client_task)
+        idle_task = None
+        if IDLE_TIMEOUT > 0:
+            idle_task = asyncio.create_task(client_session.wait_idle(IDLE_TIMEOUT))
+            tasks.append(idle_task)
+        done, _ = await asyncio.wait(
+            [*tasks, upstream_task], return_when=asyncio.FIRST_COMPLETED
+        )
+        if upstream_task in done:
+            end_reason = "upstream"
+        elif client_task in done and client_task.exception() is not None:
+            end_reason = "error"
+        elif idle_task in done:
+            end_reason = "idle"
+        for task in done:
+            task.result()
+    except Exception:
+        end_reason = end_reason or "error"
+        raise
+    finally:
+        for task in tasks:
+            task.cancel()
+        client_session.outbound.detach()
+        if end_reason is None:
+            await registry.park(client_session.token)
+        else:
+            metrics.SESSIONS_ENDED.inc(end_reason)
+            await registry.remove(client_session.token)
+        # the session no longer references them, wait for their cancellation
+        if tasks:
+            await asyncio.wait(tasks)
+        await outbound.close()
+
+
+@app.websocket("/ws/observe/{session_id}")
+async def observe_endpoint(websocket: WebSocket, session_id: str) -> None:
+    # Read-only copy of what the client of session_id gets, from now on and
+    # while it is parked; closed with 1008 for an unknown session, 1013 when
+    # it has too many observers or this one doesn't keep up
+    registry: SessionRegistry = websocket.app.state.session_registry
+    client_session = next(
+        (
+            session
+            for session in registry.sessions.values()
+            if session is not None and session.id == session_id
+        ),
+        None,
+    )
+    if client_session is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    observer = client_session.hub.subscribe(websocket)
+    if observer is None:
+        await websocket.close(code=TRY_AGAIN_LATER)
+        return
+    if client_session.conversation is not None:
+        # ahead of any diff broadcast from now on
+        observer.offer(encode_json(client_session.conversation.snapshot()))
+
+    async def wait_disconnect() -> None:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
 
-        await asyncio.gather(openai_websocket_handler(), client_websocket_handler())
+    tasks = [
+        asyncio.create_task(observer.run()),
+        asyncio.create_task(wait_disconnect()),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        client_session.hub.unsubscribe(observer)
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+        await observer.close()
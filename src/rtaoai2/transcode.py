@@ -0,0 +1,234 @@
+"""Per-connection transcoding of the 24kHz pcm16 response audio sent to clients.
+
+    uv run rtaoai2 codec-bench --codec opus --seconds 60
+
+Response audio is cut into 20ms frames, the partial tail of a delta waits
+for the next one, and each frame is encoded to opus, or downsampled to
+16kHz or 8kHz pcm16. Opus needs the optional opuslib package and libopus,
+without them it falls back to a downsampled codec. The benchmark reports
+the CPU time spent per second of audio, and so how many real-time streams
+a core can encode.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from typing import Any
+
+import numpy as np
+
+from rtaoai2.audio import (
+    SAMPLE_RATE,
+    Resampler,
+    pcm_to_samples,
+    resample,
+    samples_to_pcm16,
+)
+
+logger = logging.getLogger(__name__)
+
+# codecs a client can ask for, pcm16 is sent as received from upstream
+PCM16 = "pcm16"
+OPUS = "opus"
+PCM16_16K = "pcm16_16k"
+PCM16_8K = "pcm16_8k"
+RATES = {PCM16_16K: 16000, PCM16_8K: 8000}
+CODECS = (PCM16, OPUS, *RATES)
+
+FRAME_MS = 20
+FRAME_SIZE = SAMPLE_RATE * FRAME_MS // 1000
+FRAME_BYTES = FRAME_SIZE * 2
+
+
+class FrameChunker:
+    """Cut a pcm16 stream into frames of frame_bytes whatever the size of its chunks."""
+
+    def __init__(self, frame_bytes: int = FRAME_BYTES):
+        self.frame_bytes = frame_bytes
+        self.pending = b""
+
+    def push(self, pcm: bytes) -> list[bytes]:
+        data = self.pending + pcm
+        end = len(data) - len(data) % self.frame_bytes
+        self.pending = data[end:]
+        return [data[i : i + self.frame_bytes] for i in range(0, end, self.frame_bytes)]
+
+    def flush(self) -> bytes | None:
+        """The partial frame left, padded with silence, None if there is none."""
+        if not self.pending:
+            return None
+        frame = self.pending.ljust(self.frame_bytes, b"\x00")
+        self.pending = b""
+        return frame
+
+    def reset(self) -> None:
+        self.pending = b""
+
+
+class ResampleEncoder:
+    """Frames are downsampled as one stream, flush() returns the filter's tail."""
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.resampler = Resampler(SAMPLE_RATE, rate)
+
+    def encode(self, frame: bytes) -> bytes:
+        return resample(
+            pcm_to_samples(frame, 2), 1, SAMPLE_RATE, self.rate, self.resampler
+        )
+
+    def flush(self) -> bytes:
+        return samples_to_pcm16(self.resampler.flush())
+
+    def reset(self) -> None:
+        self.resampler.reset()
+
+
+class OpusEncoder:
+    rate = SAMPLE_RATE
+
+    def __init__(self, bitrate: int = 24000):
+        import opuslib  # type: ignore[import-not-found]
+
+        self.encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = bitrate
+
+    def encode(self, frame: bytes) -> bytes:
+        return self.encoder.encode(frame, FRAME_SIZE)
+
+    def flush(self) -> bytes:
+        return b""
+
+    def reset(self) -> None:
+        pass
+
+
+def make_encoder(
+    codec: str, opus_bitrate: int = 24000, fallback: str = PCM16_16K
+) -> tuple[str, OpusEncoder | ResampleEncoder]:
+    """The codec actually used and its encoder, opus falls back when unavailable."""
+    if codec == OPUS:
+        try:
+            return OPUS, OpusEncoder(opus_bitrate)
+        # opuslib raises a bare Exception when libopus can't be loaded
+        except Exception as e:  # noqa: BLE001
+            logger.warning("opus unavailable, falling back to %s: %s", fallback, e)
+            codec = fallback
+    if codec not in RATES:
+        raise ValueError(f"unsupported audio codec: {codec}")
+    return codec, ResampleEncoder(RATES[codec])
+
+
+class AudioTranscoder:
+    """Encode the response audio of one connection in a worker thread.
+
+    Opus frames are returned one packet each, downsampled frames joined.
+    Calls must not overlap, the encoder keeps state between frames.
+    """
+
+    def __init__(
+        self, codec: str, opus_bitrate: int = 24000, fallback: str = PCM16_16K
+    ):
+        self.codec, self.encoder = make_encoder(codec, opus_bitrate, fallback)
+        self.chunker = FrameChunker()
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "codec": self.codec,
+            "sample_rate": self.encoder.rate,
+            "frame_ms": FRAME_MS,
+        }
+
+    def packets(self, encoded: list[bytes]) -> list[bytes]:
+        encoded = [packet for packet in encoded if packet]
+        if self.codec == OPUS or not encoded:
+            return encoded
+        return [b"".join(encoded)]
+
+    def encode_sync(self, pcm: bytes) -> list[bytes]:
+        return self.packets(
+            [self.encoder.encode(frame) for frame in self.chunker.push(pcm)]
+        )
+
+    def flush_sync(self) -> list[bytes]:
+        """The partial frame left and what the encoder still holds."""
+        frame = self.chunker.flush()
+        encoded = [self.encoder.encode(frame)] if frame is not None else []
+        return self.packets([*encoded, self.encoder.flush()])
+
+    async def encode(self, pcm: bytes) -> list[bytes]:
+        return await asyncio.to_thread(self.encode_sync, pcm)
+
+    async def flush(self) -> list[bytes]:
+        return await asyncio.to_thread(self.flush_sync)
+
+    def reset(self) -> None:
+        self.chunker.reset()
+        self.encoder.reset()
+
+
+def speech_like(seconds: float) -> bytes:
+    """Harmonics with a wandering pitch over noise, closer to speech than a tone."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2
+    samples = 6000 * voice * envelope + rng.normal(0, 300, len(t))
+    return np.clip(samples, -32768, 32767).astype("<i2").tobytes()
+
+
+def benchmark(
+    codec: str, seconds: float = 30, delta_ms: int = 100, opus_bitrate: int = 24000
+) -> dict[str, Any]:
+    """CPU cost of encoding seconds of audio received in deltas of delta_ms."""
+    transcoder = AudioTranscoder(codec, opus_bitrate)
+    pcm = speech_like(seconds)
+    delta_bytes = SAMPLE_RATE * 2 * delta_ms // 1000
+    # deltas that don't end on a frame boundary, like upstream ones
+    delta_bytes += 2 * (delta_ms % FRAME_MS == 0)
+    output = 0
+    start = time.process_time()
+    for i in range(0, len(pcm), delta_bytes):
+        output += sum(
+            len(packet) for packet in transcoder.encode_sync(pcm[i : i + delta_bytes])
+        )
+    output += sum(len(packet) for packet in transcoder.flush_sync())
+    cpu = time.process_time() - start
+    return {
+        "codec": transcoder.describe(),
+        "audio_seconds": seconds,
+        "cpu_seconds": round(cpu, 4),
+        # share of a core one real-time stream takes
+        "cpu_per_stream": round(cpu / seconds, 6),
+        "streams_per_core": int(seconds / cpu) if cpu else None,
+        "kbit_per_second": round(output * 8 / seconds / 1000, 1),
+        "pcm16_kbit_per_second": SAMPLE_RATE * 16 / 1000,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--codec", choices=CODECS[1:], nargs="*", default=list(CODECS[1:])
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=30, help="audio encoded per codec"
+    )
+    parser.add_argument(
+        "--delta-ms", type=int, default=100, help="size of the upstream deltas"
+    )
+    parser.add_argument("--opus-bitrate", type=int, default=24000)
+
+
+def main(args: argparse.Namespace) -> int:
+    report = [
+        benchmark(codec, args.seconds, args.delta_ms, args.opus_bitrate)
+        for codec in args.codec
+    ]
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
@@ -0,0 +1,121 @@
+import asyncio
+import json
+from collections import deque
+from typing import Any
+
+from rtaoai2.ui.outbound import TRY_AGAIN_LATER
+
+
+def encode_json(data: Any) -> str:
+    # what starlette's send_json writes
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+class Observer:
+    """Bounded queue of encoded messages drained to a read-only websocket by run()."""
+
+    def __init__(self, websocket, max_size: int = 256):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.queue: deque[str | bytes] = deque()
+        self.not_empty = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+
+    def offer(self, frame: str | bytes) -> bool:
+        """Queue frame, False when the queue is full."""
+        if len(self.queue) >= self.max_size:
+            return False
+        self.queue.append(frame)
+        self.not_empty.set()
+        return True
+
+    async def run(self) -> None:
+        while not self.closed:
+            if not self.queue:
+                self.not_empty.clear()
+                await self.not_empty.wait()
+                continue
+            frame = self.queue.popleft()
+            if isinstance(frame, bytes):
+                await self.websocket.send_bytes(frame)
+            else:
+                await self.websocket.send_text(frame)
+            self.sent += 1
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.not_empty.set()
+        try:
+            await self.websocket.close(code=code)
+        except RuntimeError:
+            # already closed by the observer
+            pass
+
+
+class BroadcastHub:
+    """Client messages of a session, also fanned out to its observers.
+
+    Messages go to outbound as before. With observers, each one is encoded
+    once and the same str or bytes is queued for every observer and sent to
+    the client; an observer whose queue is full is closed with 1013 and
+    removed, the client is never held back. It exposes send_json/send_bytes
+    like OutboundQueue.
+    """
+
+    def __init__(self, outbound, max_observers: int = 8, queue_size: int = 256):
+        self.outbound = outbound
+        self.max_observers = max_observers
+        self.queue_size = queue_size
+        self.observers: list[Observer] = []
+        self.dropped = 0
+        # closes of dropped observers, until they are done
+        self.closing: set[asyncio.Task] = set()
+
+    def subscribe(self, websocket) -> Observer | None:
+        """A new observer of websocket, None when there are already max_observers."""
+        if len(self.observers) >= self.max_observers:
+            return None
+        observer = Observer(websocket, max_size=self.queue_size)
+        self.observers.append(observer)
+        return observer
+
+    def unsubscribe(self, observer: Observer) -> None:
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    async def send_json(self, data: Any) -> None:
+        if not self.observers:
+            await self.outbound.send_json(data)
+            return
+        frame = encode_json(data)
+        self.broadcast(frame)
+        await self.outbound.send_text(frame, data.get("type") == "audio")
+
+    async def send_bytes(self, data: bytes) -> None:
+        if self.observers:
+            self.broadcast(data)
+        await self.outbound.send_bytes(data)
+
+    def broadcast(self, frame: str | bytes) -> None:
+        for observer in list(self.observers):
+            if not observer.offer(frame):
+                self.observers.remove(observer)
+                self.dropped += 1
+                task = asyncio.ensure_future(observer.close(code=TRY_AGAIN_LATER))
+                self.closing.add(task)
+                task.add_done_callback(self.closing.discard)
+
+    def discard_audio(self) -> int:
+        # observers see the audio.flush message that follows
+        return self.outbound.discard_audio()
+
+    async def close(self) -> None:
+        observers, self.observers = self.observers, []
+        for observer in observers:
+            await observer.close()
+        if self.closing:
+            await asyncio.wait(self.closing)
@@ -0,0 +1,139 @@
+import asyncio
+import base64
+import logging
+from functools import cached_property
+
+from rtaoai2.ui.interrupt import decoded_size
+from rtaoai2.ui.producer import event_audio
+
+logger = logging.getLogger(__name__)
+
+AUDIO = "audio"
+TRANSCRIPT = "transcript"
+
+
+class AudioDeltaEvent:
+    """Merged response.audio.delta handed to the wrapped producer.
+
+    The audio is kept decoded, it is only encoded back to base64 when
+    delta is read.
+    """
+
+    def __init__(self, response_id: str, item_id: str, audio: bytes):
+        self.response_id = response_id
+        self.item_id = item_id
+        self.audio = audio
+
+    @cached_property
+    def delta(self) -> str:
+        return base64.b64encode(self.audio).decode()
+
+
+class CoalescingEventProducer:
+    """Merge the deltas of the same kind and item before sending them.
+
+    Audio and transcript deltas come interleaved, each kind and item gets its
+    own pending buffer; buffers are flushed in the order of their first delta
+    once window seconds passed since the first one, once max_bytes are
+    pending, before any other event so ordering is kept, and immediately on
+    response done. A buffer holding a single delta forwards its event as is.
+    """
+
+    def __init__(self, producer, window: float = 0.02, max_bytes: int = 32 * 1024):
+        self.producer = producer
+        self.window = window
+        self.max_bytes = max_bytes
+        self.lock = asyncio.Lock()
+        # (kind, key) -> deltas, in the order of their first delta
+        self.pending: dict[tuple[str, tuple[str, str] | None], list] = {}
+        self.pending_bytes = 0
+        self.timer: asyncio.TimerHandle | None = None
+        self.flush_task: asyncio.Future | None = None
+
+    async def on_response_audio_delta_event(self, event):
+        await self.add(
+            AUDIO, (event.response_id, event.item_id), event, decoded_size(event.delta)
+        )
+
+    async def on_response_audio_transcript_delta_event(self, delta: str):
+        await self.add(TRANSCRIPT, None, delta, len(delta))
+
+    async def on_response_audio_input_transcript_done_event(self, transcript: str):
+        async with self.lock:
+            await self.flush_pending()
+            await self.producer.on_response_audio_input_transcript_done_event(
+                transcript
+            )
+
+    async def on_response_created(self, event):
+        async with self.lock:
+            await self.flush_pending()
+            await self.producer.on_response_created(event)
+
+    async def on_response_done(self, event):
+        async with self.lock:
+            await self.flush_pending()
+            await self.producer.on_response_done(event)
+
+    async def add(self, kind: str, key: tuple[str, str] | None, delta, size: int):
+        async with self.lock:
+            self.pending.setdefault((kind, key), []).append(delta)
+            self.pending_bytes += size
+            if self.pending_bytes >= self.max_bytes or self.window <= 0:
+                await self.flush_pending()
+            elif self.timer is None:
+                self.timer = asyncio.get_running_loop().call_later(
+                    self.window, self.on_window_elapsed
+                )
+
+    def on_window_elapsed(self):
+        self.timer = None
+        self.flush_task = asyncio.ensure_future(self.flush())
+        self.flush_task.add_done_callback(self.on_flush_done)
+
+    def on_flush_done(self, task: asyncio.Future) -> None:
+        if task is self.flush_task:
+            self.flush_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("flushing coalesced deltas failed", exc_info=task.exception())
+
+    async def flush(self):
+        async with self.lock:
+            await self.flush_pending()
+
+    async def discard(self):
+        """Drop the pending deltas and those the producer holds, waiting for a flush in progress."""
+        async with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.pending = {}
+            self.pending_bytes = 0
+            await self.producer.discard()
+
+    async def flush_pending(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+
+        pending = self.pending
+        self.pending = {}
+        self.pending_bytes = 0
+        for (kind, key), deltas in pending.items():
+            if kind == TRANSCRIPT:
+                await self.producer.on_response_audio_transcript_delta_event(
+                    "".join(deltas)
+                )
+            elif len(deltas) == 1:
+                await self.producer.on_response_audio_delta_event(deltas[0])
+            else:
+                response_id, item_id = key
+                await self.producer.on_response_audio_delta_event(
+                    AudioDeltaEvent(
+                        response_id,
+                        item_id,
+                        b"".join(event_audio(event) for event in deltas),
+                    )
+                )
@@ -1,13 +1,25 @@
+from collections.abc import Callable
 from typing import Any
 
 
 class EventConsumer:
-    def __init__(self, openai_session):
-        self.openai_session = openai_session
+    def __init__(self, openai_producer):
+        self.openai_producer = openai_producer
 
     async def on_audio(self, audio: str):
-        await self.openai_session.input_audio_buffer.append(audio=audio)
-        await self.openai_session.input_audio_buffer.commit()
+        await self.on_audio_append(audio)
+        await self.on_audio_commit()
 
-    async def on_response_create(self, tools: list[Any]):
-        await self.openai_session.response.create(tools=tools)
+    async def on_audio_append(self, audio: str):
+        await self.openai_producer.make_audio(audio)
+
+    async def on_audio_commit(self):
+        await self.openai_producer.make_audio_commit()
+
+    async def on_text(self, text: str):
+        await self.openai_producer.make_text(text)
+
+    async def on_response_create(
+        self, tools: list[Callable[..., Any]], modalities: list[str] | None = None
+    ):
+        await self.openai_producer.make_response_create(tools, modalities)
@@ -0,0 +1,244 @@
+from collections import OrderedDict
+from typing import Any
+
+CONVERSATION_DIFF = "conversation.diff"
+CONVERSATION_SNAPSHOT = "conversation.snapshot"
+# status of an item whose audio was cut where the user interrupted it
+TRUNCATED = "truncated"
+
+
+def item_text(item) -> str:
+    """Text or transcript of an upstream conversation item, empty if none yet."""
+    return "".join(
+        part.get("text") or part.get("transcript") or "" for part in item.content
+    )
+
+
+class ConversationItem:
+    def __init__(
+        self,
+        id: str,
+        role: str | None,
+        response_id: str | None = None,
+        status: str = "in_progress",
+    ):
+        self.id = id
+        self.role = role
+        self.response_id = response_id
+        self.status = status
+        # deltas are appended, joined only when the text is read
+        self.chunks: list[str] = []
+        self.length = 0
+
+    @property
+    def text(self) -> str:
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0] if self.chunks else ""
+
+    @text.setter
+    def text(self, text: str) -> None:
+        self.chunks = [text] if text else []
+        self.length = len(text)
+
+    def append(self, delta: str) -> int:
+        """Append delta, returns the offset it was appended at."""
+        offset = self.length
+        self.chunks.append(delta)
+        self.length += len(delta)
+        return offset
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "role": self.role,
+            "response_id": self.response_id,
+            "status": self.status,
+            "text": self.text,
+        }
+
+
+class ConversationStore:
+    """The conversation of a session by item id, kept in sync on its client with diffs.
+
+    Items are built from conversation.item.created, the transcript and text
+    deltas and their done events; response.done ends the turn. Once
+    interrupt() cut a response off, its text stops where the user interrupted
+    it. Each change is
+    sent to outbound as {"type": "conversation.diff", "data": {"version": n,
+    "op": ...}}:
+
+        item       a new item, {"item": {...}, "previous_item_id": ...}
+        text       {"id", "offset", "delta"}, delta appended at offset
+        item.done  {"id", "status"}, with the final "text" when it differs
+        item.truncated
+                   {"id", "audio_end_ms"}, the user heard the audio up to
+                   there, the item's status is "truncated" from then on
+        turn.done  {"response_id", "status"}, the response ended
+
+    snapshot() is the whole conversation at its version, a client
+    (re)connecting applies it and skips the diffs up to that version. Only
+    the last max_items are kept.
+    """
+
+    def __init__(self, outbound, max_items: int = 256):
+        self.outbound = outbound
+        self.max_items = max_items
+        self.items: OrderedDict[str, ConversationItem] = OrderedDict()
+        # response id -> its items
+        self.responses: dict[str, list[str]] = {}
+        self.interrupted_id: str | None = None
+        self.version = 0
+
+    def subscribe(self, event_consumer) -> None:
+        for event_type, handler in (
+            ("conversation.item.created", self.on_item_created),
+            ("response.output_item.added", self.on_output_item_added),
+            ("response.audio_transcript.delta", self.on_text_delta),
+            ("response.text.delta", self.on_text_delta),
+            ("response.audio_transcript.done", self.on_audio_transcript_done),
+            ("response.text.done", self.on_text_done),
+            (
+                "conversation.item.input_audio_transcription.completed",
+                self.on_input_audio_transcription_completed,
+            ),
+            ("conversation.item.truncated", self.on_item_truncated),
+            ("response.done", self.on_response_done),
+        ):
+            event_consumer.subscribe(event_type, handler)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "type": CONVERSATION_SNAPSHOT,
+            "data": {
+                "version": self.version,
+                "items": [item.to_json() for item in self.items.values()],
+            },
+        }
+
+    async def send(self, op: str, **diff: Any) -> None:
+        self.version += 1
+        await self.outbound.send_json(
+            {
+                "type": CONVERSATION_DIFF,
+                "data": {"version": self.version, "op": op, **diff},
+            }
+        )
+
+    async def add(
+        self,
+        item_id: str,
+        role: str | None,
+        response_id: str | None = None,
+        status: str = "in_progress",
+        text: str = "",
+        previous_item_id: str | None = None,
+    ) -> ConversationItem:
+        item = self.items[item_id] = ConversationItem(
+            item_id, role, response_id, status
+        )
+        item.text = text
+        if response_id is not None:
+            self.responses.setdefault(response_id, []).append(item_id)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+        await self.send("item", item=item.to_json(), previous_item_id=previous_item_id)
+        return item
+
+    async def get(
+        self, item_id: str | None, response_id: str | None = None
+    ) -> ConversationItem | None:
+        """The item of a delta, added if its creation wasn't seen."""
+        if item_id is None:
+            return None
+        item = self.items.get(item_id)
+        if item is None:
+            item = await self.add(item_id, "assistant", response_id)
+        return item
+
+    def interrupt(self, response_id: str | None) -> None:
+        """Drop the text still to come of response_id, the user talked over it."""
+        self.interrupted_id = response_id
+
+    async def on_output_item_added(self, event) -> None:
+        if event.item.id is None:
+            return
+        item = self.items.get(event.item.id)
+        if item is None:
+            await self.add(
+                event.item.id,
+                event.item.role,
+                event.response_id,
+                text=item_text(event.item),
+            )
+        elif item.response_id is None and event.response_id is not None:
+            # created before it was added, response.done ends it all the same
+            item.response_id = event.response_id
+            self.responses.setdefault(event.response_id, []).append(item.id)
+
+    async def on_item_created(self, event) -> None:
+        item = event.item
+        if item.id is None or item.id in self.items:
+            return
+        await self.add(
+            item.id,
+            item.role,
+            status=item.status or "in_progress",
+            text=item_text(item),
+            previous_item_id=event.previous_item_id,
+        )
+
+    async def on_text_delta(self, event) -> None:
+        if event.response_id is not None and event.response_id == self.interrupted_id:
+            return
+        item = await self.get(event.item_id, event.response_id)
+        if item is None:
+            return
+        offset = item.append(event.delta)
+        await self.send("text", id=item.id, offset=offset, delta=event.delta)
+
+    async def done(
+        self,
+        item_id: str,
+        text: str,
+        status: str = "completed",
+        response_id: str | None = None,
+    ) -> None:
+        item = self.items.get(item_id)
+        if item is None:
+            return
+        if response_id is not None and response_id == self.interrupted_id:
+            # the text of the interrupted response stays where it was cut off
+            text = item.text
+        if item.status != TRUNCATED:
+            item.status = status
+        diff: dict[str, Any] = {"id": item_id, "status": item.status}
+        if item.length != len(text) or item.text != text:
+            item.text = diff["text"] = text
+        await self.send("item.done", **diff)
+
+    async def on_audio_transcript_done(self, event) -> None:
+        await self.done(event.item_id, event.transcript, response_id=event.response_id)
+
+    async def on_text_done(self, event) -> None:
+        await self.done(event.item_id, event.text, response_id=event.response_id)
+
+    async def on_input_audio_transcription_completed(self, event) -> None:
+        await self.done(event.item_id, event.transcript)
+
+    async def on_item_truncated(self, event) -> None:
+        item = self.items.get(event.item_id)
+        if item is None:
+            return
+        item.status = TRUNCATED
+        await self.send("item.truncated", id=item.id, audio_end_ms=event.audio_end_ms)
+
+    async def on_response_done(self, event) -> None:
+        response = event.response
+        if response is None:
+            return
+        for item_id in self.responses.pop(response.id, []):
+            item = self.items.get(item_id)
+            if item is not None and item.status == "in_progress":
+                item.status = response.status
+        await self.send("turn.done", response_id=response.id, status=response.status)
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+AUDIO_FLUSH = "audio.flush"
+
+
+def make_audio_flush(response_id: str) -> dict[str, str]:
+    return {"type": AUDIO_FLUSH, "data": response_id}
+
+
+def decoded_size(base64_audio: str) -> int:
+    return len(base64_audio) * 3 // 4 - base64_audio[-2:].count("=")
+
+
+class InterruptibleEventProducer:
+    """Forward response events to producer until the response gets interrupted.
+
+    interrupt() drops the audio of the response in flight still pending in
+    producer and queued in outbound, tells the client to flush its playback
+    with {"type": "audio.flush"}, then cancels the response upstream and
+    truncates its audio item to what the client played. Later audio and
+    transcript deltas of that response are dropped, response.done is still
+    forwarded.
+
+    Upstream generates audio faster than it plays: once the response is
+    done, its audio item is still truncated and flushed until the next
+    response is created, as long as less was played than sent.
+    """
+
+    def __init__(
+        self, producer, outbound, openai_event_producer, bytes_per_ms: int = 48
+    ):
+        self.producer = producer
+        self.outbound = outbound
+        self.openai_event_producer = openai_event_producer
+        self.bytes_per_ms = bytes_per_ms
+        # the last response created, kept once done for its audio
+        self.response_id: str | None = None
+        self.done = False
+        self.interrupted_id: str | None = None
+        self.item_id: str | None = None
+        self.audio_bytes = 0
+        self.first_audio_at: float | None = None
+        # a delta is either forwarded before the flush or dropped
+        self.lock = asyncio.Lock()
+
+    @property
+    def in_flight(self) -> bool:
+        return (
+            self.response_id is not None
+            and self.response_id != self.interrupted_id
+            and not self.done
+        )
+
+    def sent_ms(self) -> int:
+        return int(self.audio_bytes / self.bytes_per_ms)
+
+    def played_ms(self) -> int:
+        """Audio sent to the client, up to the time elapsed since its first delta."""
+        if self.first_audio_at is None:
+            return 0
+        return int(min(self.sent_ms(), (time.monotonic() - self.first_audio_at) * 1000))
+
+    async def interrupt(self, played_ms: int | None = None) -> bool:
+        """Stop the response in flight or the playback of the last one, False if there is none."""
+        async with self.lock:
+            response_id = self.response_id
+            if response_id is None or response_id == self.interrupted_id:
+                return False
+            in_flight = not self.done
+            audio_end_ms = min(
+                self.played_ms() if played_ms is None else played_ms, self.sent_ms()
+            )
+            if not in_flight and (
+                self.item_id is None or audio_end_ms >= self.sent_ms()
+            ):
+                # done and played to its end
+                return False
+            self.interrupted_id = response_id
+            await self.producer.discard()
+            self.outbound.discard_audio()
+            await self.outbound.send_json(make_audio_flush(response_id))
+        if in_flight:
+            await self.openai_event_producer.make_response_cancel()
+        if self.item_id is not None:
+            await self.openai_event_producer.make_item_truncate(
+                self.item_id, 0, audio_end_ms
+            )
+        return True
+
+    async def on_response_created(self, event):
+        self.response_id = event.response.id
+        self.done = False
+        self.item_id = None
+        self.audio_bytes = 0
+        self.first_audio_at = None
+        await self.producer.on_response_created(event)
+
+    async def on_response_audio_delta_event(self, event):
+        async with self.lock:
+            if event.response_id == self.interrupted_id:
+                return
+            if self.first_audio_at is None:
+                self.first_audio_at = time.monotonic()
+            self.item_id = event.item_id
+            self.audio_bytes += decoded_size(event.delta)
+            await self.producer.on_response_audio_delta_event(event)
+
+    async def on_response_audio_transcript_delta_event(self, delta: str):
+        async with self.lock:
+            if self.response_id is not None and self.response_id == self.interrupted_id:
+                return
+            await self.producer.on_response_audio_transcript_delta_event(delta)
+
+    async def on_response_audio_input_transcript_done_event(self, transcript: str):
+        await self.producer.on_response_audio_input_transcript_done_event(transcript)
+
+    async def on_response_done(self, event):
+        self.done = True
+        await self.producer.on_response_done(event)
@@ -0,0 +1,170 @@
+import asyncio
+from collections import deque
+from collections.abc import Iterable
+from typing import Any
+
+from rtaoai2 import metrics
+
+# What to do when a client doesn't read fast enough and the queue is full
+BLOCK = "block"  # wait for the writer, back-pressuring the caller
+DROP_AUDIO = "drop_audio"  # drop the oldest queued audio, block on other messages
+DISCONNECT = "disconnect"  # close the client websocket
+POLICIES = (BLOCK, DROP_AUDIO, DISCONNECT)
+
+# websocket close code sent to a client disconnected for being too slow
+TRY_AGAIN_LATER = 1013
+
+
+class OutboundQueue:
+    """Bounded per-session queue drained to the client websocket by run().
+
+    It exposes the send_json/send_bytes websocket methods so it can be
+    handed to EventProducer in place of the websocket itself. Sent and
+    dropped messages are counted in metrics, the deepest the queue got is
+    observed once closed.
+    """
+
+    def __init__(self, websocket, max_size: int = 256, policy: str = DROP_AUDIO):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow client policy: {policy}")
+        self.websocket = websocket
+        self.max_size = max_size
+        self.policy = policy
+        # (is_audio, is_bytes, payload)
+        self.queue: deque[tuple[bool, bool, Any]] = deque()
+        # max_size is raised by a backlog until that many messages are written
+        self.backlog = 0
+        self.not_empty = asyncio.Event()
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+        self.closed = False
+        self.max_depth = 0
+        self.sent = 0
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
+    async def send_json(self, data: Any) -> None:
+        await self.put(data.get("type") == "audio", False, data)
+
+    async def send_text(self, data: str, is_audio: bool = False) -> None:
+        """Queue a json message already encoded."""
+        await self.put(is_audio, False, data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        # binary frames only carry response audio
+        await self.put(True, True, data)
+
+    async def put(self, is_audio: bool, is_bytes: bool, payload: Any) -> None:
+        while not self.closed and len(self.queue) - self.backlog >= self.max_size:
+            if self.policy == DISCONNECT:
+                await self.close(code=TRY_AGAIN_LATER)
+                break
+            if self.policy == DROP_AUDIO:
+                if self.drop_oldest_audio():
+                    break
+                if is_audio:
+                    self.drop()
+                    return
+            self.not_full.clear()
+            await self.not_full.wait()
+
+        if self.closed:
+            self.drop()
+            return
+        self.queue.append((is_audio, is_bytes, payload))
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.not_empty.set()
+
+    def extend(self, messages: Iterable[tuple[bool, bool, Any]]) -> None:
+        """Queue a backlog of (is_audio, is_bytes, payload) messages already accepted.
+
+        They are queued whatever max_size and the policy, and don't count
+        toward max_size while they drain.
+        """
+        messages = list(messages)
+        if self.closed:
+            self.drop(len(messages))
+            return
+        self.queue.extend(messages)
+        self.backlog += len(messages)
+        self.max_depth = max(self.max_depth, len(self.queue))
+        if self.queue:
+            self.not_empty.set()
+
+    def take_pending(self) -> list[tuple[bool, bool, Any]]:
+        """Remove and return the messages not written yet."""
+        pending = list(self.queue)
+        self.queue.clear()
+        self.backlog = 0
+        self.not_full.set()
+        return pending
+
+    def discard_audio(self) -> int:
+        """Remove the audio not written yet, returns how many messages were removed."""
+        kept = deque(item for item in self.queue if not item[0])
+        discarded = len(self.queue) - len(kept)
+        self.queue = kept
+        self.backlog = min(self.backlog, len(kept))
+        self.not_full.set()
+        return discarded
+
+    def drop_oldest_audio(self) -> bool:
+        for i, (is_audio, _, _) in enumerate(self.queue):
+            if is_audio:
+                del self.queue[i]
+                self.backlog = min(self.backlog, len(self.queue))
+                self.drop()
+                return True
+        return False
+
+    async def run(self) -> None:
+        while not self.closed:
+            if not self.queue:
+                self.not_empty.clear()
+                await self.not_empty.wait()
+                continue
+            _, is_bytes, payload = self.queue.popleft()
+            if self.backlog:
+                self.backlog -= 1
+            self.not_full.set()
+            if is_bytes:
+                await self.websocket.send_bytes(payload)
+            elif isinstance(payload, str):
+                await self.websocket.send_text(payload)
+            else:
+                await self.websocket.send_json(payload)
+            self.sent += 1
+            metrics.OUTBOUND_MESSAGES.inc("sent")
+
+    def drop(self, count: int = 1) -> None:
+        self.dropped += count
+        metrics.OUTBOUND_MESSAGES.inc("dropped", count)
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self.queue:
+            self.drop(len(self.queue))
+        self.queue.clear()
+        self.backlog = 0
+        metrics.OUTBOUND_MAX_DEPTH.observe(self.max_depth, self.policy)
+        # wake up the writer and blocked callers so they can return
+        self.not_empty.set()
+        self.not_full.set()
+        try:
+            await self.websocket.close(code=code)
+        except RuntimeError:
+            # already closed by the client
+            pass
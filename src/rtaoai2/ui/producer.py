@@ -1,7 +1,39 @@
+import base64
+import struct
+
+# binary audio frame header: response id length, response id, sequence number
+AUDIO_FRAME_SEQUENCE = struct.Struct("<I")
+
+
 def make_audio(audio: str) -> dict[str, str]:
     return {"type": "audio", "data": audio}
 
 
+def make_audio_frame(response_id: str, sequence: int, audio: bytes) -> bytes:
+    response_id_bytes = response_id.encode()
+    return b"".join(
+        (
+            bytes((len(response_id_bytes),)),
+            response_id_bytes,
+            AUDIO_FRAME_SEQUENCE.pack(sequence),
+            audio,
+        )
+    )
+
+
+def parse_audio_frame(frame: bytes) -> tuple[str, int, bytes]:
+    offset = 1 + frame[0]
+    response_id = frame[1:offset].decode()
+    (sequence,) = AUDIO_FRAME_SEQUENCE.unpack_from(frame, offset)
+    return response_id, sequence, frame[offset + AUDIO_FRAME_SEQUENCE.size :]
+
+
+def event_audio(event) -> bytes:
+    """Decoded audio of a delta event, reusing the one it caches when it has one."""
+    audio = getattr(event, "audio", None)
+    return audio if audio is not None else base64.b64decode(event.delta)
+
+
 def make_input_transcript(transcript: str) -> dict[str, str]:
     return {"type": "input_transcript", "data": transcript}
 
@@ -11,11 +43,41 @@ def make_audio_transcript(transcript: str) -> dict[str, str]:
 
 
 class EventProducer:
-    def __init__(self, websocket):
+    """Send response events to the client websocket.
+
+    With a transcoder, response audio is sent in the codec it encodes to,
+    one message per opus packet, its partial last frame before response done.
+    """
+
+    def __init__(self, websocket, binary_audio: bool = False, transcoder=None):
         self.websocket = websocket
+        self.binary_audio = binary_audio
+        self.transcoder = transcoder
+        self.audio_response_id = ""
+        self.audio_sequence = 0
+
+    async def on_response_audio_delta_event(self, event):
+        if self.transcoder is not None:
+            for packet in await self.transcoder.encode(event_audio(event)):
+                await self.send_audio(event.response_id, packet)
+            return
+        if not self.binary_audio:
+            await self.websocket.send_json(make_audio(event.delta))
+            return
+        await self.send_audio(event.response_id, event_audio(event))
 
-    async def on_response_audio_delta_event(self, delta: str):
-        await self.websocket.send_json(make_audio(delta))
+    async def send_audio(self, response_id: str, audio: bytes):
+        if not self.binary_audio:
+            await self.websocket.send_json(make_audio(base64.b64encode(audio).decode()))
+            return
+
+        if response_id != self.audio_response_id:
+            self.audio_response_id = response_id
+            self.audio_sequence = 0
+        await self.websocket.send_bytes(
+            make_audio_frame(response_id, self.audio_sequence, audio)
+        )
+        self.audio_sequence += 1
 
     async def on_response_audio_transcript_delta_event(self, delta: str):
         await self.websocket.send_json(make_audio_transcript(delta))
@@ -23,5 +85,16 @@ class EventProducer:
     async def on_response_audio_input_transcript_done_event(self, transcript: str):
         await self.websocket.send_json(make_input_transcript(transcript))
 
-    async def on_response_done(self):
+    async def on_response_created(self, event):
+        pass
+
+    async def discard(self):
+        """Drop the partial frame of the transcoder, nothing else is pending."""
+        if self.transcoder is not None:
+            self.transcoder.reset()
+
+    async def on_response_done(self, event):
+        if self.transcoder is not None:
+            for packet in await self.transcoder.flush():
+                await self.send_audio(self.audio_response_id, packet)
         await self.websocket.send_json({"type": "message", "data": "response.done"})
@@ -0,0 +1,228 @@
+import asyncio
+import secrets
+from collections import OrderedDict, deque
+from typing import Any
+
+from rtaoai2.ui.outbound import OutboundQueue
+
+
+def message_size(data: Any) -> int:
+    """About the size of data encoded to json, without encoding it."""
+    if isinstance(data, (str, bytes)):
+        return len(data) + 2
+    if isinstance(data, dict):
+        return (
+            sum(len(key) + 4 + message_size(value) for key, value in data.items()) + 2
+        )
+    if isinstance(data, (list, tuple)):
+        return sum(message_size(value) + 1 for value in data) + 2
+    return 8
+
+
+class ResumableOutbound:
+    """Client messages of a session that outlives its websocket.
+
+    Messages go to the attached OutboundQueue. While detached they are kept
+    in a ring bounded to max_bytes, dropping the oldest first, and replayed
+    in order once a client attaches again, past the bound of its queue as
+    they were already accepted. It exposes send_json/send_text/send_bytes
+    like OutboundQueue.
+    """
+
+    def __init__(self, max_bytes: int = 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.outbound: OutboundQueue | None = None
+        # (is_audio, is_bytes, payload, size)
+        self.ring: deque[tuple[bool, bool, Any, int]] = deque()
+        self.ring_bytes = 0
+        self.dropped = 0
+
+    @property
+    def attached(self) -> bool:
+        return self.outbound is not None
+
+    @property
+    def depth(self) -> int:
+        """Messages queued for the attached client or kept for the next one."""
+        return len(self.ring) + (
+            self.outbound.depth if self.outbound is not None else 0
+        )
+
+    async def send_json(self, data: Any) -> None:
+        if self.outbound is not None:
+            await self.outbound.send_json(data)
+        else:
+            self.keep(data.get("type") == "audio", False, data)
+
+    async def send_text(self, data: str, is_audio: bool = False) -> None:
+        if self.outbound is not None:
+            await self.outbound.send_text(data, is_audio)
+        else:
+            self.keep(is_audio, False, data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        if self.outbound is not None:
+            await self.outbound.send_bytes(data)
+        else:
+            self.keep(True, True, data)
+
+    def keep(self, is_audio: bool, is_bytes: bool, payload: Any) -> None:
+        size = len(payload) if is_bytes else message_size(payload)
+        self.ring.append((is_audio, is_bytes, payload, size))
+        self.ring_bytes += size
+        while self.ring_bytes > self.max_bytes:
+            self.ring_bytes -= self.ring.popleft()[3]
+            self.dropped += 1
+
+    def discard_audio(self) -> int:
+        discarded = self.outbound.discard_audio() if self.outbound is not None else 0
+        kept = deque(item for item in self.ring if not item[0])
+        discarded += len(self.ring) - len(kept)
+        self.ring = kept
+        self.ring_bytes = sum(item[3] for item in kept)
+        return discarded
+
+    def attach(self, outbound: OutboundQueue) -> None:
+        outbound.extend(message[:3] for message in self.ring)
+        self.ring.clear()
+        self.ring_bytes = 0
+        self.outbound = outbound
+
+    def detach(self) -> None:
+        if self.outbound is None:
+            return
+        # messages queued but not written to the lost websocket
+        for is_audio, is_bytes, payload in self.outbound.take_pending():
+            self.keep(is_audio, is_bytes, payload)
+        self.outbound = None
+
+
+class SessionLimitError(Exception):
+    pass
+
+
+class SessionRegistry:
+    """Client sessions of the worker by resume token, parked while their client is away.
+
+    Sessions need a close() coroutine and a buffered_bytes property. A parked
+    session is closed when nobody resumed it within grace seconds, or
+    earlier, oldest parked first, when more than max_parked sessions or
+    max_parked_bytes of buffered messages are parked.
+
+    At most max_sessions are open, 0 for no limit. New sessions first make
+    room by closing parked ones, then wait up to admission_timeout seconds
+    for a session to close before being rejected.
+    """
+
+    def __init__(
+        self,
+        grace: float = 30,
+        max_parked: int = 100,
+        max_parked_bytes: int = 64 * 1024 * 1024,
+        max_sessions: int = 0,
+        admission_timeout: float = 0,
+    ):
+        self.grace = grace
+        self.max_parked = max_parked
+        self.max_parked_bytes = max_parked_bytes
+        self.max_sessions = max_sessions
+        self.admission_timeout = admission_timeout
+        # None while reserved and not registered yet
+        self.sessions: dict[str, Any | None] = {}
+        # token -> eviction timer, oldest parked first
+        self.parked: OrderedDict[str, asyncio.TimerHandle] = OrderedDict()
+        # evictions started by a timer, until they are done
+        self.evictions: set[asyncio.Task] = set()
+        self.released = asyncio.Event()
+        self.waiting = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    def counts(self) -> dict[str, int]:
+        return {
+            "attached": len(self.sessions) - len(self.parked),
+            "parked": len(self.parked),
+            "waiting": self.waiting,
+        }
+
+    async def reserve(self) -> str:
+        """Token of a new session slot, SessionLimitError when none got free in time."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.admission_timeout
+        while self.max_sessions and len(self.sessions) >= self.max_sessions:
+            if self.parked:
+                await self.evict(next(iter(self.parked)))
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.rejected += 1
+                raise SessionLimitError(f"{len(self.sessions)} sessions open")
+            self.released.clear()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.released.wait(), remaining)
+            except TimeoutError:
+                pass
+            finally:
+                self.waiting -= 1
+        token = secrets.token_urlsafe(16)
+        self.sessions[token] = None
+        return token
+
+    def register(self, session: Any, token: str | None = None) -> str:
+        if token is None:
+            token = secrets.token_urlsafe(16)
+        self.sessions[token] = session
+        return token
+
+    def resume(self, token: str) -> Any | None:
+        """The parked session of token, None if unknown, expired or attached."""
+        timer = self.parked.pop(token, None)
+        if timer is None:
+            return None
+        timer.cancel()
+        return self.sessions[token]
+
+    def parked_bytes(self) -> int:
+        return sum(
+            session.buffered_bytes
+            for session in map(self.sessions.get, self.parked)
+            if session is not None
+        )
+
+    async def park(self, token: str) -> None:
+        if token not in self.sessions:
+            return
+        if self.grace <= 0:
+            await self.remove(token)
+            return
+        loop = asyncio.get_running_loop()
+        self.parked[token] = loop.call_later(self.grace, self.on_grace_elapsed, token)
+        while self.parked and (
+            len(self.parked) > self.max_parked
+            or self.parked_bytes() > self.max_parked_bytes
+        ):
+            await self.evict(next(iter(self.parked)))
+
+    def on_grace_elapsed(self, token: str) -> None:
+        task = asyncio.ensure_future(self.evict(token))
+        self.evictions.add(task)
+        task.add_done_callback(self.evictions.discard)
+
+    async def evict(self, token: str) -> None:
+        if token in self.parked:
+            self.evicted += 1
+            await self.remove(token)
+
+    async def remove(self, token: str) -> None:
+        timer = self.parked.pop(token, None)
+        if timer is not None:
+            timer.cancel()
+        session = self.sessions.pop(token, None)
+        self.released.set()
+        if session is not None:
+            await session.close()
+
+    async def close(self) -> None:
+        for token in list(self.sessions):
+            await self.remove(token)
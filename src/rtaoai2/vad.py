@@ -0,0 +1,103 @@
+from collections import deque
+
+import numpy as np
+
+from rtaoai2.audio import SAMPLE_RATE
+
+
+def frame_features(pcm: bytes, frame_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """Energy in dBFS and zero-crossing rate of each complete frame of pcm16."""
+    n = len(pcm) // (2 * frame_size)
+    samples = np.frombuffer(pcm, dtype="<i2", count=n * frame_size)
+    frames = samples.reshape(n, frame_size).astype(np.float32) / 32768
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy = 20 * np.log10(rms + 1e-10)
+    crossings = np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1])
+    return energy, np.mean(crossings, axis=1)
+
+
+class VoiceActivityDetector:
+    """Streaming energy and zero-crossing voice activity detection on 24kHz pcm16.
+
+    A frame is voiced above threshold_db unless its zero-crossing rate is
+    above max_zcr, like hiss; frames louder than loud_db are voiced anyway
+    so fricatives are kept. Speech starts after start_ms of voiced frames,
+    and is kept with pre_roll_ms of audio before it. It ends after
+    hangover_ms of silence, which is trimmed.
+    """
+
+    def __init__(
+        self,
+        frame_ms: int = 20,
+        threshold_db: float = -45,
+        max_zcr: float = 0.25,
+        loud_db: float = -25,
+        start_ms: int = 60,
+        hangover_ms: int = 500,
+        pre_roll_ms: int = 200,
+    ):
+        self.frame_size = SAMPLE_RATE * frame_ms // 1000
+        self.frame_bytes = self.frame_size * 2
+        self.threshold_db = threshold_db
+        self.max_zcr = max_zcr
+        self.loud_db = loud_db
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.reset()
+
+    def reset(self) -> None:
+        # partial frame left from the previous chunk
+        self.pending = b""
+        self.speaking = False
+        self.voiced_run = 0
+        self.pre_roll: deque[bytes] = deque(
+            maxlen=self.pre_roll_frames + self.start_frames
+        )
+        # silent frames since the last voiced one
+        self.trailing: list[bytes] = []
+
+    def voiced(self, pcm: bytes) -> np.ndarray:
+        energy, zcr = frame_features(pcm, self.frame_size)
+        return (energy > self.threshold_db) & (
+            (zcr < self.max_zcr) | (energy > self.loud_db)
+        )
+
+    def feed(self, pcm: bytes) -> tuple[bytes, bool]:
+        """Speech audio to append, and whether the speech just ended.
+
+        Audio after an end of speech is kept for the next call.
+        """
+        pcm = self.pending + pcm
+        speech: list[bytes] = []
+        for i, voiced in enumerate(self.voiced(pcm)):
+            frame = pcm[i * self.frame_bytes : (i + 1) * self.frame_bytes]
+            if not self.speaking:
+                self.pre_roll.append(frame)
+                self.voiced_run = self.voiced_run + 1 if voiced else 0
+                if self.voiced_run >= self.start_frames:
+                    self.speaking = True
+                    speech.extend(self.pre_roll)
+                    self.pre_roll.clear()
+            elif voiced:
+                speech.extend(self.trailing)
+                speech.append(frame)
+                self.trailing.clear()
+            else:
+                self.trailing.append(frame)
+                if len(self.trailing) >= self.hangover_frames:
+                    self.pending = pcm[(i + 1) * self.frame_bytes :]
+                    self.speaking = False
+                    self.voiced_run = 0
+                    self.trailing.clear()
+                    return b"".join(speech), True
+        self.pending = pcm[len(pcm) - len(pcm) % self.frame_bytes :]
+        return b"".join(speech), False
+
+    def trim(self, pcm: bytes) -> bytes:
+        """Whole utterance without its leading and trailing silence, empty if silent."""
+        voiced = np.flatnonzero(self.voiced(pcm))
+        if len(voiced) == 0:
+            return b""
+        start = max(0, voiced[0] - self.pre_roll_frames)
+        return pcm[start * self.frame_bytes : (voiced[-1] + 1) * self.frame_bytes]
@@ -0,0 +1,97 @@
+"""Regenerate the vad corpus: 16kHz wav files and the speech segments they hold.
+
+uv run python tests/rtaoai/fixtures/vad/generate.py
+"""
+
+import json
+import os
+import wave
+
+import numpy as np
+
+RATE = 16000
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def quiet(seconds, rng):
+    # room noise around -65 dBFS
+    return rng.normal(0, 18, int(seconds * RATE))
+
+
+def hiss(seconds, rng):
+    # white noise around -35 dBFS
+    return rng.normal(0, 580, int(seconds * RATE))
+
+
+def vowel(seconds, rng):
+    """Harmonics of a 150Hz voice shaped by three formants, with a syllable rate envelope."""
+    t = np.arange(int(seconds * RATE)) / RATE
+    f0 = 150 * (1 + 0.03 * np.sin(2 * np.pi * 3 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / RATE
+    signal = np.zeros_like(t)
+    for harmonic in range(1, 30):
+        frequency = 150 * harmonic
+        gain = sum(np.exp(-(((frequency - f) / 150) ** 2)) for f in (700, 1200, 2600))
+        signal += (gain + 0.05) * np.sin(harmonic * phase)
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t) ** 2
+    signal *= envelope * 4000 / np.max(np.abs(signal))
+    return signal + quiet(seconds, rng)
+
+
+CORPUS = {
+    "vowel.wav": [(quiet, 0.5), (vowel, 1.0), (quiet, 1.0)],
+    "two_words.wav": [
+        (quiet, 0.3),
+        (vowel, 0.4),
+        (quiet, 0.25),
+        (vowel, 0.5),
+        (quiet, 1.0),
+    ],
+    "two_turns.wav": [
+        (quiet, 0.3),
+        (vowel, 0.5),
+        (quiet, 1.0),
+        (vowel, 0.5),
+        (quiet, 0.8),
+    ],
+    "hiss.wav": [(hiss, 2.0)],
+    "silence.wav": [(quiet, 1.5)],
+}
+
+# pauses shorter than the detector hangover don't end the speech
+PAUSE = 0.5
+
+
+def main():
+    rng = np.random.default_rng(0)
+    manifest = {}
+    for name, parts in CORPUS.items():
+        samples = []
+        segments: list[list[int]] = []
+        at = 0.0
+        for generate, seconds in parts:
+            samples.append(generate(seconds, rng))
+            if generate is vowel:
+                start, end = round(at * 1000), round((at + seconds) * 1000)
+                if segments and start - segments[-1][1] < PAUSE * 1000:
+                    segments[-1][1] = end
+                else:
+                    segments.append([start, end])
+            at += seconds
+        pcm = np.clip(np.concatenate(samples), -32768, 32767).astype("<i2").tobytes()
+        with wave.open(os.path.join(HERE, name), "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(RATE)
+            f.writeframes(pcm)
+        manifest[name] = segments
+    with open(os.path.join(HERE, "corpus.json"), "w") as f:
+        lines = [
+            f"  {json.dumps(name)}: {json.dumps(segments)}"
+            for name, segments in manifest.items()
+        ]
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
+
+
+if __name__ == "__main__":
+    main()
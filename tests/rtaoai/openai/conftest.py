@@ -1,19 +1,26 @@
-import os
-import pathlib
-import json
-
 import pytest
 
+from rtaoai2.openai.recorder import read_recording
+from rtaoai2.openai.replay import convert_dumps
+
+
+@pytest.fixture(scope="session")
+def recording(tmp_path_factory):
+    """Prefix of the dumps/ session written as a recording."""
+    prefix = str(tmp_path_factory.mktemp("recording") / "session")
+    convert_dumps("dumps", prefix)
+    return prefix
+
+
+@pytest.fixture(scope="session")
+def recorded_events(recording):
+    return [record.event for record in read_recording(recording)]
+
 
 @pytest.fixture
-def events_json():
+def events_json(recorded_events):
     def _events_json(event):
-        events_json = []
-        for file in os.listdir("dumps"):
-            if event == "." or event in file:
-                with open(pathlib.Path.cwd().resolve() / "dumps" / file) as f:
-                    events_json.append((file, json.load(fp=f)))
-        events_json = sorted(events_json, key=lambda k: k[0])  # sorted by name so time
-        return [e[1] for e in events_json]
+        # in time order, like the dumps/ file names
+        return [e for e in recorded_events if event == "." or event in e["type"]]
 
     return _events_json
@@ -0,0 +1,36 @@
+from rtaoai2.openai.buffer import TranscriptBuffer
+
+
+def test_transcript_buffer_drain():
+    buffer = TranscriptBuffer()
+    assert buffer.append("Hello")
+    assert buffer.append(" wörld")
+    assert len(buffer) == 12
+    assert buffer.peek() == "Hello wörld"
+    assert buffer.drain() == "Hello wörld"
+    assert len(buffer) == 0
+    assert not buffer.expired()
+
+
+def test_transcript_buffer_max_bytes():
+    buffer = TranscriptBuffer(max_bytes=8)
+    assert buffer.append("Hello")
+    assert not buffer.append(" world")
+    assert buffer.peek() == "Hello"
+
+
+def test_transcript_buffer_expired():
+    buffer = TranscriptBuffer(timeout=0)
+    assert not buffer.expired()
+    buffer.append("Hello")
+    assert buffer.expired()
+
+
+def test_transcript_buffer_bytes_per_buffer():
+    buffer = TranscriptBuffer()
+    other = TranscriptBuffer()
+    buffer.append("Hello")
+    other.append("é")
+    assert (len(buffer), len(other)) == (5, 2)
+    buffer.drain()
+    assert (len(buffer), len(other)) == (0, 2)
@@ -2,12 +2,15 @@ from typing import Any
 
 import pytest
 
+from rtaoai2.openai import consumer as consumer_module
 from rtaoai2.openai.consumer import (
     OpenAIEventConsumer,
     UnknownEventError,
     OpenAIStreamingEventConsumer,
     OpenAIWaitInputTranscriptEventConsumer,
+    peek_event_type,
 )
+from rtaoai2.openai.buffer import TranscriptBuffer
 from rtaoai2.openai.events import ResponseAudioDeltaEvent
 
 
@@ -26,6 +29,42 @@ def test_process_unhandled_event():
         OpenAIEventConsumer().process_event({"type": "unknown_event"})
 
 
+def test_peek_event_type():
+    assert (
+        peek_event_type(b'{"type":"response.audio.delta","delta":"AAAA"}')
+        == "response.audio.delta"
+    )
+    assert peek_event_type(b' {\n  "type" : "response.done"}') == "response.done"
+    # type is not the first key, the whole message is parsed
+    assert peek_event_type(b'{"event_id": "e", "type": "error"}') == "error"
+    assert peek_event_type(b'{"event_id": "e"}') is None
+
+
+@pytest.mark.asyncio
+async def test_dispatch_raw_skips_unsubscribed_types(monkeypatch):
+    decoded = []
+
+    def decode_event(raw):
+        decoded.append(raw)
+        return original(raw)
+
+    original = consumer_module.decode_event
+    monkeypatch.setattr(consumer_module, "decode_event", decode_event)
+    received = []
+
+    async def handler(event):
+        received.append(event)
+
+    event_consumer = OpenAIEventConsumer()
+    event_consumer.subscribe("response.audio.delta", handler)
+    # not even valid json past the type, it is never parsed
+    await event_consumer.dispatch(b'{"type":"rate_limits.updated","rate_limits":[')
+    await event_consumer.dispatch('{"type":"response.audio.delta","delta":"AAAA"}')
+    assert len(decoded) == 1
+    assert isinstance(received[0], ResponseAudioDeltaEvent)
+    assert received[0].delta == "AAAA"
+
+
 class TranscriptQueueSpy:
     def __init__(self) -> None:
         self.events: list[tuple[str, str | None]] = []
@@ -64,6 +103,45 @@ async def test_flush_transcript_queue_before_done() -> None:
     assert consumer.response_audio_transcript_queue == ""
 
 
+@pytest.mark.asyncio
+async def test_release_transcript_buffer_when_full() -> None:
+    spy = TranscriptQueueSpy()
+    consumer = OpenAIWaitInputTranscriptEventConsumer(
+        event_consumer=OpenAIEventConsumer(),
+        response_producer=spy,
+        transcript_buffer=TranscriptBuffer(max_bytes=8),
+    )
+    for delta in ("Hello", " world", "!"):
+        await consumer.on_event(
+            {"type": "response.audio_transcript.delta", "delta": delta}
+        )
+
+    assert spy.events == [
+        ("transcript", "Hello"),
+        ("transcript", " world"),
+        ("transcript", "!"),
+    ]
+    assert consumer.buffered_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_release_transcript_buffer_on_timeout() -> None:
+    spy = TranscriptQueueSpy()
+    consumer = OpenAIWaitInputTranscriptEventConsumer(
+        event_consumer=OpenAIEventConsumer(),
+        response_producer=spy,
+        transcript_buffer=TranscriptBuffer(timeout=0),
+    )
+    await consumer.on_event(
+        {"type": "response.audio_transcript.delta", "delta": "Hello"}
+    )
+    assert consumer.buffered_bytes == 5
+    await consumer.on_event({"type": "response.audio.delta", "delta": "AAE="})
+
+    assert spy.events == [("transcript", "Hello")]
+    assert not consumer.waiting_input_transcript
+
+
 create_response = "crate_response"
 play_audio = "play_audio"
 write_input_transcript = "write_input_transcript"
@@ -307,3 +385,16 @@ async def test_response_producer_console(
     for e in events_json(".")[48:]:
         await events_consumer.on_event(e)
     assert response_producer_spy.events == expected_events
+
+
+@pytest.mark.asyncio
+async def test_empty_transcript_deltas_are_not_forwarded() -> None:
+    spy = TranscriptQueueSpy()
+    consumer = OpenAIStreamingEventConsumer(
+        event_consumer=OpenAIEventConsumer(), response_producer=spy
+    )
+    for delta in ("", "Hello", ""):
+        await consumer.on_raw_event(
+            f'{{"type": "response.audio_transcript.delta", "delta": "{delta}"}}'
+        )
+    assert spy.events == [("transcript", "Hello")]
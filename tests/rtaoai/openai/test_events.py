@@ -1,14 +1,69 @@
+import json
+
 import pytest
+from pydantic import ValidationError
 
 from rtaoai2.openai.events import (
+    EVENTS,
     Event,
+    ResponseAudioDeltaEvent,
+    decode_event,
 )
+from rtaoai2.ui.producer import event_audio
+
+
+# events of the models the dumps/ session has none of
+SAMPLES = {
+    "conversation.item.truncated": {
+        "type": "conversation.item.truncated",
+        "item_id": "item_1",
+        "content_index": 0,
+        "audio_end_ms": 1500,
+    },
+    "response.text.delta": {
+        "type": "response.text.delta",
+        "response_id": "resp_1",
+        "item_id": "item_1",
+        "delta": "Hel",
+    },
+    "response.text.done": {
+        "type": "response.text.done",
+        "response_id": "resp_1",
+        "item_id": "item_1",
+        "text": "Hello",
+    },
+}
 
 
 @pytest.mark.parametrize(
     "event,cls", [(cls.name, cls) for cls in Event.__subclasses__()]
 )
 def test_respose_audio_delta_event(event, cls, events_json):
-    events_json = events_json(event)
-    for j in events_json:
-        assert cls.model_validate(j)
+    samples = [j for j in events_json(event) if j["type"] == event]
+    if event in SAMPLES:
+        samples.append(SAMPLES[event])
+    # every model is checked against at least one event
+    assert samples
+    for j in samples:
+        assert isinstance(cls.model_validate(j), cls)
+
+
+def test_decode_event_picks_model_from_type(events_json):
+    for j in events_json("."):
+        if j["type"] in EVENTS:
+            event = decode_event(json.dumps(j).encode())
+            assert isinstance(event, EVENTS[j["type"]])
+
+
+def test_decode_unknown_event():
+    with pytest.raises(ValidationError):
+        decode_event(b'{"type": "unknown_event"}')
+
+
+def test_audio_delta_decoded_lazily():
+    event = decode_event(b'{"type": "response.audio.delta", "delta": "AAE="}')
+    assert isinstance(event, ResponseAudioDeltaEvent)
+    assert "audio" not in event.__dict__
+    # decoded once, what producers read afterwards is the cached audio
+    assert event_audio(event) == b"\x00\x01"
+    assert event_audio(event) is event.__dict__["audio"]
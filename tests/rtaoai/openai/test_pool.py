@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+
+import pytest
+import pytest_asyncio
+import websockets
+from openai import AsyncOpenAI
+
+from rtaoai2.openai.pool import RealtimeSessionPool
+
+
+class StandInRealtimeServer:
+    def __init__(self, expires_in: float = 900):
+        self.expires_in = expires_in
+        self.connections = 0
+        self.session_updates = []
+
+    async def handler(self, websocket):
+        self.connections += 1
+        async for message in websocket:
+            event = json.loads(message)
+            if event["type"] == "session.update":
+                self.session_updates.append(event["session"])
+                session = {
+                    **event["session"],
+                    "expires_at": time.time() + self.expires_in,
+                }
+                await websocket.send(
+                    json.dumps({"type": "session.updated", "session": session})
+                )
+
+
+@pytest_asyncio.fixture
+async def stand_in():
+    server = StandInRealtimeServer()
+    async with websockets.serve(server.handler, "127.0.0.1", 0) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        client = AsyncOpenAI(
+            api_key="key", websocket_base_url=f"ws://127.0.0.1:{port}/v1"
+        )
+        yield server, client
+
+
+async def wait_for_ready(pool: RealtimeSessionPool, n: int) -> None:
+    while len(pool.ready) < n:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_pool_prewarms_configured_sessions(stand_in):
+    server, client = stand_in
+    pool = RealtimeSessionPool(client, model="model", session={"tools": []}, size=2)
+    pool.start()
+    await asyncio.wait_for(wait_for_ready(pool, 2), 5)
+    assert server.connections == 2
+    assert server.session_updates == [{"tools": []}, {"tools": []}]
+
+    session = await pool.acquire()
+    assert session.session["tools"] == []
+    assert session.expires_in() > 800
+    # the pool refills in the background
+    await asyncio.wait_for(wait_for_ready(pool, 2), 5)
+    assert server.connections == 3
+
+    await session.close()
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_skips_expiring_sessions(stand_in):
+    server, client = stand_in
+    server.expires_in = 30
+    pool = RealtimeSessionPool(
+        client, model="model", session={}, size=0, min_lifetime=60
+    )
+    pool.ready.append(await pool.connect())
+
+    session = await pool.acquire()
+    # the expiring pooled session was closed and a new one connected
+    assert server.connections == 2
+    await session.close()
+
+
+@pytest.mark.asyncio
+async def test_session_sends_raw_events(stand_in):
+    server, client = stand_in
+    tool = {
+        "type": "function",
+        "name": "list_all_products",
+        "description": "List all available products.",
+        "parameters": {"type": "object", "properties": {}, "required": []},
+    }
+    pool = RealtimeSessionPool(client, model="model", session={"tools": [tool]}, size=0)
+    session = await pool.connect()
+    assert server.session_updates == [{"tools": [tool]}]
+
+    await session.send(json.dumps({"type": "session.update", "session": {"tools": []}}))
+    assert json.loads(await session.connection.recv_bytes())["session"]["tools"] == []
+    await session.close()
@@ -1,13 +1,20 @@
 from typing import Any
 import json
+import asyncio
 
 import pytest
 
+from rtaoai2.openai.events import RateLimit
+from rtaoai2.openai.ratelimit import RateLimitScheduler
 from rtaoai2.openai.producer import (
     OpenAIEventProducer,
+    ToolRegistry,
     make_audio,
+    make_audio_format_update,
     make_audio_commit,
+    make_modalities_update,
     make_response_create,
+    make_text,
     make_session_update,
 )
 
@@ -102,3 +109,102 @@ async def test_openai_event_producer():
         ("send", json.dumps(make_audio_commit())),
         ("send", json.dumps(make_response_create(tools=[]))),
     ]
+
+
+def test_tool_registry():
+    def calculate_sum(a: float, b: float) -> float:
+        """Calculates the sum of two numbers."""
+        return a + b
+
+    def list_all_products(limit: int | None = None) -> list[int]:
+        """List all available products."""
+        return []
+
+    registry = ToolRegistry([calculate_sum, list_all_products])
+    assert (
+        registry.schemas
+        == make_session_update([calculate_sum, list_all_products])["session"]["tools"]
+    )
+    assert registry.schemas[1]["parameters"] == {
+        "type": "object",
+        "properties": {"limit": {"type": "integer"}},
+        "required": [],
+    }
+
+    # the session tools are not sent again
+    assert (
+        registry.encode_response_create([calculate_sum, list_all_products])
+        == '{"type": "response.create"}'
+    )
+    encoded = registry.encode_response_create([calculate_sum])
+    assert json.loads(encoded) == make_response_create([calculate_sum])
+    assert registry.encode_response_create([calculate_sum]) is encoded
+
+    # text only responses
+    assert json.loads(
+        registry.encode_response_create([calculate_sum, list_all_products], ["text"])
+    ) == {
+        "type": "response.create",
+        "response": {"modalities": ["text"]},
+    }
+    assert json.loads(
+        registry.encode_response_create([calculate_sum], ["text"])
+    ) == make_response_create([calculate_sum], ["text"])
+
+
+@pytest.mark.asyncio
+async def test_openai_event_producer_with_registry():
+    def calculate_sum(a: float, b: float) -> float:
+        """Calculates the sum of two numbers."""
+        return a + b
+
+    spy = WebSocketSpy()
+    openai_event_producer = OpenAIEventProducer(
+        spy, tool_registry=ToolRegistry([calculate_sum])
+    )
+    await openai_event_producer.make_response_create(tools=[calculate_sum])
+    await openai_event_producer.make_response_create(tools=[])
+    assert spy.calls == [
+        ("send", '{"type": "response.create"}'),
+        ("send", json.dumps(make_response_create(tools=[]))),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_openai_event_producer_waits_for_rate_limits():
+    scheduler = RateLimitScheduler()
+    scheduler.update(
+        [RateLimit(name="requests", limit=10, remaining=0, reset_seconds=60)]
+    )
+    spy = WebSocketSpy()
+    openai_event_producer = OpenAIEventProducer(spy, scheduler=scheduler)
+    task = asyncio.create_task(openai_event_producer.make_response_create(tools=[]))
+    await asyncio.sleep(0)
+    assert spy.calls == []
+    scheduler.update(
+        [RateLimit(name="requests", limit=10, remaining=5, reset_seconds=60)]
+    )
+    await task
+    assert spy.calls == [("send", json.dumps(make_response_create(tools=[])))]
+
+
+def test_producer_make_text():
+    assert make_text("Hello!") == {
+        "type": "conversation.item.create",
+        "item": {
+            "type": "message",
+            "role": "user",
+            "content": [{"type": "input_text", "text": "Hello!"}],
+        },
+    }
+    assert make_modalities_update(["text"]) == {
+        "type": "session.update",
+        "session": {"modalities": ["text"]},
+    }
+
+
+def test_producer_make_audio_format_update():
+    assert make_audio_format_update("g711_ulaw", "pcm16") == {
+        "type": "session.update",
+        "session": {"input_audio_format": "g711_ulaw", "output_audio_format": "pcm16"},
+    }
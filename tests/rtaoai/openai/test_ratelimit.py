@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from rtaoai2.metrics import Histogram
+from rtaoai2.openai.events import RateLimit
+from rtaoai2.openai.ratelimit import RateLimitScheduler
+
+
+def requests(remaining: int, reset_seconds: float, limit: int = 2) -> list[RateLimit]:
+    return [
+        RateLimit(
+            name="requests",
+            limit=limit,
+            remaining=remaining,
+            reset_seconds=reset_seconds,
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_without_limits():
+    histogram = Histogram("queue_seconds", "Queue.", "limit")
+    scheduler = RateLimitScheduler(histogram=histogram)
+    await scheduler.acquire("a")
+    await scheduler.acquire("a")
+    assert histogram.count("none") == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_serves_sessions_round_robin():
+    histogram = Histogram("queue_seconds", "Queue.", "limit")
+    scheduler = RateLimitScheduler(histogram=histogram)
+    scheduler.update(requests(remaining=0, reset_seconds=0.05))
+    served = []
+
+    async def respond(session, i):
+        await scheduler.acquire(session)
+        served.append(f"{session}{i}")
+
+    tasks = [
+        asyncio.create_task(respond("a", 1)),
+        asyncio.create_task(respond("a", 2)),
+        asyncio.create_task(respond("b", 1)),
+    ]
+    await asyncio.sleep(0.01)
+    assert served == [] and scheduler.waiting == 3
+
+    # refilled to 2 requests at reset, the third waits for the next update
+    await asyncio.sleep(0.08)
+    assert served == ["a1", "b1"]
+    scheduler.update(requests(remaining=2, reset_seconds=1))
+    await asyncio.gather(*tasks)
+    assert served == ["a1", "b1", "a2"]
+    assert histogram.count("requests") == 3
+
+
+@pytest.mark.asyncio
+async def test_scheduler_keeps_reserve_and_skips_cancelled():
+    scheduler = RateLimitScheduler(reserve={"tokens": 100}, cost={"requests": 1})
+    scheduler.update(
+        [
+            *requests(remaining=10, reset_seconds=60, limit=10),
+            RateLimit(name="tokens", limit=1000, remaining=50, reset_seconds=60),
+        ]
+    )
+    cancelled = asyncio.create_task(scheduler.acquire("a"))
+    waiting = asyncio.create_task(scheduler.acquire("b"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    scheduler.update(
+        [RateLimit(name="tokens", limit=1000, remaining=500, reset_seconds=60)]
+    )
+    await waiting
+    assert scheduler.waiting == 0
+    # only the response that was sent took a request
+    assert scheduler.limits["requests"][1] == 9
@@ -0,0 +1,99 @@
+import base64
+import json
+import os
+import pathlib
+
+import pytest
+
+from rtaoai2.metrics import CLIENT, SERVER
+from rtaoai2.openai.recorder import SessionRecorder, part_paths, read_recording
+from rtaoai2.openai.replay import load_recording
+
+
+def audio_delta(pcm: bytes) -> str:
+    return json.dumps(
+        {"type": "response.audio.delta", "delta": base64.b64encode(pcm).decode()}
+    )
+
+
+@pytest.mark.asyncio
+async def test_recorder_round_trip(tmp_path):
+    prefix = str(tmp_path / "session")
+    recorder = SessionRecorder(prefix, flush_interval=0.01)
+    recorder.start()
+    append = {
+        "type": "input_audio_buffer.append",
+        "audio": base64.b64encode(b"\x01\x02").decode(),
+    }
+    recorder.client(json.dumps(append))
+    recorder.server(audio_delta(b"\x03\x04\x05\x06").encode())
+    recorder.server(b'{"type":"response.done"}')
+    await recorder.close()
+
+    records = list(read_recording(prefix))
+    assert [(r.emitter, r.event) for r in records] == [
+        (CLIENT, append),
+        (SERVER, json.loads(audio_delta(b"\x03\x04\x05\x06"))),
+        (SERVER, {"type": "response.done"}),
+    ]
+    assert records[0].time <= records[1].time <= records[2].time
+    _, audio_path = part_paths(prefix, 0)
+    assert pathlib.Path(audio_path).read_bytes() == b"\x01\x02\x03\x04\x05\x06"
+
+
+def test_recorder_rotates_by_size(tmp_path):
+    prefix = str(tmp_path / "session")
+    recorder = SessionRecorder(prefix, max_bytes=1)
+    for i in range(3):
+        recorder.write([(i, SERVER, audio_delta(bytes([i]) * 10))])
+    assert sorted(os.listdir(tmp_path)) == [
+        "session.0000.jsonl.gz",
+        "session.0000.pcm",
+        "session.0001.jsonl.gz",
+        "session.0001.pcm",
+        "session.0002.jsonl.gz",
+        "session.0002.pcm",
+    ]
+    deltas = [base64.b64decode(r.event["delta"]) for r in read_recording(prefix)]
+    assert deltas == [bytes([i]) * 10 for i in range(3)]
+
+
+def test_recorder_rotates_by_audio_size(tmp_path):
+    prefix = str(tmp_path / "session")
+    # the compressed events stay far below max_bytes, the audio doesn't
+    recorder = SessionRecorder(prefix, max_bytes=1000)
+    for i in range(2):
+        recorder.write([(i, SERVER, audio_delta(bytes([i]) * 1000))])
+    assert os.path.exists(part_paths(prefix, 1)[1])
+
+
+@pytest.mark.asyncio
+async def test_recorder_drops_invalid_events(tmp_path):
+    recorder = SessionRecorder(str(tmp_path / "session"), flush_interval=0.01)
+    recorder.start()
+    for raw in (b"not json", b"[1]", b'{"type":"response.done"}'):
+        recorder.server(raw)
+    await recorder.close()
+    assert recorder.dropped == 2
+    assert [r.event for r in read_recording(recorder.prefix)] == [
+        {"type": "response.done"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_recorder_drops_beyond_max_pending(tmp_path):
+    recorder = SessionRecorder(str(tmp_path / "session"), max_pending=2)
+    for _ in range(3):
+        recorder.server(b'{"type":"response.done"}')
+    await recorder.close()
+    assert recorder.dropped == 1
+    assert len(list(read_recording(recorder.prefix))) == 2
+
+
+def test_recorded_dumps(recording, recorded_events):
+    # trimmed payloads are not base64, they stay inline
+    assert len(recorded_events) == len(os.listdir("dumps"))
+    assert any("[trimmed:" in str(e.get("delta")) for e in recorded_events)
+    # and are replayed like dumps/, repeated events as many times
+    assert load_recording(recording) == load_recording("dumps")
+    assert any(e.repeat > 1 for e in load_recording(recording))
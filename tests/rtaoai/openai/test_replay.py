@@ -0,0 +1,67 @@
+import base64
+import json
+
+import pytest
+import websockets
+from openai import AsyncOpenAI
+
+from rtaoai2.openai.pool import RealtimeSessionPool
+from rtaoai2.openai.replay import ReplayServer, load_recording
+
+
+@pytest.fixture
+def recording():
+    return load_recording("dumps")
+
+
+def test_load_recording_synthesizes_audio(recording):
+    deltas = [e.event["delta"] for e in recording if e.type == "response.audio.delta"]
+    assert len(deltas) == 34
+    # trimmed payloads become decodable pcm16 of the recorded size
+    assert {len(delta) for delta in deltas} == {6400, 16000}
+    assert all(len(base64.b64decode(delta)) % 2 == 0 for delta in deltas)
+
+
+def test_replay_server_turns(recording):
+    server = ReplayServer(recording)
+    assert len(server.turns) == 3
+    # repeated events are replayed as many times as they were received
+    first_turn = [json.loads(raw)["type"] for _, raw in server.turns[0]]
+    assert first_turn.count("response.audio.delta") == 11
+    assert first_turn[-1] == "response.output_item.done"
+    assert [delay for delay, _ in server.turns[0]] == sorted(
+        delay for delay, _ in server.turns[0]
+    )
+
+
+@pytest.mark.asyncio
+async def test_replay_server_session(recording):
+    server = ReplayServer(recording, time_scale=0)
+    async with server.serve(port=0) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        async with websockets.connect(f"ws://127.0.0.1:{port}/v1/realtime") as ws:
+            assert json.loads(await ws.recv())["type"] == "session.created"
+            await ws.send(
+                json.dumps({"type": "session.update", "session": {"tools": []}})
+            )
+            session_updated = json.loads(await ws.recv())
+            assert session_updated["type"] == "session.updated"
+            assert session_updated["session"]["tools"] == []
+
+            await ws.send(json.dumps({"type": "response.create"}))
+            types = [json.loads(raw)["type"] for _, raw in server.turns[0]]
+            assert [json.loads(await ws.recv())["type"] for _ in types] == types
+
+
+@pytest.mark.asyncio
+async def test_replay_server_with_session_pool(recording):
+    server = ReplayServer(recording, time_scale=0)
+    async with server.serve(port=0) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        client = AsyncOpenAI(
+            api_key="key", websocket_base_url=f"ws://127.0.0.1:{port}/v1"
+        )
+        pool = RealtimeSessionPool(client, model="model", session={"tools": []}, size=0)
+        session = await pool.acquire()
+        assert session.expires_in() > 800
+        await session.close()
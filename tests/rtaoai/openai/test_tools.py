@@ -0,0 +1,209 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from rtaoai2.openai.events import decode_event
+from rtaoai2.openai.tools import Tool, ToolRuntime
+
+
+class OpenAIEventProducerSpy:
+    def __init__(self):
+        self.calls = []
+        self.answered = asyncio.Event()
+
+    async def make_function_call_output(self, call_id, output):
+        self.calls.append(("make_function_call_output", call_id, json.loads(output)))
+
+    async def make_response_create(self, tools):
+        self.calls.append(("make_response_create", tools))
+        self.answered.set()
+
+
+def function_call_done(response_id, call_id, name, arguments):
+    return decode_event(
+        json.dumps(
+            {
+                "type": "response.output_item.done",
+                "event_id": "event_1",
+                "response_id": response_id,
+                "output_index": 0,
+                "item": {
+                    "id": f"item_{call_id}",
+                    "type": "function_call",
+                    "status": "completed",
+                    "name": name,
+                    "call_id": call_id,
+                    "arguments": json.dumps(arguments),
+                },
+            }
+        )
+    )
+
+
+def response_done(response_id, status="completed"):
+    return decode_event(
+        json.dumps(
+            {
+                "type": "response.done",
+                "event_id": "event_2",
+                "response": {"id": response_id, "status": status},
+            }
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_tool_sync_runs_in_thread():
+    def current_thread() -> str:
+        return threading.current_thread().name
+
+    assert (
+        json.loads(await Tool(current_thread)("{}")) != threading.current_thread().name
+    )
+
+
+@pytest.mark.asyncio
+async def test_tool_timeout_and_error():
+    async def slow() -> int:
+        await asyncio.sleep(1)
+        return 1
+
+    def broken(a: int) -> int:
+        raise ValueError("no stock")
+
+    assert json.loads(await Tool(slow, timeout=0.01)("")) == {
+        "error": "slow timed out after 0.01s"
+    }
+    assert json.loads(await Tool(broken)('{"a": 1}')) == {
+        "error": "ValueError: no stock"
+    }
+
+
+@pytest.mark.asyncio
+async def test_tool_malformed_arguments():
+    def double(i: int) -> int:
+        return 2 * i
+
+    tool = Tool(double, cache_size=4)
+    output = json.loads(await tool('{"i": '))
+    assert output["error"].startswith("JSONDecodeError: ")
+    assert json.loads(await tool('{"i": 1}')) == 2
+
+
+@pytest.mark.asyncio
+async def test_tool_cache():
+    calls = []
+
+    def stock(product_id: int) -> int:
+        calls.append(product_id)
+        return product_id * 10
+
+    tool = Tool(stock, cache_size=1)
+    assert await tool('{"product_id": 1}') == "10"
+    assert await tool('{ "product_id" : 1 }') == "10"
+    assert calls == [1]
+    # least recently used arguments are evicted
+    assert await tool('{"product_id": 2}') == "20"
+    assert await tool('{"product_id": 1}') == "10"
+    assert calls == [1, 2, 1]
+
+    tool = Tool(stock, cache_size=1, cache_ttl=0)
+    await tool('{"product_id": 3}')
+    await tool('{"product_id": 3}')
+    assert calls == [1, 2, 1, 3, 3]
+
+
+@pytest.mark.asyncio
+async def test_tool_concurrency_limit():
+    running = []
+
+    async def lookup(i: int) -> int:
+        running.append(i)
+        await asyncio.sleep(0.01)
+        assert len(running) <= 2
+        running.remove(i)
+        return i
+
+    tool = Tool(lookup, concurrency=2)
+    outputs = await asyncio.gather(*(tool(json.dumps({"i": i})) for i in range(6)))
+    assert outputs == [str(i) for i in range(6)]
+
+
+@pytest.mark.asyncio
+async def test_runtime_batches_response_calls():
+    async def wait(seconds: float) -> float:
+        await asyncio.sleep(seconds)
+        return seconds
+
+    spy = OpenAIEventProducerSpy()
+    runtime = ToolRuntime([Tool(wait)], spy)
+
+    start = time.perf_counter()
+    await runtime.on_output_item_done(
+        function_call_done("resp_1", "call_1", "wait", {"seconds": 0.05})
+    )
+    await runtime.on_output_item_done(
+        function_call_done("resp_1", "call_2", "wait", {"seconds": 0.05})
+    )
+    await runtime.on_output_item_done(
+        function_call_done("resp_1", "call_3", "missing", {})
+    )
+    await runtime.on_response_done(response_done("resp_1"))
+    await asyncio.wait_for(spy.answered.wait(), 1)
+
+    # both calls ran at the same time
+    assert time.perf_counter() - start < 0.09
+    assert spy.calls == [
+        ("make_function_call_output", "call_1", 0.05),
+        ("make_function_call_output", "call_2", 0.05),
+        ("make_function_call_output", "call_3", {"error": "unknown tool missing"}),
+        ("make_response_create", [wait]),
+    ]
+    await runtime.close()
+
+
+@pytest.mark.asyncio
+async def test_runtime_ignores_responses_without_calls():
+    spy = OpenAIEventProducerSpy()
+    runtime = ToolRuntime([], spy)
+    await runtime.on_response_done(response_done("resp_1"))
+    await asyncio.sleep(0)
+    assert spy.calls == []
+
+
+@pytest.mark.asyncio
+async def test_runtime_drops_calls_of_cancelled_responses():
+    async def forever() -> None:
+        await asyncio.Future()
+
+    spy = OpenAIEventProducerSpy()
+    runtime = ToolRuntime([Tool(forever, timeout=60)], spy)
+    await runtime.on_output_item_done(
+        function_call_done("resp_1", "call_1", "forever", {})
+    )
+    [(_, task)] = runtime.calls["resp_1"]
+    # the user interrupted the response
+    await runtime.on_response_done(response_done("resp_1", "cancelled"))
+    await asyncio.gather(task, return_exceptions=True)
+    assert task.cancelled()
+    assert runtime.calls == {}
+    assert runtime.tasks == set()
+    assert spy.calls == []
+
+
+@pytest.mark.asyncio
+async def test_runtime_close_cancels_calls():
+    async def forever() -> None:
+        await asyncio.Future()
+
+    spy = OpenAIEventProducerSpy()
+    runtime = ToolRuntime([Tool(forever, timeout=60)], spy)
+    await runtime.on_output_item_done(
+        function_call_done("resp_1", "call_1", "forever", {})
+    )
+    await runtime.close()
+    assert runtime.calls == {}
+    assert spy.calls == []
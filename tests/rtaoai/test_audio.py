@@ -0,0 +1,125 @@
+import base64
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from rtaoai2 import audio as audio_module
+from rtaoai2.audio import (
+    SAMPLE_RATE,
+    AudioDecoderPool,
+    Resampler,
+    is_wav,
+    pcm16_to_pcm16,
+    pcm16_to_wav,
+    wav_to_pcm16,
+)
+
+
+def make_wav(samples: np.ndarray, frame_rate: int, channels: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(frame_rate)
+        wav.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def test_is_wav():
+    assert is_wav(make_wav(np.zeros(10), 24000))
+    assert not is_wav(b"\x1aE\xdf\xa3webm")
+
+
+def test_pcm16_to_wav_round_trip():
+    pcm = np.arange(100, dtype="<i2").tobytes()
+    assert is_wav(pcm16_to_wav(pcm))
+    assert wav_to_pcm16(pcm16_to_wav(pcm)) == pcm
+
+
+def test_pcm16_passthrough():
+    pcm = np.arange(100, dtype="<i2").tobytes()
+    assert pcm16_to_pcm16(pcm, SAMPLE_RATE) is pcm
+
+
+def test_pcm16_resample_48k():
+    pcm = np.full(4800, 1000, dtype="<i2").tobytes()
+    resampled = np.frombuffer(pcm16_to_pcm16(pcm, 48000), dtype="<i2")
+    assert len(resampled) == 2400
+    assert (resampled == 1000).all()
+
+
+def tone(frequency: float, frame_rate: int, seconds: float = 1) -> np.ndarray:
+    return 8000 * np.sin(
+        2 * np.pi * frequency * np.arange(int(frame_rate * seconds)) / frame_rate
+    )
+
+
+@pytest.mark.parametrize("frame_rate", [8000, 16000, 44100, 48000])
+def test_resampler_stream_matches_whole(frame_rate):
+    samples = tone(440, frame_rate)
+    whole = np.frombuffer(
+        pcm16_to_pcm16(samples.astype("<i2").tobytes(), frame_rate), dtype="<i2"
+    )
+    assert len(whole) == SAMPLE_RATE
+
+    # chunks that don't split the stream on whole output samples
+    resampler = Resampler(frame_rate)
+    chunk = frame_rate // 50 + 3
+    streamed = [
+        pcm16_to_pcm16(
+            samples[i : i + chunk].astype("<i2").tobytes(),
+            frame_rate,
+            resampler=resampler,
+        )
+        for i in range(0, len(samples), chunk)
+    ]
+    streamed.append(np.rint(resampler.flush()).astype("<i2").tobytes())
+    assert b"".join(streamed) == whole.tobytes()
+    # away from the edges, where the stream is held
+    assert np.abs(whole - tone(440, SAMPLE_RATE))[100:-100].max() <= 2
+
+
+def test_resampler_filters_aliases():
+    # above the 12kHz nyquist frequency of 24kHz, it would fold back to 9kHz
+    resampled = np.frombuffer(
+        pcm16_to_pcm16(tone(15000, 48000).astype("<i2").tobytes(), 48000), dtype="<i2"
+    )
+    assert np.abs(resampled[100:-100]).max() <= 2
+
+
+def test_wav_downmix_stereo():
+    # left 2000, right 0, interleaved
+    samples = np.tile(np.array([2000, 0]), 2400)
+    pcm = np.frombuffer(wav_to_pcm16(make_wav(samples, 24000, channels=2)), dtype="<i2")
+    assert len(pcm) == 2400
+    assert (pcm == 1000).all()
+
+
+@pytest.mark.asyncio
+async def test_decoder_pool_wav_fast_path():
+    pool = AudioDecoderPool(max_workers=1)
+    audio = await pool.decode(make_wav(np.full(1600, 7, dtype="<i2"), 16000))
+    pcm = np.frombuffer(base64.b64decode(audio), dtype="<i2")
+    assert len(pcm) == 2400
+    assert (pcm == 7).all()
+    # the fast path never spawns a decoder process
+    assert pool._executor is None
+
+
+@pytest.mark.asyncio
+async def test_decoder_pool_raw_pcm16(monkeypatch):
+    def no_ffmpeg(audio_bytes):
+        raise AssertionError("raw pcm16 went to ffmpeg")
+
+    monkeypatch.setattr(audio_module, "ffmpeg_to_pcm16", no_ffmpeg)
+    pool = AudioDecoderPool(max_workers=1)
+    pcm = np.full(1600, 7, dtype="<i2").tobytes()
+    decoded = np.frombuffer(
+        base64.b64decode(await pool.decode(pcm, 16000)), dtype="<i2"
+    )
+    assert len(decoded) == 2400
+    assert (decoded == 7).all()
+    assert await pool.decode_pcm(pcm, SAMPLE_RATE) == pcm
+    assert pool._executor is None
@@ -0,0 +1,68 @@
+import argparse
+import json
+
+import pytest
+import websockets
+
+from rtaoai2 import bench
+from rtaoai2.ui.producer import make_audio, make_audio_frame, make_audio_transcript
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert bench.percentile(values, 50) == 50
+    assert bench.percentile(values, 95) == 95
+    assert bench.percentile(values, 99) == 99
+    assert bench.percentile([3.0], 99) == 3
+    assert bench.percentile([], 50) is None
+
+
+async def ui_server(websocket):
+    """Answer each commit like EventProducer would."""
+    binary = "audio=binary" in websocket.request.path
+    received = 0
+    async for message in websocket:
+        if isinstance(message, bytes):
+            received += len(message)
+            continue
+        assert json.loads(message) == {"type": "input_audio.commit"}
+        assert received > 0
+        received = 0
+        await websocket.send(json.dumps(make_audio_transcript("hi")))
+        if binary:
+            await websocket.send(make_audio_frame("resp_1", 0, b"\x00" * 480))
+        else:
+            await websocket.send(json.dumps(make_audio("AAAA")))
+        await websocket.send(json.dumps({"type": "message", "data": "response.done"}))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("audio_format", ["binary", "json"])
+async def test_bench_run(audio_format):
+    async with websockets.serve(ui_server, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        parser = argparse.ArgumentParser()
+        bench.add_arguments(parser)
+        args = parser.parse_args(
+            [
+                "--url",
+                f"ws://127.0.0.1:{port}/ws",
+                "--sessions",
+                "3",
+                "--turns",
+                "2",
+                "--pace",
+                "0",
+                "--audio-format",
+                audio_format,
+            ]
+        )
+        report = await bench.run(args)
+
+    assert report["errors"] == []
+    assert report["turns"] == 6
+    for metric in bench.METRICS:
+        assert report["latency"][metric]["count"] == 6
+        assert report["latency"][metric]["p99"] >= report["latency"][metric]["p50"] >= 0
+    assert report["throughput"]["audio_bytes_per_s"] > 0
+    json.dumps(report)
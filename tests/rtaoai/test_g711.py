@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from rtaoai2 import g711
+from rtaoai2.audio import G711_ALAW, G711_ULAW, PCM16, SAMPLE_RATE, encode_audio
+
+
+def pcm16(*values: int) -> bytes:
+    return np.array(values, dtype="<i2").tobytes()
+
+
+def test_known_values():
+    assert g711.ulaw_encode(pcm16(0, -1, 32767, -32768)) == bytes(
+        [0xFF, 0x7E, 0x80, 0x00]
+    )
+    assert g711.alaw_encode(pcm16(0, -1, 32767, -32768)) == bytes(
+        [0xD5, 0x55, 0xAA, 0x2A]
+    )
+    assert g711.ulaw_decode(bytes([0xFF, 0x80, 0x00])) == pcm16(0, 32124, -32124)
+    assert g711.alaw_decode(bytes([0xD5, 0xAA, 0x2A])) == pcm16(8, 32256, -32256)
+
+
+@pytest.mark.parametrize(
+    "encode, decode",
+    [(g711.ulaw_encode, g711.ulaw_decode), (g711.alaw_encode, g711.alaw_decode)],
+)
+def test_roundtrip(encode, decode):
+    t = np.arange(g711.SAMPLE_RATE) / g711.SAMPLE_RATE
+    signal = np.sin(2 * np.pi * 440 * t) * 10000
+    pcm = signal.astype("<i2").tobytes()
+    assert len(encode(pcm)) == len(pcm) // 2
+    decoded = np.frombuffer(decode(encode(pcm)), dtype="<i2")
+    snr = 10 * np.log10(np.sum(signal**2) / np.sum((signal - decoded) ** 2))
+    assert snr > 30
+    # a partial trailing sample is dropped
+    assert encode(pcm + b"\x01") == encode(pcm)
+
+
+def test_decode_tables_monotonic():
+    for encode, decode in (
+        (g711.ulaw_encode, g711.ulaw_decode),
+        (g711.alaw_encode, g711.alaw_decode),
+    ):
+        ramp = np.arange(-32768, 32768, 64, dtype="<i2").tobytes()
+        decoded = np.frombuffer(decode(encode(ramp)), dtype="<i2")
+        assert np.all(np.diff(decoded.astype(np.int32)) >= 0)
+
+
+def test_encode_audio():
+    pcm = np.zeros(SAMPLE_RATE // 50, dtype="<i2").tobytes()
+    assert encode_audio(pcm, PCM16) is pcm
+    # 20ms at 8kHz, one byte per sample
+    assert encode_audio(pcm, G711_ULAW) == b"\xff" * 160
+    assert encode_audio(pcm, G711_ALAW) == b"\xd5" * 160
+    with pytest.raises(ValueError):
+        encode_audio(pcm, "opus")
@@ -0,0 +1,177 @@
+import json
+
+from rtaoai2 import metrics
+from rtaoai2.metrics import (
+    CLIENT,
+    SERVER,
+    Counter,
+    Gauge,
+    Histogram,
+    TraceRow,
+    TurnTimeline,
+)
+
+
+def test_histogram_render():
+    histogram = Histogram("latency_seconds", "Latency.", "stage", buckets=(0.1, 1))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5, "a")
+    assert histogram.count("a") == 3
+    assert histogram.count("b") == 0
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="a",le="0.1"} 1',
+        'latency_seconds_bucket{stage="a",le="1"} 2',
+        'latency_seconds_bucket{stage="a",le="+Inf"} 3',
+        'latency_seconds_sum{stage="a"} 5.55',
+        'latency_seconds_count{stage="a"} 3',
+    ]
+
+
+def test_gauge_and_counter_render():
+    gauge = Gauge("sessions", "Sessions.", "state")
+    gauge.set("attached", 2)
+    gauge.set("attached", 1)
+    counter = Counter("ended_total", "Ended.", "reason")
+    counter.inc("idle")
+    counter.inc("idle")
+    assert metrics.render_metrics((gauge, counter)).splitlines() == [
+        "# HELP sessions Sessions.",
+        "# TYPE sessions gauge",
+        'sessions{state="attached"} 1',
+        "# HELP ended_total Ended.",
+        "# TYPE ended_total counter",
+        'ended_total{reason="idle"} 2',
+    ]
+
+
+def test_timeline_observes_turn_stages():
+    histogram = Histogram("turn_seconds", "Turn.", "stage")
+    timeline = TurnTimeline(histogram)
+    for _ in range(3):
+        timeline.client(metrics.AUDIO_RECEIVED)
+        timeline.client(metrics.AUDIO_APPEND)
+    timeline.client(metrics.AUDIO_COMMIT)
+    timeline.server("response.created")
+    for _ in range(5):
+        timeline.server("response.audio.delta")
+    timeline.server("rate_limits.updated")
+    assert histogram.series == {}
+    timeline.server("response.done")
+
+    # one observation per stage and turn, unknown event types are not observed
+    assert set(histogram.series) == {
+        metrics.AUDIO_RECEIVED,
+        metrics.AUDIO_APPEND,
+        metrics.AUDIO_COMMIT,
+        "response.created",
+        "response.audio.delta",
+        "response.done",
+    }
+    assert all(histogram.count(stage) == 1 for stage in histogram.series)
+    assert timeline.marks == {}
+    assert timeline.rows is None
+
+
+def test_timeline_vad_frames_after_commit():
+    histogram = Histogram("turn_seconds", "Turn.", "stage")
+    timeline = TurnTimeline(histogram)
+    timeline.client(metrics.AUDIO_RECEIVED)
+    timeline.client(metrics.AUDIO_COMMIT)
+    start = timeline.marks[metrics.AUDIO_RECEIVED]
+    # with vad the client keeps streaming while the response is made
+    timeline.server("response.created")
+    timeline.client(metrics.AUDIO_RECEIVED)
+    assert timeline.marks[metrics.AUDIO_RECEIVED] == start
+    timeline.server("response.done")
+    assert histogram.count("response.created") == 1
+    assert histogram.count("response.done") == 1
+
+    # the next frame starts the next turn
+    timeline.client(metrics.AUDIO_RECEIVED)
+    assert timeline.marks[metrics.AUDIO_RECEIVED] > start
+
+
+def test_timeline_without_client_audio():
+    histogram = Histogram("turn_seconds", "Turn.", "stage")
+    timeline = TurnTimeline(histogram)
+    timeline.server("response.created")
+    timeline.server("response.done")
+    assert histogram.series == {}
+
+
+def test_write_trace_csv(tmp_path):
+    rows = [
+        TraceRow(3.441, CLIENT, "input_audio_buffer.commit"),
+        TraceRow(4.161, SERVER, "response.audio.delta"),
+        TraceRow(4.162, SERVER, "response.audio.delta"),
+        TraceRow(4.18, SERVER, "response.audio.delta"),
+        TraceRow(61.5, SERVER, "response.done"),
+    ]
+    path = tmp_path / "trace.csv"
+    metrics.write_trace(rows, str(path))
+    assert path.read_text().splitlines() == [
+        "time;emitter;event",
+        "00:03.44;client;input_audio_buffer.commit",
+        "00:04.16;server;response.audio.delta (2)",
+        "00:04.18;server;response.audio.delta",
+        "01:01.50;server;response.done",
+    ]
+
+    path = tmp_path / "trace.jsonl"
+    metrics.write_trace(rows, str(path))
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert lines[1] == {
+        "time": 4.16,
+        "emitter": "server",
+        "event": "response.audio.delta",
+        "count": 2,
+    }
+
+
+def test_recorded_trace():
+    timeline = TurnTimeline(Histogram("turn_seconds", "Turn.", "stage"), record=True)
+    timeline.client(metrics.AUDIO_RECEIVED)
+    timeline.server("session.updated")
+    assert [(row.emitter, row.event) for row in timeline.rows] == [
+        (CLIENT, metrics.AUDIO_RECEIVED),
+        (SERVER, "session.updated"),
+    ]
+
+
+def test_timeline_barge_in_drops_the_interrupted_response():
+    histogram = Histogram("turn_seconds", "Turn.", "stage")
+    timeline = TurnTimeline(histogram)
+    timeline.client(metrics.AUDIO_RECEIVED)
+    timeline.server("response.created")
+    timeline.server("response.audio.delta")
+    # the user talks over the response
+    timeline.client(metrics.AUDIO_RECEIVED)
+    timeline.interrupt()
+    timeline.server("response.audio.delta")
+    timeline.server("response.done")
+    assert histogram.series == {}
+    assert set(timeline.marks) == {metrics.AUDIO_RECEIVED}
+
+    timeline.server("response.created")
+    timeline.server("response.done")
+    assert histogram.count("response.done") == 1
+    assert all(total[0] >= 0 for _, total in histogram.series.values())
+
+    # nothing in flight, nothing to drop
+    timeline.interrupt()
+    assert not timeline.interrupted
+
+
+def test_timeline_rows_are_capped():
+    timeline = TurnTimeline(record=True, max_rows=3)
+    for _ in range(5):
+        timeline.server("rate_limits.updated")
+    timeline.client(metrics.AUDIO_RECEIVED)
+    assert [row.event for row in timeline.rows] == [
+        "rate_limits.updated",
+        "rate_limits.updated",
+        metrics.AUDIO_RECEIVED,
+    ]
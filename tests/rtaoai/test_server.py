@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import base64
+import json
+import threading
+import time
+
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from rtaoai2 import bench, server
+from rtaoai2.audio import AudioDecoderPool
+from rtaoai2.openai.replay import ReplayServer, load_recording
+
+
+@pytest.fixture(scope="module")
+def replay_server():
+    """A replay stand-in served from its own thread, the app runs in another loop."""
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+    stop = loop.create_future()
+    replay = ReplayServer(load_recording("dumps"), time_scale=0.2)
+    url = []
+
+    async def serve():
+        async with replay.serve(port=0) as ws_server:
+            url.append(f"ws://127.0.0.1:{ws_server.sockets[0].getsockname()[1]}/v1")
+            ready.set()
+            await stop
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),))
+    thread.start()
+    ready.wait(5)
+    yield replay, url[0]
+    loop.call_soon_threadsafe(stop.set_result, None)
+    thread.join(5)
+
+
+@pytest.fixture
+def replay_url(replay_server):
+    return replay_server[1]
+
+
+@pytest.fixture
+def client(replay_url, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    monkeypatch.setenv("OPENAI_WEBSOCKET_BASE_URL", replay_url)
+    monkeypatch.setattr(server, "decoder_pool", AudioDecoderPool(max_workers=1))
+    monkeypatch.setattr(server, "SESSION_POOL_SIZE", 0)
+    with TestClient(server.app) as client:
+        yield client
+
+
+def utterance() -> bytes:
+    with open("tests/rtaoai/fixtures/vad/vowel.wav", "rb") as f:
+        return f.read()
+
+
+def receive_until_done(ws) -> list[dict]:
+    messages = []
+    while True:
+        message = ws.receive_json()
+        messages.append(message)
+        if message == {"type": "message", "data": "response.done"}:
+            return messages
+
+
+def test_turn(client):
+    with client.websocket_connect("/ws") as ws:
+        session = ws.receive_json()
+        assert session["type"] == "session" and session["data"]
+        ws.send_bytes(utterance())
+        types = {message["type"] for message in receive_until_done(ws)}
+        assert {"audio", "transcript"} <= types
+
+
+def test_stream_turn(client, replay_server):
+    replay, _ = replay_server
+    start = len(replay.received)
+    with client.websocket_connect("/ws?input=stream&sample_rate=16000") as ws:
+        ws.receive_json()
+        # nothing to commit yet, committing an empty buffer is an upstream error
+        ws.send_text(json.dumps({"type": "input_audio.commit"}))
+        for _ in range(3):
+            ws.send_bytes(b"\x10\x00" * 1024)
+        ws.send_text(json.dumps({"type": "input_audio.commit"}))
+        types = {message["type"] for message in receive_until_done(ws)}
+    assert {"audio", "transcript"} <= types
+    received = [t for t in replay.received[start:] if t != "session.update"]
+    assert received[:6] == [
+        # the last one is the resampler's tail
+        *["input_audio_buffer.append"] * 4,
+        "input_audio_buffer.commit",
+        "response.create",
+    ]
+
+
+def test_streamed_turns_are_resampled_whole(client, replay_server):
+    replay, _ = replay_server
+    with client.websocket_connect("/ws?input=stream&sample_rate=16000") as ws:
+        ws.receive_json()
+        for _ in range(2):
+            appended = replay.appended_bytes
+            # 20ms frames that don't end on a whole 24kHz sample
+            for _ in range(5):
+                ws.send_bytes(b"\x10\x00" * 321)
+            ws.send_text(json.dumps({"type": "input_audio.commit"}))
+            receive_until_done(ws)
+            # 1605 samples at 16kHz, 2407.5 at 24kHz
+            assert replay.appended_bytes - appended == 2 * 2408
+
+
+def test_raw_pcm16_blob_turn(client, monkeypatch):
+    def no_ffmpeg(pool):
+        raise AssertionError("raw pcm16 went to an ffmpeg worker")
+
+    # converted in process, the ffmpeg workers are never asked
+    monkeypatch.setattr(AudioDecoderPool, "executor", property(no_ffmpeg))
+    with client.websocket_connect("/ws?blob=pcm16&sample_rate=16000") as ws:
+        ws.receive_json()
+        ws.send_bytes(b"\x10\x00" * 16000)
+        types = {message["type"] for message in receive_until_done(ws)}
+    assert {"audio", "transcript"} <= types
+
+
+def test_resume_replays_missed_messages(client):
+    with client.websocket_connect("/ws") as ws:
+        session = ws.receive_json()
+        token = session["data"]
+        ws.send_bytes(utterance())
+        first = ws.receive_json()
+    registry = server.app.state.session_registry
+    # the response keeps being received while the client is away
+    assert token in registry.parked
+
+    with client.websocket_connect(f"/ws?resume={token}") as ws:
+        assert ws.receive_json() == session
+        rest = receive_until_done(ws)
+    assert first["type"] in {"audio", "transcript", "input_transcript"}
+    assert any(message["type"] == "audio" for message in [first, *rest])
+
+    with client.websocket_connect("/ws?resume=unknown") as ws:
+        assert ws.receive_json()["data"] != token
+
+
+def test_sessions_beyond_the_limit_are_refused(client, monkeypatch):
+    registry = server.app.state.session_registry
+    monkeypatch.setattr(registry, "max_sessions", 1)
+    monkeypatch.setattr(registry, "admission_timeout", 0)
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        with (
+            client.websocket_connect("/ws") as refused,
+            pytest.raises(WebSocketDisconnect) as closed,
+        ):
+            refused.receive_json()
+        assert closed.value.code == 1013
+        assert (
+            'rtaoai2_sessions_ended_total{reason="rejected"}'
+            in client.get("/metrics").text
+        )
+        text = client.get("/metrics").text
+        assert 'rtaoai2_outbound_queued{state="attached"}' in text
+        assert 'rtaoai2_transcript_buffered_bytes{state="attached"} 0' in text
+
+
+def test_idle_sessions_are_closed(client, monkeypatch):
+    monkeypatch.setattr(server, "IDLE_TIMEOUT", 0.2)
+    registry = server.app.state.session_registry
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        with pytest.raises(WebSocketDisconnect):
+            ws.receive_json()
+    assert not registry.sessions
+
+
+def test_sessions_failing_to_set_up_are_closed(client, monkeypatch):
+    async def fail(self, modalities):
+        raise RuntimeError("session.update failed")
+
+    monkeypatch.setattr(server.OpenAIEventProducer, "make_modalities_update", fail)
+    registry = server.app.state.session_registry
+    with (
+        pytest.raises(RuntimeError, match="session.update failed"),
+        client.websocket_connect("/ws?modalities=text") as ws,
+    ):
+        ws.receive_json()
+    assert not registry.sessions
+
+
+def test_barge_in_silences_the_response(client, replay_server, monkeypatch):
+    replay, _ = replay_server
+    # recorded pace, the response is still streaming when interrupted
+    monkeypatch.setattr(replay, "time_scale", 1)
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        ws.send_bytes(utterance())
+        while ws.receive_json()["type"] != "audio":
+            pass
+        interrupted_at = time.perf_counter()
+        ws.send_text(json.dumps({"type": "response.cancel"}))
+        while ws.receive_json()["type"] != "audio.flush":
+            pass
+        latency = time.perf_counter() - interrupted_at
+        rest = receive_until_done(ws)
+    # audio already queued may arrive before the flush, none after it
+    assert latency < 0.5
+    assert not any(message["type"] == "audio" for message in rest)
+    assert replay.received[-2:] == ["response.cancel", "conversation.item.truncate"]
+
+
+def test_text_turn(client, replay_server):
+    replay, _ = replay_server
+    with client.websocket_connect("/ws?modalities=text") as ws:
+        ws.receive_json()
+        # invalid control messages are ignored, the session goes on
+        for invalid in (
+            "not json",
+            "[1]",
+            json.dumps({"type": "input_text"}),
+            json.dumps(
+                {"type": "input_text", "data": "Hello!", "modalities": ["audio"]}
+            ),
+            json.dumps({"type": "input_text", "data": "Hello!", "modalities": [{}]}),
+        ):
+            ws.send_text(invalid)
+        ws.send_text(json.dumps({"type": "input_text", "data": "Hello!"}))
+        messages = receive_until_done(ws)
+    assert {message["type"] for message in messages} == {"transcript", "message"}
+    assert "".join(m["data"] for m in messages if m["type"] == "transcript")
+    assert replay.received[-3:] == [
+        "session.update",
+        "conversation.item.create",
+        "response.create",
+    ]
+
+
+def test_invalid_modalities_are_refused(client):
+    with (
+        pytest.raises(WebSocketDisconnect) as closed,
+        client.websocket_connect("/ws?modalities=audio") as ws,
+    ):
+        ws.receive_json()
+    assert closed.value.code == 1008
+
+
+def test_downsampled_audio_codec(client):
+    with client.websocket_connect("/ws?audio_codec=pcm16_8k") as ws:
+        ws.receive_json()
+        codec = ws.receive_json()
+        assert codec == {
+            "type": "audio.codec",
+            "data": {"codec": "pcm16_8k", "sample_rate": 8000, "frame_ms": 20},
+        }
+        ws.send_bytes(utterance())
+        messages = receive_until_done(ws)
+    audio = [base64.b64decode(m["data"]) for m in messages if m["type"] == "audio"]
+    # 8kHz pcm16, whole 20ms frames once the filter's tail is flushed
+    assert audio and all(len(chunk) % 2 == 0 for chunk in audio)
+    assert sum(len(chunk) for chunk in audio) % 320 == 0
+
+
+def test_observer_gets_the_client_messages(client):
+    with client.websocket_connect("/ws") as ws:
+        session = ws.receive_json()
+        with client.websocket_connect(f"/ws/observe/{session['id']}") as observer:
+            ws.send_bytes(utterance())
+            messages = receive_until_done(ws)
+            assert receive_until_done(observer) == messages
+
+
+def test_unknown_session_cannot_be_observed(client):
+    with (
+        pytest.raises(WebSocketDisconnect) as closed,
+        client.websocket_connect("/ws/observe/unknown") as observer,
+    ):
+        observer.receive_json()
+    assert closed.value.code == 1008
+
+
+def test_conversation_snapshot_on_resume(client):
+    with client.websocket_connect("/ws?modalities=text&conversation=true") as ws:
+        session = ws.receive_json()
+        assert ws.receive_json() == {
+            "type": "conversation.snapshot",
+            "data": {"version": 0, "items": []},
+        }
+        ws.send_text(json.dumps({"type": "input_text", "data": "Hello!"}))
+        while True:
+            message = ws.receive_json()
+            if (
+                message["type"] == "conversation.diff"
+                and message["data"]["op"] == "turn.done"
+            ):
+                break
+
+    with client.websocket_connect(f"/ws?resume={session['data']}") as ws:
+        ws.receive_json()
+        snapshot = ws.receive_json()
+    assert snapshot["type"] == "conversation.snapshot"
+    items = snapshot["data"]["items"]
+    assert items[0]["role"] == "user" and items[0]["text"] == "Hello!"
+    assert items[-1]["role"] == "assistant" and items[-1]["text"]
+
+
+@pytest.mark.asyncio
+async def test_bench_blob_mode(replay_url, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    monkeypatch.setenv("OPENAI_WEBSOCKET_BASE_URL", replay_url)
+    monkeypatch.setattr(server, "decoder_pool", AudioDecoderPool(max_workers=1))
+    monkeypatch.setattr(server, "SESSION_POOL_SIZE", 0)
+    app_server = uvicorn.Server(uvicorn.Config(server.app, port=0, log_level="warning"))
+    serving = asyncio.create_task(app_server.serve())
+    while not app_server.started:
+        await asyncio.sleep(0.01)
+    port = app_server.servers[0].sockets[0].getsockname()[1]
+
+    parser = argparse.ArgumentParser()
+    bench.add_arguments(parser)
+    args = parser.parse_args(
+        [
+            "--url",
+            f"ws://127.0.0.1:{port}/ws",
+            "--sessions",
+            "2",
+            "--turns",
+            "1",
+            "--input",
+            "blob",
+            "--pace",
+            "0",
+            "--timeout",
+            "10",
+            "--audio",
+            "tests/rtaoai/fixtures/vad/vowel.wav",
+        ]
+    )
+    try:
+        report = await bench.run(args)
+    finally:
+        app_server.should_exit = True
+        await serving
+    assert report["errors"] == []
+    assert report["turns"] == 2
+    assert report["latency"]["response_done"]["count"] == 2
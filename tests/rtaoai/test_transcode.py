@@ -0,0 +1,100 @@
+import base64
+from collections import namedtuple
+
+import pytest
+
+from rtaoai2 import transcode
+from rtaoai2.transcode import FRAME_BYTES, AudioTranscoder, FrameChunker
+from rtaoai2.ui.producer import EventProducer, parse_audio_frame
+
+FakeEvent = namedtuple("FakeEvent", ["response_id", "item_id", "delta"])
+
+
+class WebSocketSpy:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, j):
+        self.sent.append(j)
+
+    async def send_bytes(self, b):
+        self.sent.append(b)
+
+
+def test_chunker_keeps_partial_frames():
+    chunker = FrameChunker(4)
+    assert chunker.push(b"abc") == []
+    assert chunker.push(b"defghij") == [b"abcd", b"efgh"]
+    assert chunker.flush() == b"ij\x00\x00"
+    assert chunker.flush() is None
+    chunker.push(b"a")
+    chunker.reset()
+    assert chunker.push(b"wxyz") == [b"wxyz"]
+
+
+@pytest.mark.asyncio
+async def test_downsampled_frames():
+    transcoder = AudioTranscoder("pcm16_16k")
+    assert transcoder.describe() == {
+        "codec": "pcm16_16k",
+        "sample_rate": 16000,
+        "frame_ms": 20,
+    }
+    # 2.5 frames in, 2 frames of 320 samples out but the lag of the filter
+    (audio,) = await transcoder.encode(b"\x01\x00" * (FRAME_BYTES // 2 * 5 // 2))
+    assert 600 < len(audio) // 2 <= 2 * 320
+    (tail,) = await transcoder.flush()
+    assert len(audio) + len(tail) == 3 * 640
+    assert set(audio + tail) == {0, 1}
+    assert await transcoder.flush() == []
+
+
+def test_opus_falls_back_without_libopus(monkeypatch):
+    def unavailable(bitrate):
+        # like opuslib, a bare Exception
+        raise Exception("Could not find Opus library")  # noqa: TRY002
+
+    monkeypatch.setattr(transcode, "OpusEncoder", unavailable)
+    assert AudioTranscoder("opus", fallback="pcm16_8k").codec == "pcm16_8k"
+    with pytest.raises(ValueError):
+        AudioTranscoder("mp3")
+
+
+@pytest.mark.asyncio
+async def test_opus_packets():
+    pytest.importorskip("opuslib")
+    transcoder = AudioTranscoder("opus")
+    packets = await transcoder.encode(transcode.speech_like(0.1))
+    assert len(packets) == 5
+    assert all(len(packet) < FRAME_BYTES for packet in packets)
+
+
+@pytest.mark.asyncio
+async def test_producer_transcodes_deltas():
+    websocket = WebSocketSpy()
+    producer = EventProducer(
+        websocket, binary_audio=True, transcoder=AudioTranscoder("pcm16_8k")
+    )
+    delta = base64.b64encode(b"\x00" * (FRAME_BYTES * 3 // 2)).decode()
+    await producer.on_response_audio_delta_event(FakeEvent("resp_1", "item_1", delta))
+    await producer.on_response_done(None)
+    frames = [parse_audio_frame(frame) for frame in websocket.sent[:2]]
+    assert [(response_id, seq) for response_id, seq, _ in frames] == [
+        ("resp_1", 0),
+        ("resp_1", 1),
+    ]
+    assert b"".join(audio for _, _, audio in frames) == b"\x00" * 640
+    assert websocket.sent[2] == {"type": "message", "data": "response.done"}
+
+    # an interrupted response leaves no partial frame behind
+    await producer.on_response_audio_delta_event(FakeEvent("resp_2", "item_2", delta))
+    await producer.discard()
+    await producer.on_response_done(None)
+    assert websocket.sent[4] == {"type": "message", "data": "response.done"}
+
+
+def test_benchmark():
+    report = transcode.benchmark("pcm16_8k", seconds=1)
+    assert report["codec"]["codec"] == "pcm16_8k"
+    assert report["kbit_per_second"] == 128
+    assert report["cpu_per_stream"] >= 0
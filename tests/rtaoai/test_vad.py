@@ -0,0 +1,81 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from rtaoai2.audio import SAMPLE_RATE, wav_to_pcm16
+from rtaoai2.vad import VoiceActivityDetector, frame_features
+
+CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "vad")
+
+with open(os.path.join(CORPUS, "corpus.json")) as f:
+    SEGMENTS = json.load(f)
+
+
+def load(name: str) -> bytes:
+    with open(os.path.join(CORPUS, name), "rb") as f:
+        return wav_to_pcm16(f.read())
+
+
+def ms(pcm_bytes: int) -> float:
+    return pcm_bytes / 2 / SAMPLE_RATE * 1000
+
+
+def stream(detector: VoiceActivityDetector, pcm: bytes, chunk: int = 3000):
+    """Speech of each turn and the position in ms at which it ended."""
+    turns = []
+    speech = b""
+    for offset in range(0, len(pcm), chunk):
+        audio, ended = detector.feed(pcm[offset : offset + chunk])
+        speech += audio
+        # the audio kept after an end of speech is fed with the next chunk
+        while ended:
+            turns.append((speech, ms(offset + chunk - len(detector.pending))))
+            speech, ended = detector.feed(b"")
+    return turns
+
+
+def test_frame_features():
+    t = np.arange(SAMPLE_RATE // 10) / SAMPLE_RATE
+    tone = (np.sin(2 * np.pi * 300 * t) * 16384).astype("<i2").tobytes()
+    energy, zcr = frame_features(tone + b"\x00", 480)
+    assert len(energy) == 5
+    # half scale sine is 3dB under its peak
+    assert np.allclose(energy, -9.03, atol=0.1)
+    assert np.allclose(zcr, 2 * 300 / SAMPLE_RATE, atol=0.003)
+
+
+@pytest.mark.parametrize("name", sorted(SEGMENTS))
+def test_corpus_streaming(name):
+    detector = VoiceActivityDetector()
+    turns = stream(detector, load(name))
+    segments = SEGMENTS[name]
+    assert len(turns) == len(segments)
+    for (speech, ended_at), (start, end) in zip(turns, segments):
+        # trailing silence is trimmed, the pre-roll is kept
+        assert end - start <= ms(len(speech)) <= end - start + 300
+        # speech ends once the hangover elapsed
+        assert end + 500 <= ended_at <= end + 650
+
+
+@pytest.mark.parametrize("name", sorted(SEGMENTS))
+def test_corpus_trim(name):
+    pcm = load(name)
+    trimmed = VoiceActivityDetector().trim(pcm)
+    segments = SEGMENTS[name]
+    if not segments:
+        assert trimmed == b""
+        return
+    start, end = segments[0][0], segments[-1][1]
+    assert end - start <= ms(len(trimmed)) <= end - start + 250
+    assert pcm.find(trimmed) >= 0
+
+
+def test_reset_drops_pending_speech():
+    detector = VoiceActivityDetector()
+    speech, ended = detector.feed(load("vowel.wav")[: SAMPLE_RATE * 2])
+    assert speech and not ended and detector.speaking
+    detector.reset()
+    assert not detector.speaking
+    assert detector.feed(b"\x00" * 960) == (b"", False)
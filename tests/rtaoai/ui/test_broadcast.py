@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from rtaoai2.ui.broadcast import BroadcastHub, encode_json
+from rtaoai2.ui.outbound import OutboundQueue
+
+
+class WebSocketSpy:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_json(self, j):
+        self.sent.append(j)
+
+    async def send_text(self, t):
+        self.sent.append(t)
+
+    async def send_bytes(self, b):
+        self.sent.append(b)
+
+    async def close(self, code):
+        self.closed_with = code
+
+
+@pytest.mark.asyncio
+async def test_messages_are_encoded_once_for_all_observers():
+    outbound = OutboundQueue(WebSocketSpy())
+    hub = BroadcastHub(outbound, max_observers=2)
+    first = hub.subscribe(WebSocketSpy())
+    second = hub.subscribe(WebSocketSpy())
+    assert hub.subscribe(WebSocketSpy()) is None
+
+    await hub.send_json({"type": "transcript", "data": "héllo"})
+    await hub.send_bytes(b"\x01\x02")
+    # the client gets the same encoded message
+    pending = outbound.take_pending()
+    assert pending == [
+        (False, False, '{"type":"transcript","data":"héllo"}'),
+        (True, True, b"\x01\x02"),
+    ]
+    assert list(first.queue) == ['{"type":"transcript","data":"héllo"}', b"\x01\x02"]
+    assert first.queue[0] is second.queue[0] is pending[0][2]
+
+    task = asyncio.create_task(first.run())
+    await asyncio.sleep(0)
+    assert first.websocket.sent == [
+        encode_json({"type": "transcript", "data": "héllo"}),
+        b"\x01\x02",
+    ]
+    await first.close()
+    await task
+
+
+@pytest.mark.asyncio
+async def test_slow_observers_are_dropped():
+    outbound = OutboundQueue(WebSocketSpy(), max_size=1, policy="drop_audio")
+    hub = BroadcastHub(outbound, queue_size=2)
+    slow = hub.subscribe(WebSocketSpy())
+    for _ in range(3):
+        await hub.send_bytes(b"\x00")
+    await asyncio.sleep(0)
+    assert hub.observers == [] and hub.dropped == 1
+    assert slow.closed and slow.websocket.closed_with == 1013
+    # the client queue went on under its own policy
+    assert outbound.take_pending() == [(True, True, b"\x00")]
+
+    # nothing is encoded without observers
+    await hub.send_json({"type": "audio", "data": ""})
+    assert outbound.take_pending() == [(True, False, {"type": "audio", "data": ""})]
+    assert hub.dropped == 1
+    await hub.close()
+    assert not hub.closing
+
+
+@pytest.mark.asyncio
+async def test_encoded_messages_are_sent_as_text():
+    websocket = WebSocketSpy()
+    outbound = OutboundQueue(websocket)
+    hub = BroadcastHub(outbound)
+    hub.subscribe(WebSocketSpy())
+    await hub.send_json({"type": "audio", "data": "AAAA"})
+    await hub.send_json({"type": "transcript", "data": "Hello"})
+    # still audio to the slow client policy
+    assert outbound.discard_audio() == 1
+    task = asyncio.create_task(outbound.run())
+    await asyncio.sleep(0)
+    assert websocket.sent == ['{"type":"transcript","data":"Hello"}']
+    task.cancel()
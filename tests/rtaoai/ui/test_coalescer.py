@@ -0,0 +1,131 @@
+import asyncio
+import base64
+from collections import namedtuple
+
+import pytest
+
+from rtaoai2.ui.coalescer import CoalescingEventProducer
+
+FakeEvent = namedtuple("FakeEvent", ["response_id", "item_id", "delta"])
+
+
+def audio_event(audio: bytes, item_id: str = "item_1") -> FakeEvent:
+    return FakeEvent("resp_1", item_id, base64.b64encode(audio).decode())
+
+
+class ProducerSpy:
+    def __init__(self):
+        self.calls = []
+
+    async def on_response_audio_delta_event(self, event):
+        self.calls.append(("audio", event.item_id, base64.b64decode(event.delta)))
+
+    async def on_response_audio_transcript_delta_event(self, delta):
+        self.calls.append(("transcript", delta))
+
+    async def on_response_audio_input_transcript_done_event(self, transcript):
+        self.calls.append(("input_transcript", transcript))
+
+    async def on_response_created(self, event):
+        self.calls.append(("created",))
+
+    async def on_response_done(self, event):
+        self.calls.append(("done",))
+
+
+@pytest.mark.asyncio
+async def test_coalesce_consecutive_deltas_in_order():
+    spy = ProducerSpy()
+    producer = CoalescingEventProducer(spy, window=10)
+
+    await producer.on_response_audio_transcript_delta_event("Hello")
+    await producer.on_response_audio_transcript_delta_event(" world")
+    await producer.on_response_audio_delta_event(audio_event(b"\x01"))
+    await producer.on_response_audio_delta_event(audio_event(b"\x02"))
+    await producer.on_response_audio_delta_event(audio_event(b"\x03", "item_2"))
+    await producer.on_response_audio_input_transcript_done_event("Hi")
+    await producer.on_response_audio_transcript_delta_event("!")
+    assert spy.calls == [
+        ("transcript", "Hello world"),
+        ("audio", "item_1", b"\x01\x02"),
+        ("audio", "item_2", b"\x03"),
+        ("input_transcript", "Hi"),
+    ]
+
+    await producer.on_response_done(None)
+    assert spy.calls[-2:] == [("transcript", "!"), ("done",)]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flush_on_max_bytes():
+    spy = ProducerSpy()
+    producer = CoalescingEventProducer(spy, window=10, max_bytes=4)
+
+    await producer.on_response_audio_delta_event(audio_event(b"\x01\x02"))
+    assert spy.calls == []
+    await producer.on_response_audio_delta_event(audio_event(b"\x03\x04"))
+    assert spy.calls == [("audio", "item_1", b"\x01\x02\x03\x04")]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flush_on_window():
+    spy = ProducerSpy()
+    producer = CoalescingEventProducer(spy, window=0.01)
+
+    await producer.on_response_audio_transcript_delta_event("Hello")
+    assert spy.calls == []
+    await asyncio.sleep(0.05)
+    assert spy.calls == [("transcript", "Hello")]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_disabled():
+    spy = ProducerSpy()
+    producer = CoalescingEventProducer(spy, window=0)
+
+    await producer.on_response_audio_delta_event(audio_event(b"\x01"))
+    assert spy.calls == [("audio", "item_1", b"\x01")]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_interleaved_deltas():
+    spy = ProducerSpy()
+    producer = CoalescingEventProducer(spy, window=10)
+
+    for audio, transcript in ((b"\x01", "Hel"), (b"\x02", "lo"), (b"\x03", "!")):
+        await producer.on_response_audio_delta_event(audio_event(audio))
+        await producer.on_response_audio_transcript_delta_event(transcript)
+    await producer.on_response_done(None)
+    assert spy.calls == [
+        ("audio", "item_1", b"\x01\x02\x03"),
+        ("transcript", "Hello!"),
+        ("done",),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_single_delta_forwarded_as_is():
+    events = []
+
+    class EventSpy(ProducerSpy):
+        async def on_response_audio_delta_event(self, event):
+            events.append(event)
+
+    producer = CoalescingEventProducer(EventSpy(), window=10)
+    event = audio_event(b"\x01\x02")
+    await producer.on_response_audio_delta_event(event)
+    await producer.flush()
+    assert events == [event] and events[0] is event
+
+
+@pytest.mark.asyncio
+async def test_coalesce_window_flush_failure_is_logged(caplog):
+    class FailingSpy(ProducerSpy):
+        async def on_response_audio_transcript_delta_event(self, delta):
+            raise RuntimeError("closed")
+
+    producer = CoalescingEventProducer(FailingSpy(), window=0.01)
+    await producer.on_response_audio_transcript_delta_event("Hello")
+    await asyncio.sleep(0.05)
+    assert producer.flush_task is None
+    assert "flushing coalesced deltas failed" in caplog.text
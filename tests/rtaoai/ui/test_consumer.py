@@ -13,8 +13,14 @@ class OpenAIEventProducerSpy:
     async def make_audio_commit(self):
         self.calls.append(("make_audio_commit", ""))
 
-    async def make_response_create(self, tools):
-        self.calls.append(("make_response_create", tools))
+    async def make_text(self, text: str):
+        self.calls.append(("make_text", text))
+
+    async def make_response_create(self, tools, modalities=None):
+        if modalities is None:
+            self.calls.append(("make_response_create", tools))
+        else:
+            self.calls.append(("make_response_create", tools, modalities))
 
 
 @pytest.mark.asyncio
@@ -36,3 +42,15 @@ async def test_consumer_on_response_requested():
     assert spy.calls == [
         ("make_response_create", []),
     ]
+
+
+@pytest.mark.asyncio
+async def test_consumer_on_text():
+    spy = OpenAIEventProducerSpy()
+    event_consumer = EventConsumer(spy)
+    await event_consumer.on_text("Hello!")
+    await event_consumer.on_response_create(tools=[], modalities=["text"])
+    assert spy.calls == [
+        ("make_text", "Hello!"),
+        ("make_response_create", [], ["text"]),
+    ]
@@ -0,0 +1,284 @@
+import pytest
+
+from rtaoai2.openai.events import EVENT_ADAPTER
+from rtaoai2.ui.conversation import ConversationStore
+
+
+class OutboundSpy:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, j):
+        self.sent.append(j)
+
+
+def event(type, **fields):
+    return EVENT_ADAPTER.validate_python({"type": type, **fields})
+
+
+def diffs(outbound):
+    sent, outbound.sent = outbound.sent, []
+    assert all(message["type"] == "conversation.diff" for message in sent)
+    return [message["data"] for message in sent]
+
+
+@pytest.mark.asyncio
+async def test_turn_diffs_and_snapshot():
+    outbound = OutboundSpy()
+    store = ConversationStore(outbound)
+    user = {"id": "item_1", "type": "message", "role": "user", "status": "completed"}
+    await store.on_item_created(
+        event(
+            "conversation.item.created",
+            item={**user, "content": [{"type": "input_audio"}]},
+        )
+    )
+    await store.on_input_audio_transcription_completed(
+        event(
+            "conversation.item.input_audio_transcription.completed",
+            item_id="item_1",
+            transcript="Hi",
+        )
+    )
+    assistant = {"id": "item_2", "type": "message", "role": "assistant"}
+    await store.on_output_item_added(
+        event("response.output_item.added", response_id="resp_1", item=assistant)
+    )
+    # created upstream after being added to the response
+    await store.on_item_created(
+        event("conversation.item.created", previous_item_id="item_1", item=assistant)
+    )
+    for delta in ("Hel", "lo"):
+        await store.on_text_delta(
+            event(
+                "response.audio_transcript.delta",
+                response_id="resp_1",
+                item_id="item_2",
+                delta=delta,
+            )
+        )
+    await store.on_audio_transcript_done(
+        event(
+            "response.audio_transcript.done",
+            response_id="resp_1",
+            item_id="item_2",
+            transcript="Hello",
+        )
+    )
+    await store.on_response_done(
+        event("response.done", response={"id": "resp_1", "status": "completed"})
+    )
+
+    assert diffs(outbound) == [
+        {
+            "version": 1,
+            "op": "item",
+            "item": {
+                "id": "item_1",
+                "role": "user",
+                "response_id": None,
+                "status": "completed",
+                "text": "",
+            },
+            "previous_item_id": None,
+        },
+        {
+            "version": 2,
+            "op": "item.done",
+            "id": "item_1",
+            "status": "completed",
+            "text": "Hi",
+        },
+        {
+            "version": 3,
+            "op": "item",
+            "item": {
+                "id": "item_2",
+                "role": "assistant",
+                "response_id": "resp_1",
+                "status": "in_progress",
+                "text": "",
+            },
+            "previous_item_id": None,
+        },
+        {"version": 4, "op": "text", "id": "item_2", "offset": 0, "delta": "Hel"},
+        {"version": 5, "op": "text", "id": "item_2", "offset": 3, "delta": "lo"},
+        # the deltas already add up to the transcript
+        {"version": 6, "op": "item.done", "id": "item_2", "status": "completed"},
+        {
+            "version": 7,
+            "op": "turn.done",
+            "response_id": "resp_1",
+            "status": "completed",
+        },
+    ]
+    assert store.snapshot() == {
+        "type": "conversation.snapshot",
+        "data": {
+            "version": 7,
+            "items": [
+                {
+                    "id": "item_1",
+                    "role": "user",
+                    "response_id": None,
+                    "status": "completed",
+                    "text": "Hi",
+                },
+                {
+                    "id": "item_2",
+                    "role": "assistant",
+                    "response_id": "resp_1",
+                    "status": "completed",
+                    "text": "Hello",
+                },
+            ],
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_cancelled_turn_and_oldest_items_dropped():
+    outbound = OutboundSpy()
+    store = ConversationStore(outbound, max_items=1)
+    await store.on_item_created(
+        event(
+            "conversation.item.created",
+            item={
+                "id": "item_1",
+                "type": "message",
+                "role": "user",
+                "status": "completed",
+                "content": [{"type": "input_text", "text": "Hello!"}],
+            },
+        )
+    )
+    # a delta of an item whose creation wasn't seen
+    await store.on_text_delta(
+        event("response.text.delta", response_id="resp_1", item_id="item_2", delta="Hi")
+    )
+    await store.on_response_done(
+        event("response.done", response={"id": "resp_1", "status": "cancelled"})
+    )
+    assert [item["id"] for item in store.snapshot()["data"]["items"]] == ["item_2"]
+    assert store.items["item_2"].status == "cancelled"
+    assert [diff["op"] for diff in diffs(outbound)] == [
+        "item",
+        "item",
+        "text",
+        "turn.done",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_truncated_items_are_marked():
+    outbound = OutboundSpy()
+    store = ConversationStore(outbound)
+    await store.on_text_delta(
+        event(
+            "response.audio_transcript.delta",
+            response_id="resp_1",
+            item_id="item_1",
+            delta="Once upon",
+        )
+    )
+    await store.on_item_truncated(
+        event(
+            "conversation.item.truncated",
+            item_id="item_1",
+            content_index=0,
+            audio_end_ms=800,
+        )
+    )
+    # the done events of the interrupted response don't undo it
+    await store.on_audio_transcript_done(
+        event(
+            "response.audio_transcript.done",
+            response_id="resp_1",
+            item_id="item_1",
+            content_index=0,
+            output_index=0,
+            transcript="Once upon",
+        )
+    )
+    await store.on_response_done(
+        event("response.done", response={"id": "resp_1", "status": "cancelled"})
+    )
+    await store.on_item_truncated(
+        event(
+            "conversation.item.truncated",
+            item_id="unknown",
+            content_index=0,
+            audio_end_ms=0,
+        )
+    )
+    assert diffs(outbound)[2:] == [
+        {"version": 3, "op": "item.truncated", "id": "item_1", "audio_end_ms": 800},
+        {"version": 4, "op": "item.done", "id": "item_1", "status": "truncated"},
+        {
+            "version": 5,
+            "op": "turn.done",
+            "response_id": "resp_1",
+            "status": "cancelled",
+        },
+    ]
+    assert store.snapshot()["data"]["items"][0]["status"] == "truncated"
+
+
+@pytest.mark.asyncio
+async def test_interrupted_response_text_is_cut_off():
+    outbound = OutboundSpy()
+    store = ConversationStore(outbound)
+
+    async def delta(response_id, text):
+        await store.on_text_delta(
+            event(
+                "response.audio_transcript.delta",
+                response_id=response_id,
+                item_id=f"item_{response_id}",
+                delta=text,
+            )
+        )
+
+    await delta("resp_1", "Once upon")
+    store.interrupt("resp_1")
+    # in flight when the user talked over it
+    await delta("resp_1", " a time")
+    await store.on_audio_transcript_done(
+        event(
+            "response.audio_transcript.done",
+            response_id="resp_1",
+            item_id="item_resp_1",
+            content_index=0,
+            output_index=0,
+            transcript="Once upon a time",
+        )
+    )
+    await delta("resp_2", "Yes?")
+    assert [diff["op"] for diff in diffs(outbound)] == [
+        "item",
+        "text",
+        "item.done",
+        "item",
+        "text",
+    ]
+    assert [item["text"] for item in store.snapshot()["data"]["items"]] == [
+        "Once upon",
+        "Yes?",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_created_item_is_ended_by_its_response():
+    outbound = OutboundSpy()
+    store = ConversationStore(outbound)
+    assistant = {"id": "item_1", "type": "message", "role": "assistant"}
+    await store.on_item_created(event("conversation.item.created", item=assistant))
+    await store.on_output_item_added(
+        event("response.output_item.added", response_id="resp_1", item=assistant)
+    )
+    await store.on_response_done(
+        event("response.done", response={"id": "resp_1", "status": "cancelled"})
+    )
+    assert store.items["item_1"].response_id == "resp_1"
+    assert store.items["item_1"].status == "cancelled"
+    assert [diff["op"] for diff in diffs(outbound)] == ["item", "turn.done"]
@@ -0,0 +1,109 @@
+import base64
+from collections import namedtuple
+
+import pytest
+
+from rtaoai2.ui.coalescer import CoalescingEventProducer
+from rtaoai2.ui.interrupt import InterruptibleEventProducer, decoded_size
+from rtaoai2.ui.outbound import OutboundQueue
+from rtaoai2.ui.producer import EventProducer, make_audio
+
+FakeEvent = namedtuple("FakeEvent", ["response_id", "item_id", "delta"])
+FakeResponse = namedtuple("FakeResponse", ["id"])
+FakeCreated = namedtuple("FakeCreated", ["response"])
+
+DELTA = base64.b64encode(b"\x00" * 4800).decode()
+
+
+class WebSocketSpy:
+    async def send_json(self, j):
+        pass
+
+    async def send_bytes(self, b):
+        pass
+
+    async def close(self, code):
+        pass
+
+
+class OpenAIProducerSpy:
+    def __init__(self):
+        self.calls = []
+
+    async def make_response_cancel(self):
+        self.calls.append(("cancel",))
+
+    async def make_item_truncate(self, item_id, content_index, audio_end_ms):
+        self.calls.append(("truncate", item_id, content_index, audio_end_ms))
+
+
+def test_decoded_size():
+    for size in range(8):
+        assert decoded_size(base64.b64encode(b"\x01" * size).decode()) == size
+
+
+@pytest.mark.asyncio
+async def test_interrupt_flushes_and_truncates():
+    outbound = OutboundQueue(WebSocketSpy())
+    openai_spy = OpenAIProducerSpy()
+    producer = InterruptibleEventProducer(
+        CoalescingEventProducer(EventProducer(outbound), window=0),
+        outbound,
+        openai_spy,
+    )
+    assert not await producer.interrupt()
+
+    await producer.on_response_created(FakeCreated(FakeResponse("resp_1")))
+    await producer.on_response_audio_delta_event(FakeEvent("resp_1", "item_1", DELTA))
+    await producer.on_response_audio_transcript_delta_event("Hello")
+    assert outbound.take_pending() == [
+        (True, False, make_audio(DELTA)),
+        (False, False, {"type": "transcript", "data": "Hello"}),
+    ]
+    await producer.on_response_audio_delta_event(FakeEvent("resp_1", "item_1", DELTA))
+
+    assert await producer.interrupt(played_ms=500)
+    assert outbound.take_pending() == [
+        (False, False, {"type": "audio.flush", "data": "resp_1"})
+    ]
+    # played no more than the 200ms of audio sent
+    assert openai_spy.calls == [("cancel",), ("truncate", "item_1", 0, 200)]
+
+    # deltas still in flight upstream are dropped, not the response end
+    await producer.on_response_audio_delta_event(FakeEvent("resp_1", "item_1", DELTA))
+    await producer.on_response_audio_transcript_delta_event(" world")
+    await producer.on_response_done(None)
+    assert outbound.take_pending() == [
+        (False, False, {"type": "message", "data": "response.done"})
+    ]
+    assert not await producer.interrupt()
+
+
+@pytest.mark.asyncio
+async def test_interrupt_after_response_done():
+    outbound = OutboundQueue(WebSocketSpy())
+    openai_spy = OpenAIProducerSpy()
+    producer = InterruptibleEventProducer(EventProducer(outbound), outbound, openai_spy)
+    await producer.on_response_created(FakeCreated(FakeResponse("resp_1")))
+    for _ in range(3):
+        await producer.on_response_audio_delta_event(
+            FakeEvent("resp_1", "item_1", DELTA)
+        )
+    await producer.on_response_done(None)
+
+    # upstream is done long before the client played its 300ms of audio
+    assert await producer.interrupt(played_ms=120)
+    # the queued audio is dropped, there is nothing to cancel upstream
+    assert outbound.take_pending() == [
+        (False, False, {"type": "message", "data": "response.done"}),
+        (False, False, {"type": "audio.flush", "data": "resp_1"}),
+    ]
+    assert openai_spy.calls == [("truncate", "item_1", 0, 120)]
+    assert not await producer.interrupt(played_ms=120)
+
+    # played to its end, nothing to truncate
+    await producer.on_response_created(FakeCreated(FakeResponse("resp_2")))
+    await producer.on_response_audio_delta_event(FakeEvent("resp_2", "item_2", DELTA))
+    await producer.on_response_done(None)
+    assert not await producer.interrupt(played_ms=100)
+    assert openai_spy.calls == [("truncate", "item_1", 0, 120)]
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from rtaoai2 import metrics
+from rtaoai2.ui.outbound import (
+    BLOCK,
+    DISCONNECT,
+    DROP_AUDIO,
+    TRY_AGAIN_LATER,
+    OutboundQueue,
+)
+from rtaoai2.ui.producer import make_audio, make_audio_transcript
+
+
+class SlowWebSocketSpy:
+    def __init__(self):
+        self.calls = []
+        self.can_send = asyncio.Event()
+        self.close_code = None
+
+    async def send_json(self, j):
+        await self.can_send.wait()
+        self.calls.append(("send_json", j))
+
+    async def send_bytes(self, b):
+        await self.can_send.wait()
+        self.calls.append(("send_bytes", b))
+
+    async def close(self, code):
+        self.close_code = code
+
+
+@pytest.mark.asyncio
+async def test_outbound_queue_writes_in_order():
+    websocket = SlowWebSocketSpy()
+    websocket.can_send.set()
+    outbound = OutboundQueue(websocket)
+    writer = asyncio.create_task(outbound.run())
+
+    await outbound.send_json(make_audio_transcript("Hello"))
+    await outbound.send_bytes(b"\x00\x01")
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert websocket.calls == [
+        ("send_json", make_audio_transcript("Hello")),
+        ("send_bytes", b"\x00\x01"),
+    ]
+    assert outbound.stats() == {"depth": 0, "max_depth": 2, "sent": 2, "dropped": 0}
+    writer.cancel()
+
+
+@pytest.mark.asyncio
+async def test_outbound_queue_drop_stale_audio():
+    websocket = SlowWebSocketSpy()
+    outbound = OutboundQueue(websocket, max_size=2, policy=DROP_AUDIO)
+
+    await outbound.send_json(make_audio("1"))
+    await outbound.send_json(make_audio_transcript("Hello"))
+    # the oldest audio makes room for the new one
+    await outbound.send_json(make_audio("2"))
+    assert [payload for _, _, payload in outbound.queue] == [
+        make_audio_transcript("Hello"),
+        make_audio("2"),
+    ]
+    assert outbound.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_outbound_queue_discard_audio():
+    outbound = OutboundQueue(SlowWebSocketSpy())
+    await outbound.send_json(make_audio("1"))
+    await outbound.send_json(make_audio_transcript("Hello"))
+    await outbound.send_bytes(b"\x00\x01")
+    assert outbound.discard_audio() == 2
+    assert [payload for _, _, payload in outbound.queue] == [
+        make_audio_transcript("Hello")
+    ]
+    # discarded on purpose, not dropped for a slow client
+    assert outbound.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_outbound_queue_block():
+    websocket = SlowWebSocketSpy()
+    outbound = OutboundQueue(websocket, max_size=1, policy=BLOCK)
+    writer = asyncio.create_task(outbound.run())
+
+    await outbound.send_json(make_audio("1"))
+    await asyncio.sleep(0)
+    await outbound.send_json(make_audio("2"))
+    blocked = asyncio.create_task(outbound.send_json(make_audio("3")))
+    await asyncio.sleep(0)
+    assert not blocked.done()
+
+    websocket.can_send.set()
+    await blocked
+    await asyncio.sleep(0)
+    assert outbound.dropped == 0
+    writer.cancel()
+
+
+@pytest.mark.asyncio
+async def test_outbound_queue_disconnect():
+    websocket = SlowWebSocketSpy()
+    outbound = OutboundQueue(websocket, max_size=1, policy=DISCONNECT)
+
+    await outbound.send_json(make_audio("1"))
+    await outbound.send_json(make_audio("2"))
+    assert outbound.closed
+    assert websocket.close_code == TRY_AGAIN_LATER
+    assert outbound.dropped == 2
+    # run returns right away once closed
+    await outbound.run()
+
+
+@pytest.mark.asyncio
+async def test_outbound_queue_metrics():
+    sent = metrics.OUTBOUND_MESSAGES.values.get("sent", 0)
+    dropped = metrics.OUTBOUND_MESSAGES.values.get("dropped", 0)
+    closed = metrics.OUTBOUND_MAX_DEPTH.count(DROP_AUDIO)
+    websocket = SlowWebSocketSpy()
+    websocket.can_send.set()
+    outbound = OutboundQueue(websocket, max_size=1, policy=DROP_AUDIO)
+
+    await outbound.send_json(make_audio("1"))
+    await outbound.send_json(make_audio("2"))
+    writer = asyncio.create_task(outbound.run())
+    await asyncio.sleep(0)
+    await outbound.send_json(make_audio_transcript("Hello"))
+    await outbound.close()
+    await writer
+    assert metrics.OUTBOUND_MESSAGES.values["sent"] == sent + 1
+    assert metrics.OUTBOUND_MESSAGES.values["dropped"] == dropped + 2
+    assert metrics.OUTBOUND_MAX_DEPTH.count(DROP_AUDIO) == closed + 1
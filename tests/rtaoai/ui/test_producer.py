@@ -1,5 +1,6 @@
 from typing import Any
 from collections import namedtuple
+import base64
 
 import pytest
 
@@ -7,6 +8,8 @@ from rtaoai2.ui.producer import (
     make_audio,
     make_input_transcript,
     make_audio_transcript,
+    make_audio_frame,
+    parse_audio_frame,
     EventProducer,
 )
 
@@ -15,6 +18,12 @@ def test_ui_produder_make_audio():
     assert make_audio("12349") == {"type": "audio", "data": "12349"}
 
 
+def test_ui_producer_audio_frame():
+    frame = make_audio_frame("resp_AJo3wLPQ6T1KDpfwaZoBw", 3, b"\x01\x02")
+    assert len(frame) == 1 + 26 + 4 + 2
+    assert parse_audio_frame(frame) == ("resp_AJo3wLPQ6T1KDpfwaZoBw", 3, b"\x01\x02")
+
+
 def test_ui_producer_make_input_transcript():
     assert make_input_transcript("transcript") == {
         "type": "input_transcript",
@@ -58,3 +67,27 @@ async def test_openai_ui_bridge():
         ("send_json", make_audio_transcript(event.delta)),
         ("send_json", make_input_transcript(event.delta)),
     ]
+
+
+@pytest.mark.asyncio
+async def test_ui_producer_binary_audio():
+    class WebSocketSpy:
+        def __init__(self):
+            self.calls = []
+
+        async def send_bytes(self, b: bytes) -> None:
+            self.calls.append(("send_bytes", b))
+
+    websocket = WebSocketSpy()
+    event_producer = EventProducer(websocket, binary_audio=True)
+    FakeEvent = namedtuple("FakeEvent", ["response_id", "delta"])
+    delta = base64.b64encode(b"\x00\x01").decode()
+
+    await event_producer.on_response_audio_delta_event(FakeEvent("resp_1", delta))
+    await event_producer.on_response_audio_delta_event(FakeEvent("resp_1", delta))
+    await event_producer.on_response_audio_delta_event(FakeEvent("resp_2", delta))
+    assert websocket.calls == [
+        ("send_bytes", make_audio_frame("resp_1", 0, b"\x00\x01")),
+        ("send_bytes", make_audio_frame("resp_1", 1, b"\x00\x01")),
+        ("send_bytes", make_audio_frame("resp_2", 0, b"\x00\x01")),
+    ]
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from rtaoai2.ui.outbound import DISCONNECT, OutboundQueue
+from rtaoai2.ui.producer import make_audio, make_audio_transcript
+from rtaoai2.ui.resume import ResumableOutbound, SessionLimitError, SessionRegistry
+
+
+class WebSocketSpy:
+    def __init__(self):
+        self.calls = []
+
+    async def send_json(self, j):
+        self.calls.append(("send_json", j))
+
+    async def send_bytes(self, b):
+        self.calls.append(("send_bytes", b))
+
+    async def close(self, code):
+        pass
+
+
+class SessionSpy:
+    def __init__(self, buffered_bytes=0):
+        self.buffered_bytes = buffered_bytes
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_resumable_outbound_replays_missed_messages():
+    first = OutboundQueue(WebSocketSpy())
+    outbound = ResumableOutbound()
+    outbound.attach(first)
+    await outbound.send_json(make_audio_transcript("Hello"))
+    await outbound.send_bytes(b"audio")
+    assert first.depth == 2
+
+    # queued messages not written yet are kept with the ones sent meanwhile
+    outbound.detach()
+    assert first.depth == 0
+    await outbound.send_json(make_audio("AAAA"))
+    assert len(outbound.ring) == 3
+
+    websocket = WebSocketSpy()
+    second = OutboundQueue(websocket)
+    outbound.attach(second)
+    assert outbound.ring_bytes == 0
+    writer = asyncio.create_task(second.run())
+    await asyncio.sleep(0)
+    assert websocket.calls == [
+        ("send_json", make_audio_transcript("Hello")),
+        ("send_bytes", b"audio"),
+        ("send_json", make_audio("AAAA")),
+    ]
+    writer.cancel()
+
+
+@pytest.mark.asyncio
+async def test_resumable_outbound_replays_past_the_queue_bound():
+    outbound = ResumableOutbound()
+    for i in range(1000):
+        await outbound.send_json(make_audio(str(i)))
+
+    websocket = WebSocketSpy()
+    queue = OutboundQueue(websocket, max_size=256, policy=DISCONNECT)
+    outbound.attach(queue)
+    assert queue.depth == 1000
+    # sent after the replayed ones, once there is room
+    await asyncio.wait_for(outbound.send_json(make_audio_transcript("Hello")), 1)
+    writer = asyncio.create_task(queue.run())
+    while queue.depth:
+        await asyncio.sleep(0)
+    assert not queue.closed
+    assert queue.dropped == 0
+    assert websocket.calls == [
+        *(("send_json", make_audio(str(i))) for i in range(1000)),
+        ("send_json", make_audio_transcript("Hello")),
+    ]
+    writer.cancel()
+
+
+@pytest.mark.asyncio
+async def test_resumable_outbound_ring_is_bounded():
+    outbound = ResumableOutbound(max_bytes=10)
+    for i in range(5):
+        await outbound.send_bytes(bytes([i]) * 4)
+    assert [payload for _, _, payload, _ in outbound.ring] == [b"\x03" * 4, b"\x04" * 4]
+    assert outbound.ring_bytes == 8
+    assert outbound.dropped == 3
+
+
+@pytest.mark.asyncio
+async def test_registry_resume():
+    registry = SessionRegistry(grace=60)
+    session = SessionSpy()
+    token = registry.register(session)
+    # an attached session can't be taken over
+    assert registry.resume(token) is None
+
+    await registry.park(token)
+    assert registry.resume(token) is session
+    assert registry.resume(token) is None
+    assert registry.resume("unknown") is None
+    await registry.close()
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_registry_evicts_after_grace():
+    registry = SessionRegistry(grace=0.01)
+    session = SessionSpy()
+    token = registry.register(session)
+    await registry.park(token)
+    await asyncio.sleep(0.05)
+    assert session.closed
+    assert registry.evicted == 1
+    assert registry.resume(token) is None
+
+    registry = SessionRegistry(grace=0)
+    session = SessionSpy()
+    await registry.park(registry.register(session))
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_registry_evicts_oldest_under_pressure():
+    registry = SessionRegistry(grace=60, max_parked=2, max_parked_bytes=100)
+    sessions = [SessionSpy(buffered_bytes=40) for _ in range(4)]
+    tokens = [registry.register(session) for session in sessions]
+    for token in tokens[:3]:
+        await registry.park(token)
+    assert [s.closed for s in sessions] == [True, False, False, False]
+
+    sessions[3].buffered_bytes = 90
+    await registry.park(tokens[3])
+    assert [s.closed for s in sessions] == [True, True, True, False]
+    assert list(registry.parked) == [tokens[3]]
+    await registry.close()
+
+
+@pytest.mark.asyncio
+async def test_registry_admission():
+    registry = SessionRegistry(grace=60, max_sessions=2, admission_timeout=0.05)
+    parked = [SessionSpy(), SessionSpy()]
+    for session in parked:
+        await registry.park(registry.register(session, await registry.reserve()))
+    assert registry.counts() == {"attached": 0, "parked": 2, "waiting": 0}
+
+    # parked sessions make room first
+    tokens = [await registry.reserve(), await registry.reserve()]
+    assert all(session.closed for session in parked) and registry.evicted == 2
+    with pytest.raises(SessionLimitError):
+        await registry.reserve()
+    assert registry.rejected == 1
+
+    # a waiting client gets the slot of a session that closed
+    waiting = asyncio.create_task(registry.reserve())
+    await asyncio.sleep(0)
+    assert registry.counts() == {"attached": 2, "parked": 0, "waiting": 1}
+    await registry.remove(tokens[0])
+    assert await waiting
+    assert registry.counts()["waiting"] == 0
+    await registry.close()